@@ -0,0 +1,53 @@
+'''
+Times ``import qfinuwa`` in fresh interpreters and fails if it is slower than a budget, or if it imports any of
+the packages that are only meant to be loaded on first use.
+
+    python benchmarks/import_time.py [--runs 10] [--budget 0.75]
+'''
+import argparse
+import os
+import subprocess
+import sys
+from statistics import median
+
+# only needed by Plotting, API, the jit backend, progress bars or tables and the backtest server
+LAZY = ['bokeh', 'requests', 'numba', 'tqdm', 'tabulate', 'http.server']
+
+SCRIPT = '''
+import sys, time
+start = time.perf_counter()
+import qfinuwa
+print(time.perf_counter() - start)
+print(' '.join(m for m in {lazy!r} if m in sys.modules))
+'''
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10, help='the number of fresh interpreters to time')
+    parser.add_argument('--budget', type=float, default=0.75, help='the slowest median import time allowed, in seconds')
+    args = parser.parse_args()
+
+    src = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [src, os.environ.get('PYTHONPATH')])))
+
+    times, loaded = [], set()
+    for _ in range(args.runs):
+        out = subprocess.run([sys.executable, '-c', SCRIPT.format(lazy=LAZY)], env=env, check=True,
+                             capture_output=True, text=True).stdout.splitlines()
+        times.append(float(out[0]))
+        loaded.update(out[1].split() if len(out) > 1 else [])
+
+    took = median(times)
+    print(f'import qfinuwa: median {took*1000:.0f}ms, min {min(times)*1000:.0f}ms over {args.runs} runs')
+
+    failed = False
+    if loaded:
+        print(f'FAIL: imported {", ".join(sorted(loaded))}, which should only be imported on first use')
+        failed = True
+    if took > args.budget:
+        print(f'FAIL: slower than the budget of {args.budget*1000:.0f}ms')
+        failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
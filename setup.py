@@ -8,5 +8,11 @@ setuptools.setup(name='qfinuwa',
       python_requires = ">=3.6",
       install_requires=[
           'tqdm', 'tabulate', 'bokeh', 'requests', 
-      ]
+      ],
+      extras_require={
+          'jit': ['numba'],
+      },
+      entry_points={
+          'console_scripts': ['qfinuwa = qfinuwa.__main__:main'],
+      }
       )
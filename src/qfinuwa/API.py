@@ -53,7 +53,8 @@ class API:
     
 
     @classmethod
-    def fetch_stocks(cls, stocks: Union[str,  list], api_key_path: str, data_folder: str, download_raw: bool = False, months: int = 60) -> None:
+    def fetch_stocks(cls, stocks: Union[str,  list], api_key_path: str, data_folder: str, download_raw: bool = False, months: int = 60,
+                     ragged: bool = False) -> None:
         '''
         Fetches the data from the SIP market-aggregated data. The data is provided by the SEC. An API key is required. The data is stored in the folder specified by `data_folder`.
 
@@ -61,6 +62,8 @@ class API:
         - ``stocks`` (``str``): The ticker(s) of the stock(s) to be downloaded. If multiple stocks are required, a list of tickers can be provided.
         - ``api_key_path`` (``str``): The path to the file containing the API key.
         - ``download_raw`` (``bool``): If ``true``, downloads the data straight from the API provider, without alligning.
+        - ``ragged`` (``bool``): If ``true``, each stock keeps the bars it has (within the dates every stock has, on weekdays and in trading
+          hours), rather than being interpolated onto the same times. ``StockData`` aligns them on the union of their times when loading.
         ### Returns
         ``None``
         '''
@@ -140,7 +143,7 @@ class API:
         
 
         if not download_raw:
-            cls._allign_data(stock_df)
+            cls._allign_data(stock_df, ragged)
 
     #---------------[Private Methods]-----------------# 
     # @classmethod
@@ -214,7 +217,7 @@ class API:
         return df
 
     @classmethod
-    def _allign_data(cls, dfs: list) -> None:
+    def _allign_data(cls, dfs: list, ragged: bool = False) -> None:
 
         if len(dfs)==0:
             return
@@ -226,12 +229,16 @@ class API:
         # crop dataframes
         start_date, end_date = max(start_date),  min(end_date)
 
-        with tqdm(dfs) as pbar:
+        def clean(index):
+            # the times within the dates every stock has, on weekdays and in trading hours
+            index = index[(index >= start_date) & (index <= end_date)]
+            index = index[index.dayofweek < 5]
+            return index[(index.hour + index.minute/60 >= 9.5)  & (index.hour < 16)]
 
-            new_index = reduce(lambda a,b: a.union(b), (df.index for _, df in dfs))
+        with tqdm(dfs) as pbar:
 
-            new_index = new_index[(new_index >= start_date) & (new_index <= end_date)]
-            new_index = new_index[(new_index.hour + new_index.minute/60 >= 9.5)  & (new_index.hour < 16)]
+            # ragged stocks keep the times they have, rather than being interpolated onto the union of every stock's
+            new_index = None if ragged else clean(reduce(lambda a,b: a.union(b), (df.index for _, df in dfs)))
 
             for filepath, df in dfs:          
                 pbar.set_description(f'> Alligning {filepath}')
@@ -245,7 +252,10 @@ class API:
                 # interval_df = interval_df.loc[(interval_df.index.dayofweek != 5) & (interval_df.index.dayofweek != 6)]
                 # print(df.columns)
                 # print(new_index)
-                new_df = df.reindex(new_index, axis=0).interpolate(method='linear')
+                if ragged:
+                    new_df = df.loc[clean(df.index)]
+                else:
+                    new_df = df.reindex(new_index, axis=0).interpolate(method='linear')
                 # convert to 3dps
                 new_df = new_df.round(3)
                 # round volume
@@ -1,13 +1,16 @@
-from .strategy import Strategy
-from .API import API    
+from .strategy import Strategy, JitStrategy, MatrixStrategy
 from .backtester import Backtester
 from .indicators import Indicators
-from .plotting import Plotting
+from .streaming import StreamingBacktester
+from . import rolling
 
 class Strategy(Strategy):
     ...
 
-class API(API):
+class JitStrategy(JitStrategy):
+    ...
+
+class MatrixStrategy(MatrixStrategy):
     ...
 
 class Backtester(Backtester):
@@ -16,5 +19,26 @@ class Backtester(Backtester):
 class Indicators(Indicators):
     ...
 
-class Plotting(Plotting):
-    ...
\ No newline at end of file
+class StreamingBacktester(StreamingBacktester):
+    ...
+
+#---------------[Lazy Imports]-----------------#
+# Plotting (bokeh), API (requests) and the server (http) are slow to import and not needed to run a backtest, so
+# they are only imported the first time they are accessed (PEP 562)
+_LAZY = {'Plotting': '.plotting', 'API': '.API', 'BacktestServer': '.opt._server', 'BacktestClient': '.opt._server'}
+
+__all__ = ['Strategy', 'JitStrategy', 'MatrixStrategy', 'API', 'Backtester', 'Indicators', 'Plotting',
+           'StreamingBacktester', 'BacktestServer', 'BacktestClient', 'rolling']
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+    from importlib import import_module
+    base = getattr(import_module(_LAZY[name], __name__), name)
+    cls = type(name, (base,), {'__module__': __name__, '__qualname__': name})
+    globals()[name] = cls
+    return cls
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,63 @@
+import os
+import sys
+import argparse
+
+def main(argv: list = None) -> None:
+    '''
+    The ``qfinuwa`` command line entry point.
+
+    ```
+    qfinuwa worker <queue> [--data <folder>] [--path <folder>] [--idle-timeout <seconds>] [--quiet]
+    qfinuwa serve <data_folder> [--stocks <stock> ...] [--host <host>] [--port <port>] [--path <folder>]
+                  [--indicators <module:Class> ...] [--days <days>] [--fee <fee>] [--delta-limits <limit>]
+                  [--cache-size <results>] [--quiet]
+    ```
+    '''
+    parser = argparse.ArgumentParser(prog='qfinuwa', description='QFinUWA backtester.')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    worker = commands.add_parser('worker', help='run the parameter sweep tasks published to a shared queue folder')
+    worker.add_argument('queue', help='the queue folder passed to run_grid_search')
+    worker.add_argument('--data', default=None,
+                        help='where the data folder is on this host, if not where the sweep was started from')
+    worker.add_argument('--path', action='append', default=[],
+                        help='a folder to import the strategy and indicator modules from (can be repeated)')
+    worker.add_argument('--idle-timeout', type=float, default=None,
+                        help='stop after this many seconds without tasks (never by default)')
+    worker.add_argument('--quiet', action='store_true', help="don't print each task as it completes")
+
+    serve = commands.add_parser('serve', help='keep a data folder loaded and run backtests sent over HTTP')
+    serve.add_argument('data_folder', help='the data folder (or store) to load')
+    serve.add_argument('--stocks', nargs='+', default=None, help='the stocks to load (every stock by default)')
+    serve.add_argument('--host', default='127.0.0.1', help='the address to listen on (only this machine by default)')
+    serve.add_argument('--port', type=int, default=8765, help='the port to listen on, 0 picks a free one')
+    serve.add_argument('--path', action='append', default=[],
+                       help='a folder to import the strategy and indicator modules from (can be repeated)')
+    serve.add_argument('--indicators', nargs='+', default=[],
+                       help="indicator classes to compute up front, as 'module:Class'")
+    serve.add_argument('--days', default='all', type=lambda days: days if days == 'all' else int(days),
+                       help="the default number of days per fold ('all' by default)")
+    serve.add_argument('--fee', type=float, default=0.0, help='the default fee')
+    serve.add_argument('--delta-limits', type=int, default=10000, help='the default delta limit of every stock')
+    serve.add_argument('--cache-size', type=int, default=128,
+                       help='the number of run results kept for identical jobs, per indicator class')
+    serve.add_argument('--quiet', action='store_true', help="don't print each job")
+
+    args = parser.parse_args(argv)
+
+    # the strategy and indicator classes of a job are imported (or unpickled) by name, so their modules have to be
+    # importable here
+    sys.path[:0] = [os.path.abspath(path) for path in args.path + [os.getcwd()]]
+
+    if args.command == 'worker':
+        from .opt._queue import work
+        work(args.queue, args.data, args.idle_timeout, verbose=not args.quiet)
+    elif args.command == 'serve':
+        from .opt._server import BacktestServer
+        BacktestServer(args.data_folder, args.stocks, args.host, args.port, args.days, args.delta_limits, args.fee,
+                       args.cache_size, args.indicators, verbose=not args.quiet).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,19 @@
 
-from itertools import islice, product
+from itertools import product
 from .opt._portfolio import Portfolio
 from .opt._stockdata import StockData
 import random
-from .opt._result import SingleRunResult, MultiRunResult, ParameterSweepResult
-from .strategy import Strategy
+from .opt._result import SingleRunResult, MultiRunResult, ParameterSweepResult, MonteCarloResult
+from .opt import _montecarlo
+from .strategy import Strategy, JitStrategy
+from .opt import _jit
+from .opt._store import ResultStore, Checkpoint, ResultCache, source_hash
+from .opt._queue import WorkQueue
 from .indicators import Indicators
 from typing import Union
-from itertools import islice, tee
 import datetime
+import hashlib
+import os
 from dateutil import parser
 import numpy as np
 
@@ -21,7 +26,7 @@ import numpy as np
 #          from tqdm import tqdm   
 # except NameError:
 #     from tqdm import tqdm      # Probably standard Python interpreter
-from tqdm import tqdm
+from .opt._lazy import tqdm
 
 class _StrategyModifier:
     '''
@@ -71,24 +76,32 @@ class Backtester:
 
     def __init__(self,  strategy_class: Strategy, indicator_class: Indicators, 
             stocks: list, 
-            data_folder: str, days: Union[int , str] = 'all', 
+            data_folder: Union[str, StockData], days: Union[int , str] = 'all', 
             delta_limits:  Union[int , dict]=10000, fee: float=0.0,
-            progressbar=True, low_memory=False):
+            progressbar=True, low_memory=False, n_threads: int=None,
+            cache_size: int=None, cache_path: str=None):
         '''
         # Backteser
-        A class for running a strategy on historical data. Once initialised, the data is precompiled
-        for iterating. The parameters can be updated using the ``update_x`` and ``set_x`` functions.
+        A class for running a strategy on historical data. Once initialised, the data is loaded
+        and any fold can be iterated over from its first bar. The parameters can be updated using the ``update_x`` and ``set_x`` functions.
         The strategy is run on the data by calling the either the ``run`` or ``run_grid_search`` method. 
         
         ## Parameters
         - ``strategy_class`` (``Strategy``): The strategy to run.
         - ``indicator_class`` (``Indicators``): The indicators to use in the strategy.
         - ``stocks`` (``list``): A list of stock to run the strategy on.
-        - ``data_folder`` (``str``): The path to the data folder.
+        - ``data_folder`` (``str`` or ``StockData``): The path to the data folder, or data that has already been loaded
+          (which is shared rather than copied, e.g. between the backtesters of a long-running process).
         - ``days`` (``int`` or ``str``): The number of days to run the strategy on. 
         - ``delta_limit`` (``int`` or ``dict``): The general delta limit, or a dictionary of delta limits per instrument.
         - ``fee`` (``float``): The fee to pay on each transaction.
         - ``progressbar`` (``bool``): Whether to show a progress bar when loading data.
+        - ``n_threads`` (``int``): The number of threads used to compute indicators, ``None`` uses one per CPU.
+        - ``cache_size`` (``int``): If given, the results of this many ``run`` calls are kept in memory, and identical 
+          calls (same strategy and indicator code, parameters, periods, fee, delta limits and data) return them 
+          instead of running again.
+        - ``cache_path`` (``str``): A SQLite file to also cache every result in, so they are kept between sessions. 
+          Requires ``cache_size``.
 
         ## Properties
         - ``strategy_params`` (``dict``): The parameters of the strategy.
@@ -118,15 +131,20 @@ class Backtester:
         self._strategy_wrapper = _StrategyModifier(strategy_class)
         # self._strategy = strategy_class
 
-        self._data = StockData(data_folder, stocks=stocks, verbose=progressbar, low_memory=low_memory)
-        self._precomp_prices = self._data.prices
+        if isinstance(data_folder, StockData):
+            if stocks is not None and sorted(stocks) != list(data_folder.stocks):
+                raise ValueError(f'The data holds {data_folder.stocks}, got {stocks}')
+            self._data = data_folder
+        else:
+            self._data = StockData(data_folder, stocks=stocks, verbose=progressbar, low_memory=low_memory)
 
         # raise expection if indiators is not a subclass of Indicators
         if not issubclass(indicator_class, Indicators):
             raise ValueError('Indicators must be a subclass of Indicators')
         
 
-        self._indicators = indicator_class(data=self._data)
+        self._n_threads = n_threads
+        self._indicators = indicator_class(data=self._data, n_threads=n_threads)
 
         self._fee = fee
         # self._starting_cash = starting_cash  
@@ -146,6 +164,10 @@ class Backtester:
 
         self._random = random
 
+        if cache_path is not None and cache_size is None:
+            raise ValueError('cache_path requires cache_size')
+        self._result_cache = ResultCache(cache_size, cache_path) if cache_size is not None else None
+
     #---------------[Properties]-----------------#
     @property
     def strategy(self):
@@ -232,7 +254,7 @@ class Backtester:
         ## Returns
         ``None``
         '''
-        self._indicators = indicator_class(self._data)
+        self._indicators = indicator_class(self._data, n_threads=self._n_threads)
 
     @property
     def _strategy(self):
@@ -249,7 +271,8 @@ class Backtester:
        
     def run(self, strategy_params: dict = None, indicator_params: dict = None, 
             cv: int = 1, seed: int = None, start_dates: list = None,
-            progressbar: bool=True) -> MultiRunResult:
+            progressbar: bool=True, backend: str = 'python', 
+            chunk_size: int = None, overlap: int = None) -> MultiRunResult:
         '''
         Runs the strategy on a set of hyperparameters.
 
@@ -260,10 +283,31 @@ class Backtester:
         - ``seed`` (``int``): The seed to use for the random number generator.
         - ``start_dates`` (``list``): List of start dates to test on.
         - ``progressbar`` (``bool``): Whether to show a progress bar.
+        - ``backend`` (``str``): ``'python'`` to call ``on_data`` on every bar, or ``'jit'`` to run a ``JitStrategy`` 
+          kernel compiled with Numba.
+        - ``chunk_size`` (``int``): If given, indicators are computed this many bars at a time as the strategy runs,
+          rather than over every bar up front, so memory depends on the chunk size rather than the length of the 
+          data. Every indicator needs a lookback. Used with data memory mapped from a store (see 
+          ``StockData.write_store``) to backtest over more data than fits in memory.
+        - ``overlap`` (``int``): The number of bars of indicator history kept from one chunk to the next, the 
+          longest lookback if ``None``. The strategy sees at least this much history at every bar.
 
         ## Returns
         result (``MultiRunResult``): The results of the strategy.
         '''
+        if backend not in ('python', 'jit'):
+            raise ValueError(f"backend must be 'python' or 'jit', not {backend}")
+        is_jit = issubclass(self._strategy, JitStrategy)
+        if backend == 'jit' and not is_jit:
+            raise TypeError(f'The jit backend requires a JitStrategy, {self._strategy.__name__} is not one')
+        if chunk_size is not None:
+            if int(chunk_size) != chunk_size or chunk_size < 1:
+                raise ValueError(f'chunk_size must be a positive integer, got {chunk_size}')
+            if overlap is not None and (int(overlap) != overlap or overlap < 0):
+                raise ValueError(f'overlap must be a non-negative integer, got {overlap}')
+            if is_jit:
+                raise TypeError(f'JitStrategy runs on arrays of every bar, so it can\'t be run in chunks')
+
         if bool(strategy_params):
             if not isinstance(strategy_params, dict):
                 raise TypeError(f'strategy_params must be of type dict, not {type(strategy_params)}')
@@ -277,44 +321,56 @@ class Backtester:
         if bool(indicator_params):
             if not isinstance(indicator_params, dict):
                 raise TypeError(f'indicator_params must be of type dict, not {type(indicator_params)}')
-            self._indicators._add_parameters(indicator_params)
+            self._indicators._raise_invalid_params(indicator_params)
         else:
             indicator_params = self._indicators.params
 
-        if self._data.low_memory:
-            self._precomp_prices = self._data.prices
-            
-
-        self._random.seed(seed or random.randint(0, 2**32))
-        if start_dates is not None:
-            if not isinstance(start_dates, list):
-                raise ValueError('start_dates must be a list')
-            
-            cv = len(start_dates)
 
-            test_periods = self._get_periods(start_dates)
-        else:
-            test_periods = self._get_random_periods(cv) 
+        test_periods = self._test_periods(cv, seed, start_dates)
+        cv = len(test_periods)
         results = []
 
-        # caclulate indicators 
-        data_tees = tee(self._precomp_prices[0], cv), \
-                    tee(self._precomp_prices[1], cv), \
-                    self._indicators._iterate_params(indicator_params, copies=cv)
-        test_iterator = zip(*data_tees, test_periods)
+        key = None
+        if self._result_cache is not None:
+            key = self._run_key(strategy_params, self._indicators._fill_in_params(indicator_params), test_periods, backend)
+            cached = self._result_cache.get(key)
+            if cached is not None:
+                return self._attach(cached)
+
+        if is_jit:
+            arrays = self._jit_arrays(indicator_params, strategy_params, test_periods)
+
+        if backend == 'jit':
+            limits = np.array([self._delta_limits[stock] for stock in self.stocks], dtype='float64')
+            for start, end in (tqdm(test_periods, desc=f'> Running compiled backtest') if progressbar and cv > 1 else test_periods):
+                value, trades = _jit.run_compiled(self._strategy.kernel, *arrays, limits, self._fee, start, end)
+                results.append(SingleRunResult(self.stocks, self._data, self._data.index, (start, end), value, trades, self.fee, None))
+            return self._remember(MultiRunResult((strategy_params, indicator_params), results), key)
+
+        # caclulate indicators, only over the test periods for those with a lookback
+        if chunk_size is None:
+            indicator_arrays = self._indicators._iteration_arrays(indicator_params, test_periods)
 
         days_format = f'{self._days} day{"s" if isinstance(self._days, str) or self._days > 1 else ""}'
 
         desc = f'> Running backtest over {cv} sample{"s" if cv > 1 else ""} of {days_format}'
-        for *data, (start, end) in (tqdm(test_iterator, desc = desc, total = cv) if progressbar and cv > 1 else test_iterator):
+        for start, end in (tqdm(test_periods, desc = desc, total = cv) if progressbar and cv > 1 else test_periods):
             
-            portfolio = Portfolio(self.stocks, self._delta_limits, self._fee)
+            portfolio = Portfolio(self.stocks, self._delta_limits, self._fee, self._data, start)
             if strategy_params:
                 strategy = self._strategy(*tuple(), **strategy_params)
             else:
                 strategy = self._strategy(*tuple())
+            if is_jit:
+                strategy._bind(*arrays, start)
 
-            test = islice(zip(*data), start, end) 
+            # cursors start at the first bar of the fold, without stepping through the bars before it
+            if chunk_size is None:
+                indicators = self._indicators._cursor(indicator_arrays, start, end, self._strategy._matrix)
+            else:
+                indicators = self._indicators._chunks(indicator_params, start, end, chunk_size, overlap, self._strategy._matrix)
+            test = ((curr_prices, prices, indicators) for (curr_prices, prices), indicators in 
+                    zip(self._data._cursor(start, end, self._strategy._matrix), indicators))
         
             #---------[RUN THE ALGORITHM]---------#
             for test_data in (tqdm(test, desc=desc, total = end-start, mininterval=0.5) if progressbar and cv == 1 else test):
@@ -325,10 +381,13 @@ class Backtester:
             results.append(SingleRunResult(self.stocks, self._data, self._data.index, (start, end), value, trades, self.fee, on_finish ))
             #-------------------------------------#
 
-        return MultiRunResult((strategy_params, indicator_params), results)
+        return self._remember(MultiRunResult((strategy_params, indicator_params), results), key)
     
     def run_grid_search(self, strategy_params: dict = None, indicator_params: dict = None, 
-                        cv: int = 1, seed: int =None, start_dates: list = None) -> ParameterSweepResult:
+                        cv: int = 1, seed: int =None, start_dates: list = None,
+                        store: str = None, spill_values: bool = False, checkpoint: str = None,
+                        chunk_size: int = None, overlap: int = None, 
+                        queue: Union[str, WorkQueue] = None) -> ParameterSweepResult:
         '''
         Runs a grid search over a set of hyperparameters.
 
@@ -338,11 +397,200 @@ class Backtester:
         - ``cv`` (``int``): The number of cross-validation folds to use.
         - ``seed`` (``int``): The seed to use for the random number generator.
         - ``start_dates`` (``list``): List of start dates to test on.
+        - ``store`` (``str``): A SQLite (or ``.parquet``) file to write the summary of each run to as it completes. 
+          Only the best run is then kept in memory, the rest can be read with ``ParameterSweepResult.to_frame``. 
+          Runs that are already in the store are skipped, so a sweep can be re-run into it.
+        - ``spill_values`` (``bool``): If ``True`` (and ``store`` is given), the value over time of every run is 
+          saved to disk next to the store.
+        - ``checkpoint`` (``str``): A SQLite file to save each completed run to. If the sweep is interrupted, calling it 
+          again with the same checkpoint skips the runs that are already done (on the same data, periods and 
+          parameters) and merges them into the result.
+        - ``chunk_size`` (``int``): Runs every combination in chunks of this many bars, see ``run``.
+        - ``overlap`` (``int``): The indicator history kept between chunks, see ``run``.
+        - ``queue`` (``str`` or ``WorkQueue``): A folder shared with ``qfinuwa worker`` processes (on this or other 
+          hosts) to publish the combinations to instead of running them here. Results are collected as workers 
+          complete them, and failed combinations are retried (see ``WorkQueue``). The strategy and indicator classes
+          must be importable by the workers.
 
         ## Returns
         result (``ParameterSweepResult``): The results of the strategy.
         '''
-        # get all combinations of strategy paramters
+        queue = self._queue(queue)
+        default_strategy_params, combinations, test_periods, cv = self._grid(strategy_params, indicator_params, cv, seed, 
+                                                                             start_dates, chunk_size is None and queue is None, 
+                                                                             verbose=True)
+        total = len(combinations)
+        res = [None for _ in range(total)]
+
+        if store is not None:
+            store = ResultStore(store, spill_values)
+            res = []
+        elif spill_values:
+            raise ValueError('spill_values requires a store')
+
+        for i, key, result in tqdm(self._sweep(combinations, test_periods, cv, seed, checkpoint, chunk_size, overlap, queue), 
+                                   total=total, desc=f"Running paramter sweep (cv={cv})"):
+            if store is None:
+                res[i] = result
+            else:
+                store.append(result, key)
+                res = [max(res + [result], key=lambda r: r.roi[0])]
+
+        if store is not None:
+            store.close()
+        
+        return ParameterSweepResult(res, (default_strategy_params, self._indicators._fill_in_params(indicator_params or dict())), store)
+
+    def iter_grid_search(self, strategy_params: dict = None, indicator_params: dict = None, 
+                         cv: int = 1, seed: int = None, start_dates: list = None, checkpoint: str = None,
+                         chunk_size: int = None, overlap: int = None, queue: Union[str, WorkQueue] = None):
+        '''
+        Generator version of ``run_grid_search``, yielding the ``MultiRunResult`` of each combination as it completes
+        (in the order of the grid, unless the sweep is distributed over a ``queue``) rather than keeping them.
+        '''
+        queue = self._queue(queue)
+        _, combinations, test_periods, cv = self._grid(strategy_params, indicator_params, cv, seed, start_dates, 
+                                                       chunk_size is None and queue is None, verbose=False)
+        for _, _, result in self._sweep(combinations, test_periods, cv, seed, checkpoint, chunk_size, overlap, queue):
+            yield result
+    
+    def monte_carlo(self, n_paths: int = 1000, method: str = 'bootstrap', strategy_params: dict = None, 
+                    indicator_params: dict = None, block_size: int = 390, length: int = None, slippage: float = 0.0,
+                    seed: int = None, n_processes: int = None, batch_size: int = 16, store: str = None,
+                    progressbar: bool = True) -> MonteCarloResult:
+        '''
+        Tests the robustness of the strategy on many randomised paths, returning the distribution of its ROI, 
+        Sharpe ratio and drawdown. Only the summary of each path is kept, so tens of thousands of paths can be run.
+
+        Methods:
+        - ``'bootstrap'``: the strategy is run on price paths made by a block bootstrap of the bars in the data 
+          (see ``iter_monte_carlo``), in parallel batches.
+        - ``'shuffle'``: the round trips of a single run over the whole data are put in a random order, giving the 
+          distribution of drawdowns (the ROI only changes with slippage, and the Sharpe ratio is per round trip).
+
+        ## Parameters
+        - ``n_paths`` (``int``): The number of paths.
+        - ``method`` (``str``): ``'bootstrap'`` or ``'shuffle'``.
+        - ``strategy_params`` (``dict``): The parameters of the strategy.
+        - ``indicator_params`` (``dict``): The parameters of the indicators.
+        - ``block_size`` (``int``): The number of consecutive bars resampled together, keeping any autocorrelation 
+          shorter than a block (default one trading day of minute bars).
+        - ``length`` (``int``): The number of bars in each path, defaults to the length of the data.
+        - ``slippage`` (``float``): The scale of the random slippage charged on each trade, as a fraction of the 
+          value traded.
+        - ``seed`` (``int``): The seed to use for the random number generator.
+        - ``n_processes`` (``int``): The number of processes to run paths on, ``None`` uses one per CPU.
+        - ``batch_size`` (``int``): The number of paths in each batch sent to a process.
+        - ``store`` (``str``): A SQLite (or ``.parquet``) file to also write the summary of each path to.
+        - ``progressbar`` (``bool``): Whether to show a progress bar.
+
+        ## Returns
+        result (``MonteCarloResult``): The distribution of the metrics over the paths.
+        '''
+        summaries = dict()
+        for summary in self.iter_monte_carlo(n_paths, method, strategy_params, indicator_params, block_size, length,
+                                             slippage, seed, n_processes, batch_size, store, progressbar):
+            for name, value in summary.items():
+                if name not in summaries:
+                    summaries[name] = np.empty(n_paths, dtype='float64' if name != 'path' else 'int64')
+                summaries[name][summary['path']] = value
+
+        return MonteCarloResult(summaries, (self._strategy_params(strategy_params), 
+                                self._indicators._fill_in_params(indicator_params or dict())), method)
+
+    def iter_monte_carlo(self, n_paths: int = 1000, method: str = 'bootstrap', strategy_params: dict = None, 
+                         indicator_params: dict = None, block_size: int = 390, length: int = None, slippage: float = 0.0,
+                         seed: int = None, n_processes: int = None, batch_size: int = 16, store: str = None,
+                         progressbar: bool = False):
+        '''
+        Generator version of ``monte_carlo``, yielding a dictionary of the metrics of each path as it completes.
+
+        A bootstrapped path starts from the first bar of the data, and is built from blocks of ``block_size`` 
+        consecutive bars chosen at random, each bar's prices being taken relative to the previous close. Every 
+        stock is resampled together, so their correlations are kept.
+        '''
+        if method not in ('bootstrap', 'shuffle'):
+            raise ValueError(f"method must be 'bootstrap' or 'shuffle', not {method}")
+        if method == 'bootstrap' and self._data.ragged:
+            raise ValueError("Bootstrapped paths need every stock to have every bar, use method='shuffle' on ragged data")
+
+        strategy_params = self._strategy_params(strategy_params)
+        indicator_params = self._indicators._fill_in_params(indicator_params or dict())
+        seed = seed or random.randint(0, 2**32)
+
+        if method == 'shuffle':
+            result = self.run(strategy_params, indicator_params, start_dates=[(np.int64(0), np.int64(len(self._data)))], 
+                              progressbar=False)[0]
+            paths = _montecarlo.shuffle(*_montecarlo.round_trips(result._values, result.trades, self._fee), 
+                                        n_paths, slippage, seed)
+        else:
+            state = {'strategy_class': self._strategy, 'indicator_class': type(self._indicators),
+                     'strategy_params': strategy_params, 'indicator_params': indicator_params,
+                     'jit': issubclass(self._strategy, JitStrategy),
+                     'stocks': self.stocks, 'data': self._data._data, 'times': self._data._times[:len(self._data)],
+                     'length': length or len(self._data), 'block_size': block_size, 'slippage': slippage,
+                     'delta_limits': self._delta_limits, 'fee': self._fee}
+            paths = _montecarlo.simulate(state, n_paths, batch_size, seed, n_processes)
+
+        if store is not None:
+            store = ResultStore(store)
+        try:
+            for summary in (tqdm(paths, desc=f'> Monte Carlo ({method})', total=n_paths) if progressbar else paths):
+                if store is not None:
+                    store.append_rows([summary])
+                yield summary
+        finally:
+            if store is not None:
+                store.close()
+
+    def refresh(self) -> int:
+        '''
+        Loads the bars that have been appended to the data files since the backtester was created. Cached 
+        indicators (for every parameter set) are extended to the new bars using their online form where they 
+        have one, so only the new data is processed, and are recomputed otherwise.
+
+        ## Returns
+        ``int``: The number of new bars.
+        '''
+        n = self._data.refresh()
+        if n > 0:
+            self._indicators._extend()
+        return n
+    
+    def compare_backends(self, strategy_params: dict = None, indicator_params: dict = None, 
+                         cv: int = 1, seed: int = None, start_dates: list = None) -> MultiRunResult:
+        '''
+        Runs a ``JitStrategy`` with both the ``'python'`` and ``'jit'`` backends on the same test periods and checks 
+        they make the same trades and produce the same value history, raising ``ValueError`` if they don't.
+
+        ## Parameters
+        - ``strategy_params`` (``dict``): The parameters of the strategy.
+        - ``indicator_params`` (``dict``): The parameters of the indicators.
+        - ``cv`` (``int``): The number of cross-validation folds to use.
+        - ``seed`` (``int``): The seed to use for the random number generator.
+        - ``start_dates`` (``list``): List of start dates to test on.
+
+        ## Returns
+        result (``MultiRunResult``): The results of the compiled run.
+        '''
+        seed = seed or random.randint(0, 2**32)
+        kwargs = dict(strategy_params=strategy_params, indicator_params=indicator_params, cv=cv, seed=seed, 
+                      start_dates=start_dates, progressbar=False)
+        python, jit = self.run(**kwargs, backend='python'), self.run(**kwargs, backend='jit')
+
+        for a, b in zip(python, jit):
+            for x, y in ((a.buys, b.buys), (a.sells, b.sells)):
+                if [t[:2] for t in x] != [t[:2] for t in y] or not np.allclose([t[2] for t in x], [t[2] for t in y]):
+                    raise ValueError(f'Backends made different trades over bars {a._start} to {a._end}')
+            for stock in self.stocks:
+                if not np.allclose(a.value[stock], b.value[stock], equal_nan=True):
+                    raise ValueError(f'Backends produced different values for {stock} over bars {a._start} to {a._end}')
+        return jit
+
+    #---------------[Private Methods]-----------------#
+    def _grid(self, strategy_params: dict, indicator_params: dict, cv: int, seed: int, start_dates: list, 
+              compute: bool, verbose: bool) -> tuple:
+        # the strategy parameters (with defaults), every combination of parameters and the test periods of a sweep
         # ----[strategy params]----
         strategy_params = strategy_params or dict()
 
@@ -357,16 +605,16 @@ class Backtester:
         # ----[indicator params]----
         
         indicator_params = indicator_params or dict()
-        indicator_params_list = self._indicators._get_permutations(indicator_params)
+        self._indicators._raise_invalid_params(indicator_params)
 
-        print('> Backtesting the across the following ranges:')
-        print('Agorithm Parameters', default_strategy_params)
-        print('Indicator Parameters', self._indicators._fill_in_params(indicator_params))
+        if verbose:
+            print('> Backtesting the across the following ranges:')
+            print('Agorithm Parameters', default_strategy_params)
+            print('Indicator Parameters', self._indicators._fill_in_params(indicator_params))
 
-        # run
-        seed = seed or self._random.randint(0, 2**32)
+        # the periods have to be reproducible from the seed for a checkpointed sweep to be resumed
+        self._random.seed(seed or self._random.randint(0, 2**32))
                 
-        # print('get periods')
         if start_dates is not None:
             if not isinstance(start_dates, list):
                 raise ValueError('start_dates must be a list')
@@ -375,17 +623,105 @@ class Backtester:
 
             test_periods = self._get_periods(start_dates)
         else:
-            # print(cv)
             test_periods = self._get_random_periods(cv) 
-        total = len(strategy_params_list) * len(indicator_params_list)
-        res = [None for _ in range(total)]
 
-        for i, (alg_params, ind_params) in tqdm(enumerate(list(product(strategy_params_list, indicator_params_list))), total=total, desc=f"Running paramter sweep (cv={cv})"):
-            res[i] = self.run(strategy_params=alg_params, indicator_params=ind_params, cv=cv, seed=seed, progressbar=False, start_dates=test_periods)
-        
-        return ParameterSweepResult(res, (default_strategy_params, self._indicators._fill_in_params(indicator_params)))
-    
-    #---------------[Private Methods]-----------------#
+        # indicators with a lookback are only computed over the test periods, and by each run when it is chunked or
+        # by the workers when the sweep is distributed
+        indicator_params_list = self._indicators._get_permutations(indicator_params, test_periods, compute=compute)
+        return default_strategy_params, list(product(strategy_params_list, indicator_params_list)), test_periods, cv
+
+    def _test_periods(self, cv: int, seed: int, start_dates: list) -> list:
+        # the (start, end) bars of each fold of a run
+        self._random.seed(seed or random.randint(0, 2**32))
+        if start_dates is not None:
+            if not isinstance(start_dates, list):
+                raise ValueError('start_dates must be a list')
+            return self._get_periods(start_dates)
+        return self._get_random_periods(cv)
+
+    def _queue(self, queue: Union[str, WorkQueue]) -> WorkQueue:
+        if queue is None:
+            return None
+        if isinstance(queue, str):
+            queue = WorkQueue(queue)
+        for cls in (self._strategy, type(self._indicators)):
+            if cls.__module__ == '__main__':
+                raise ValueError(f'{cls.__name__} is defined in __main__, so workers can\'t import it, move it to a module')
+        return queue
+
+    def _sweep(self, combinations: list, periods: list, cv: int, seed: int, checkpoint: str, chunk_size: int, 
+               overlap: int, queue: WorkQueue):
+        # yields the index, key and result of each combination as it completes, saving new results to the checkpoint
+        keys = [self._run_key(alg_params, ind_params, periods) for alg_params, ind_params in combinations]
+        checkpoint = Checkpoint(checkpoint) if checkpoint is not None else None
+        try:
+            for i, result, new in self._completed(combinations, keys, checkpoint, queue, periods, cv, seed, chunk_size, overlap):
+                if not new:
+                    self._attach(result)
+                elif checkpoint is not None:
+                    checkpoint.put(keys[i], result)
+                yield i, keys[i], result
+        finally:
+            if checkpoint is not None:
+                checkpoint.close()
+
+    def _completed(self, combinations: list, keys: list, checkpoint: Checkpoint, queue: WorkQueue, periods: list, 
+                   cv: int, seed: int, chunk_size: int, overlap: int):
+        # yields the index and result of each combination of a sweep as it completes, and whether it was just run
+        pending = []
+        for i, (key, (alg_params, ind_params)) in enumerate(zip(keys, combinations)):
+            result = checkpoint.get(key) if checkpoint is not None else None
+            if result is not None:
+                yield i, result, False
+            elif queue is None:
+                yield i, self.run(strategy_params=alg_params, indicator_params=ind_params, cv=cv, seed=seed, progressbar=False, 
+                                  start_dates=periods, chunk_size=chunk_size, overlap=overlap), True
+            else:
+                pending.append(i)
+
+        if not pending:
+            return
+        job = {'strategy_class': self._strategy, 'indicator_class': type(self._indicators), 'stocks': self.stocks, 
+               'fingerprint': self._data.fingerprint, 'fee': self._fee, 'delta_limits': self._delta_limits, 
+               'periods': periods, 'chunk_size': chunk_size, 'overlap': overlap}
+        # data that wasn't loaded from a folder has to be given to the workers with --data
+        if self._data._data_folder is not None:
+            job['data_folder'] = os.path.abspath(self._data._data_folder)
+        job_id = queue.publish(job, [combinations[i] for i in pending])
+        for task, result in queue.collect(job_id, len(pending)):
+            yield pending[task], self._attach(result), True
+
+    def _jit_arrays(self, indicator_params: dict, strategy_params: dict, periods: list = None) -> tuple:
+        return _jit.build_arrays(self._data, self._indicators, indicator_params, self._strategy, strategy_params, periods)
+
+    def _strategy_params(self, strategy_params: dict) -> dict:
+        # fill in missing parameters with defaults
+        if strategy_params and not isinstance(strategy_params, dict):
+            raise TypeError(f'strategy_params must be of type dict, not {type(strategy_params)}')
+        return {**self.strategy.params, **(strategy_params or dict())}
+
+    def _remember(self, result: MultiRunResult, key: str) -> MultiRunResult:
+        if key is not None:
+            self._result_cache.put(key, result)
+        return result
+
+    def _attach(self, result: MultiRunResult) -> MultiRunResult:
+        # results loaded from disk are stored without the stock data
+        for single in result:
+            if single._stockdata is None:
+                single._attach(self._data)
+        return result
+
+    def _run_key(self, strategy_params: dict, indicator_params: dict, periods: list, backend: str = 'python') -> str:
+        # identifies a run by everything its result depends on
+        key = (self._strategy.__name__, source_hash(self._strategy), 
+               type(self._indicators).__name__, source_hash(type(self._indicators)), backend,
+               sorted(strategy_params.items()),
+               sorted((funcn, sorted(params.items())) for funcn, params in indicator_params.items()),
+               [(int(start), int(end)) for start, end in periods],
+               self._fee, sorted(self._delta_limits.items()), self._data.fingerprint)
+        return hashlib.sha256(repr(key).encode()).hexdigest()
+
     def _get_random_periods(self, n: int) -> list:
 
         if self._days == 'all':
@@ -1,14 +1,19 @@
 
+import warnings
 from functools import wraps
 from inspect import signature, getmembers, Parameter
 from itertools import product
 from collections import defaultdict
+from multiprocessing.pool import ThreadPool
+from threading import local, Lock
 from numpy import array
+import numpy as np
 from .opt._stockdata import StockData
+from .opt._lazy import tqdm
 
 class Indicators:
 
-    def __init__(self, data: str=None):
+    def __init__(self, data: str=None, n_threads: int=None):
 
         '''
         # Indicators Base Class
@@ -41,6 +46,81 @@ class Indicators:
         output = {'double_close': [2, 4, 6, ...], 'triple_volume': [300, 600, 900, ...], ...}
         ```
 
+        ## NumPy Indicators
+        Passing ``numpy=True`` to either decorator skips pandas entirely: the function is given zero-copy 
+        structured NumPy views of the price data instead of dataframes (a single view for ``MultiIndicator``, 
+        a dictionary of views for ``SingleIndicator``). Each field (``view['close']``, ...) is a plain 
+        ``float64`` array, and ``qfinuwa.rolling`` provides vectorised rolling primitives to use on them.
+
+        ```python
+        from qfinuwa import rolling
+
+        @Indicators.MultiIndicator(numpy=True)
+        def fast_bollingers(self, data, lookback = 20, n_std = 3):
+            tp = (data['close'] + data['low'] + data['high']) / 3
+            matp = rolling.mean(tp, lookback)
+            std = rolling.std(tp, lookback)
+            return {'upper_bollinger': matp + n_std * std, 'lower_bollinger': matp - n_std * std}
+        ```
+
+        ## Parallelism
+        Indicators are computed on a thread pool of ``n_threads`` threads (one task per stock and parameter set), 
+        ``None`` uses one thread per CPU. Most pandas and NumPy operations release the GIL, so this speeds up 
+        precomputing large universes and sweeps. Use ``n_threads=1`` if your indicator functions are not thread safe.
+
+        ## Lookbacks
+        Indicators are computed over the whole dataset unless they declare a ``lookback``: the number of bars before 
+        a bar that its value depends on, as an ``int``, a function of the indicator's parameters, or ``'auto'`` for 
+        the sum of its integer parameters. ``Backtester.run`` and ``run_grid_search`` then only compute them over the 
+        test periods (and the lookback before each, as history for the strategy's first bars) plus the warm-up bars, 
+        filling in the bars they are missing as more periods are run. They must return one value per bar, and bars 
+        that haven't been computed are ``NaN``.
+
+        ```python
+            @Indicators.MultiIndicator(numpy=True, lookback=lambda lookback, **_: lookback)
+            def sma(self, data, lookback = 20):
+                return {'sma': rolling.mean(data['close'], lookback)}
+        ```
+
+        ## Online Indicators
+        An indicator can optionally provide an online form that computes its values for newly appended bars only, 
+        given a ``state`` dictionary that persists between calls (one per stock and parameter set). It takes the same 
+        parameters as the indicator and receives the new bars in the same form as the indicator receives its data. 
+        When present, it is used to extend cached indicators as data arrives (e.g. in ``StreamingBacktester``) 
+        instead of recomputing them over the entire history. The online classes in ``qfinuwa.rolling`` 
+        update in O(1) time per bar.
+
+        ```python
+            @Indicators.MultiIndicator(numpy=True)
+            def sma(self, data, lookback = 20):
+                return {'sma': rolling.mean(data['close'], lookback)}
+
+            @sma.update
+            def sma(self, state, new_bars, lookback = 20):
+                if 'mean' not in state:
+                    state['mean'] = rolling.Mean(lookback)
+                return {'sma': state['mean'].update(new_bars['close'])}
+        ```
+
+        ## Stages
+        When sweeping over parameters, parts of an indicator often only depend on some of them (e.g. the rolling 
+        statistics of ``bollingers`` depend on ``lookback`` but not ``n_std``). Methods decorated with 
+        ``@Indicators.Stage`` are cached per stock on the parameters they are called with, so they are only 
+        evaluated once for each distinct combination. Stages take the stock data as their first argument and 
+        may call other stages.
+
+        ```python
+            @Indicators.Stage
+            def rolling_tp(self, df, lookback):
+                tp = (df['close'] + df['low'] + df['high']) / 3
+                return tp.rolling(lookback).mean(), tp.rolling(lookback).std()
+
+            @Indicators.MultiIndicator
+            def bollingers(self, df, lookback = 20, n_std = 3):
+                matp, std = self.rolling_tp(df, lookback)
+                return {'upper_bollinger': matp + n_std * std, 'lower_bollinger': matp - n_std * std}
+        ```
+
         ## Indicators in ``on_data``
 
         Your indicators will be passed into ``on_data`` as a dictionary of indicator names and values.
@@ -91,9 +171,10 @@ class Indicators:
         '''
         self._NULL_STOCK = '.'
         self.params = self.defaults
+        self.n_threads = n_threads
 
         if data is None:
-            stockdata = StockData()
+            self._stockdata = StockData()
             return
         elif isinstance(data, str):
             stockdata = StockData(data_folder=data)
@@ -102,28 +183,86 @@ class Indicators:
         else:
             raise TypeError(f"Expected data to be of type str or StockData, got {type(data)} instead.")
 
-        self._data = stockdata._stock_df
-        self._index = stockdata._index
-        self._L = len(stockdata)
+        self._stockdata = stockdata
         self._cache = dict()
+        self._coverage = dict()
+        self._buffers = dict()
+        self._matrices = dict()
+        self._online_states = dict()
+        self._recomputed = set()
+        self._stage_cache = dict()
+        self._stage_locks = dict()
+        self._stage_lock = Lock()
+        self._local = local()
         self._funcn_to_indicator_map = dict()
-        self._add_parameters(self.params)
+        # out of core data is too large to compute every indicator over up front, they are computed in chunks
+        if not stockdata.out_of_core:
+            self._add_parameters(self.params)
 
     #---------------[Class Methods]-----------------#
     @classmethod
-    def SingleIndicator(cls, func):
+    def SingleIndicator(cls, func=None, *, numpy: bool = False, lookback=None):
+        if func is None:
+            return lambda f: cls.SingleIndicator(f, numpy=numpy, lookback=lookback)
+
         @wraps(func)
         def wrapper_func(*_args, **_kwargs):
             return func(*_args, **_kwargs)
         wrapper_func.SingleIndicator = True
-        return wrapper_func
+        wrapper_func.numpy = numpy
+        wrapper_func.lookback = cls._check_lookback(lookback)
+        return cls._online(wrapper_func)
     
     @classmethod
-    def MultiIndicator(cls, func):
+    def MultiIndicator(cls, func=None, *, numpy: bool = False, lookback=None):
+        if func is None:
+            return lambda f: cls.MultiIndicator(f, numpy=numpy, lookback=lookback)
+
         @wraps(func)
         def wrapper_func(*_args, **_kwargs):
             return func(*_args, **_kwargs)
         wrapper_func.MultiIndicator = True
+        wrapper_func.numpy = numpy
+        wrapper_func.lookback = cls._check_lookback(lookback)
+        return cls._online(wrapper_func)
+    
+    @classmethod
+    def _check_lookback(cls, lookback):
+        if lookback is None or lookback == 'auto' or callable(lookback):
+            return lookback
+        if isinstance(lookback, bool) or not isinstance(lookback, int) or lookback < 0:
+            raise ValueError(f"lookback must be a non-negative int, a function of the parameters or 'auto', not {lookback}")
+        return lookback
+    
+    @classmethod
+    def _online(cls, wrapper_func):
+        # lets the indicator register its online form with @indicator.update
+        def update(func):
+            wrapper_func.online = func
+            return wrapper_func
+        wrapper_func.online = None
+        wrapper_func.update = update
+        return wrapper_func
+
+    @classmethod
+    def Stage(cls, func):
+        @wraps(func)
+        def wrapper_func(self, data, *_args, **_kwargs):
+            if getattr(self, '_stage_context', None) is None:
+                return func(self, data, *_args, **_kwargs)
+
+            source, held = _stage_input(data)
+            key = (func.__name__, self._stage_context, source, _args, tuple(sorted(_kwargs.items())))
+            with self._stage_lock:
+                lock = self._stage_locks.setdefault(key, Lock())
+
+            # other threads needing the same stage wait for it rather than recomputing it
+            with lock:
+                if key not in self._stage_cache:
+                    # the input is kept with the result so its memory can't be reused (and mistaken for it) in the batch
+                    self._stage_cache[key] = (func(self, data, *_args, **_kwargs), held)
+            return self._stage_cache[key][0]
+        wrapper_func.Stage = True
         return wrapper_func
     
     #---------------[Properties]-----------------#
@@ -147,10 +286,13 @@ class Indicators:
     def _indicator_functions(self):
         # TODO: filter by only functions
         cls = type(self)
-    
-        return {k: v for k, v in getmembers(cls)
-                if callable(v) 
-                and any(map(lambda x: hasattr(getattr(cls, k), x),  ['SingleIndicator', 'MultiIndicator']))} 
+
+        # looking through the class members is slow, and they are needed on every bar when streaming
+        if '_indicator_functions_cache' not in self.__dict__:
+            self._indicator_functions_cache = {k: v for k, v in getmembers(cls)
+                    if callable(v) 
+                    and any(map(lambda x: hasattr(getattr(cls, k), x),  ['SingleIndicator', 'MultiIndicator']))} 
+        return self._indicator_functions_cache
     @property
     def defaults(self):
         
@@ -163,9 +305,29 @@ class Indicators:
        
         return {name: get_defaults(function) for name, function in self._indicator_functions.items()}
 
+    @property
+    def _stage_context(self):
+        return getattr(self._local, 'stage_context', None)
+
+    @_stage_context.setter
+    def _stage_context(self, context):
+        self._local.stage_context = context
+
     @property
     def _stocks(self):
-        return list(self._data.keys())
+        return self._stockdata._frame_order
+    
+    @property
+    def _data(self):
+        return self._stockdata._stock_df
+
+    @property
+    def _index(self):
+        return self._stockdata._index
+
+    @property
+    def _L(self):
+        return len(self._stockdata)
     
     @property
     def index(self):
@@ -223,6 +385,9 @@ class Indicators:
             raise ValueError(f'Invalid indicator function name: {indicator_function_name}')
         return hasattr(getattr(type(self), indicator_function_name), 'MultiIndicator')
 
+    def _is_numpy(self, indicator_function_name):
+        return getattr(getattr(type(self), indicator_function_name), 'numpy', False)
+
     def _fill_in_params(self, params):
         curr_params = {k: {k1:v1 for k1, v1 in v.items()} for k,v in self.params.items()}
         for indicator in params:   
@@ -240,42 +405,264 @@ class Indicators:
             if f_params.keys() - defaults[func_name].keys():
                 raise ValueError(f'Indicator(s) not found in {func_name}: {f_params.keys() - defaults[func_name].keys()}')
 
-    def _add_parameters(self, params):
+    def _add_parameters(self, params, windows=None):
 
         self._raise_invalid_params(params)
 
-        for func_name, f_params in params.items():
+        for func_name in params:
             if func_name not in self._indicator_functions:
                 raise ValueError(f'Indicator function {func_name} not found')
 
-            self._add_indicator(func_name, self._indicator_functions[func_name], f_params) 
-
+        self._add_indicators(params.items(), windows)
 
     def _add_indicator(self, func_name, func, params = None):
         
         if params is None:
             params = self.defaults[func_name]
 
-        if self._is_cached(func_name, params):
+        self._add_indicators([(func_name, params)])
+
+    def _add_indicators(self, tasks, windows=None):
+        '''
+        Computes and caches indicators for ``(function name, params)`` tasks. Indicators with a lookback are only 
+        computed over the bars of ``windows`` (``(start, end)`` pairs, every bar if ``None``) and the lookback before
+        them that they are missing, plus their warm-up, the rest are computed over every bar.
+        '''
+        functions = self._indicator_functions
+        everything = [(0, self._L)]
+
+        # the gaps in each parameter set's coverage, dropping anything already covered (or requested twice)
+        gaps = dict()
+        for func_name, params in tasks:
+            key = self._hashable(func_name, params)
+            if key in gaps:
+                continue
+            lookback = self._lookback(func_name, params)
+            if key not in self._cache and (lookback is None or windows is None):
+                gaps[key] = (func_name, params, [(0, 0, self._L)])
+                continue
+            covered = self._coverage.get(key, everything if key in self._cache else [])
+            # the strategy sees the values over the lookback before each window as its history
+            missing = _subtract(_merge(everything if lookback is None or windows is None else 
+                                       [(max(0, start - lookback), end) for start, end in windows]), covered)
+            if missing:
+                # computing the bars between nearby gaps costs no more than their warm-up
+                gaps[key] = (func_name, params, [(max(0, start - (lookback or 0)), start, end) 
+                                                 for start, end in _merge(missing, lookback or 0)])
+        if not gaps:
             return
-        
-        to_cache = dict()
-        for stock, data in (self._data.items() if self._is_multi(func_name) else [(self._NULL_STOCK, self._data)]):
+        tasks = [(func_name, params) for func_name, params, _ in gaps.values()]
+
+        jobs = [(func_name, functions[func_name], params, stock, window) for func_name, params, intervals in gaps.values()
+                for window in intervals for stock in (self._stocks if self._is_multi(func_name) else [self._NULL_STOCK])]
 
+        outputs = defaultdict(dict)
+        progressbar = self._stockdata._verbose and len(jobs) > 1
+        if self.n_threads == 1 or len(jobs) == 1:
+            computed = map(self._compute_indicator, jobs)
+            for key, stock, window, out in (tqdm(computed, desc='> Computing indicators', total=len(jobs)) if progressbar else computed):
+                outputs[key][stock, window] = out
+        else:
+            with ThreadPool(self.n_threads) as pool:
+                computed = pool.imap_unordered(self._compute_indicator, jobs)
+                for key, stock, window, out in (tqdm(computed, desc='> Computing indicators', total=len(jobs)) if progressbar else computed):
+                    outputs[key][stock, window] = out
+
+        # stages only need to outlive the batch of indicators that share them
+        self._stage_cache.clear()
+        self._stage_locks.clear()
+
+        # results arrive in any order, so rebuild them in stock order
+        for func_name, params in tasks:
+            stocks = self._stocks if self._is_multi(func_name) else [self._NULL_STOCK]
+            key = self._hashable(func_name, params)
+            intervals = gaps[key][2]
+            out = outputs[key]
+
+            self._funcn_to_indicator_map[func_name] = sorted(list(out[stocks[-1], intervals[-1]].keys()))
+
+            if key not in self._cache and intervals == [(0, 0, self._L)]:
+                to_cache = {indicator: {stock: out[stock, intervals[0]][indicator] for stock in stocks} 
+                            for indicator in self._funcn_to_indicator_map[func_name]}
+                self._cache_indicator(func_name, params, to_cache)
+                self._coverage[key] = everything
+                continue
+
+            # bars outside the coverage are left as NaN
+            to_cache = self._cache.get(key) or {indicator: {stock: np.full(self._L, np.nan) for stock in stocks} 
+                                                for indicator in self._funcn_to_indicator_map[func_name]}
+            for (stock, (_, start, end)), values in out.items():
+                for indicator, value in values.items():
+                    to_cache[indicator][stock][start:end] = value
+            self._cache_indicator(func_name, params, to_cache)
+            self._coverage[key] = _merge(self._coverage.get(key, []) + [(start, end) for _, start, end in intervals])
+
+    def _compute_indicator(self, job):
+        # window is (first bar of the warm-up, start, end), and the values of bars start to end are returned
+        func_name, func, params, stock, window = job
+        first, start, end = window
+
+        # on ragged data a stock's indicators only see the bars it has, with the same number of bars of warm-up
+        compact = self._stockdata.ragged and stock != self._NULL_STOCK
+        if compact:
+            bars = self._stockdata._stock_bars(stock)
+            lo, hi = np.searchsorted(bars, [start, end])
+            first = max(0, lo - (start - first))
+            data = self._stockdata._rows(stock, bars[first: hi], self._is_numpy(func_name))
+        elif window == (0, 0, self._L):
+            stock_data = self._stockdata.arrays if self._is_numpy(func_name) else self._data
+            data = stock_data if stock == self._NULL_STOCK else stock_data[stock]
+        else:
+            data = self._bars(func_name, stock, first, end)
+
+        self._stage_context = (stock, self._is_numpy(func_name), window)
+        try:
             out = func(self, data, **params)
-            if not isinstance(out, dict):
-                raise ValueError(f'Indicator function {func_name} must return a dict')
+        finally:
+            self._stage_context = None
 
-            self._funcn_to_indicator_map[func_name] = sorted(list(out.keys()))
-    
+        if not isinstance(out, dict):
+            raise ValueError(f'Indicator function {func_name} must return a dict')
+
+        if compact:
+            out = {indicator: np.asarray(value, dtype='float64') for indicator, value in out.items()}
             for indicator, value in out.items():
-                if indicator not in to_cache:
-                    to_cache[indicator] = dict()
-                to_cache[indicator].update({stock: value}) 
+                if len(value) != hi - first:
+                    raise ValueError(f'Indicator {indicator} of {func_name} must have one value per bar to be computed on ragged data')
+            out = {indicator: self._spread(stock, start, end, value[lo - first:]) for indicator, value in out.items()}
+        elif window != (0, 0, self._L):
+            out = {indicator: np.asarray(value, dtype='float64') for indicator, value in out.items()}
+            for indicator, value in out.items():
+                if len(value) != end - first:
+                    raise ValueError(f'Indicator {indicator} of {func_name} must have one value per bar to be computed with a lookback')
+            out = {indicator: value[start - first:] for indicator, value in out.items()}
+
+        return self._hashable(func_name, params), stock, window, out
+
+    def _lookback(self, func_name, params):
+        # the number of bars before a bar that its value depends on, None if it isn't known
+        lookback = getattr(self._indicator_functions[func_name], 'lookback', None)
+        if lookback == 'auto':
+            return sum(v for v in params.values() if isinstance(v, int) and not isinstance(v, bool) and v > 0)
+        if callable(lookback):
+            return int(lookback(**params))
+        return lookback
+
+    def _extend(self):
+        '''
+        Brings every cached indicator up to date with bars appended to the data since it was computed, using
+        the indicator's online form where it has one, recomputing the new bars from their warm-up if it has a 
+        lookback and recomputing every bar otherwise (warning once about each such indicator).
+        '''
+        functions = self._indicator_functions
+        recomputed = set()
+
+        for key, values in self._cache.items():
+            func_name, params = key[0], dict(key[1])
+            func = functions[func_name]
+
+            # the (bars, stocks) matrices handed out by _matrix are filled in along with their columns
+            matrices = {indicator: self._matrices[(key, indicator)] for indicator in values 
+                        if (key, indicator) in self._matrices}
+            for indicator, matrix in matrices.items():
+                if len(matrix) < self._L:
+                    grown = np.empty((2*self._L, matrix.shape[1]))
+                    grown[:len(matrix)] = matrix
+                    matrices[indicator] = self._matrices[(key, indicator)] = grown
+
+            for s, stock in enumerate(self._stocks if hasattr(func, 'MultiIndicator') else [self._NULL_STOCK]):
+                start = len(next(iter(values.values()))[stock])
+                if start == self._L:
+                    continue
+
+                lookback = self._lookback(func_name, params)
+                if func.online is None and lookback is not None:
+                    _, _, _, out = self._compute_indicator((func_name, func, params, stock, 
+                                                            (max(0, start - lookback), start, self._L)))
+                elif func.online is None:
+                    _, _, _, out = self._compute_indicator((func_name, func, params, stock, (0, 0, self._L)))
+                    out = {indicator: value[start:] for indicator, value in out.items()}
+                    recomputed.add(func_name)
+                else:
+                    state = self._online_states.get((key, stock))
+                    if state is None:
+                        # the first extension replays the history to build up the state
+                        state = self._online_states[(key, stock)] = dict()
+                        func.online(self, state, self._bars(func_name, stock, 0, start), **params)
+                    new_bars = self._bars(func_name, stock, start, self._L)
+                    if len(new_bars) == 0:
+                        out = {indicator: np.empty(0) for indicator in values}
+                    else:
+                        out = func.online(self, state, new_bars, **params)
+                    if self._stockdata.ragged and stock != self._NULL_STOCK:
+                        out = {indicator: self._spread(stock, start, self._L, value) for indicator, value in out.items()}
+
+                for indicator in values:
+                    values[indicator][stock] = self._grow((key, indicator, stock), values[indicator][stock], out[indicator])
+                    if indicator in matrices:
+                        matrices[indicator][start: self._L, s] = out[indicator]
+                if key in self._coverage:
+                    self._coverage[key] = _merge(self._coverage[key] + [(start, self._L)])
+
+        self._stage_cache.clear()
+        self._stage_locks.clear()
+
+        recomputed -= self._recomputed
+        if recomputed:
+            self._recomputed |= recomputed
+            warnings.warn(f'{sorted(recomputed)} have neither an online form nor a lookback, so they are recomputed '
+                          'over every bar each time bars are appended', RuntimeWarning, stacklevel=2)
+
+    def _bars(self, func_name, stock, start, end):
+        
+        numpy = self._is_numpy(func_name)
 
-        self._cache_indicator(func_name, params, to_cache)
+        if self._stockdata.ragged and stock != self._NULL_STOCK:
+            bars = self._stockdata._stock_bars(stock)
+            return self._stockdata._rows(stock, bars[slice(*np.searchsorted(bars, [start, end]))], numpy)
 
-    def _get_permutations(self, funcn_to_params):
+        def bars(stock):
+            if numpy:
+                return self._stockdata.arrays[stock][start:end]
+            return self._stockdata._frame(stock, start, end)
+        
+        if stock == self._NULL_STOCK:
+            return {stock: bars(stock) for stock in self._stocks}
+        return bars(stock)
+
+    def _spread(self, stock, start, end, values):
+        # the values of the bars from start to end a stock has, spread over every bar with NaN where it has none
+        bars = self._stockdata._stock_bars(stock)
+        bars = bars[slice(*np.searchsorted(bars, [start, end]))]
+        out = np.full(end - start, np.nan)
+        out[bars - start] = values
+        return out
+
+    def _grow(self, buffer_key, values, tail):
+        tail = np.asarray(tail, dtype='float64')
+        n = len(values)
+        
+        buffer = self._buffers.get(buffer_key)
+        if buffer is None or getattr(values, 'base', None) is not buffer or n + len(tail) > len(buffer):
+            buffer = np.empty(max(2*(n + len(tail)), 64))
+            buffer[:n] = values
+            self._buffers[buffer_key] = buffer
+
+        buffer[n: n + len(tail)] = tail
+        return buffer[:n + len(tail)]
+
+    def _matrix(self, function_name, params, indicator):
+        # a (bars, stocks) view of a multi indicator, whose buffer _extend fills in as bars are appended
+        key = (self._hashable(function_name, params), indicator)
+        buffer = self._matrices.get(key)
+        if buffer is None:
+            cached = self._get_cached(function_name, params, indicator)
+            buffer = np.empty((max(2*self._L, 64), len(self._stocks)))
+            buffer[:self._L] = np.column_stack([cached[stock] for stock in self._stocks])
+            self._matrices[key] = buffer
+        return buffer[:self._L]
+
+    def _get_permutations(self, funcn_to_params, windows=None, compute=True):
 
         self._raise_invalid_params(funcn_to_params)
         
@@ -293,9 +680,11 @@ class Indicators:
                             for v in product(*val)]
 
             for perm in permutations_dicts:                
-                self._add_indicator(indicator, self._indicator_functions[indicator], perm)
                 combinations[indicator].append(perm)
 
+        if compute:
+            self._add_indicators(((indicator, perm) for indicator, perms in combinations.items() for perm in perms), windows)
+
         # get every combination of different indicators
         every_combination =  [dict(zip(combinations.keys(), c)) for c in product(*combinations.values())]
 
@@ -303,20 +692,114 @@ class Indicators:
 
     def _iterate_params(self, params=None, copies=None):
 
+        self._indicators_iterations = self._iteration_arrays(params)
+        if copies is None:
+            self.__iter__()
+        # TODO: needlessly recreating iterator - could we just reset iterator related fields
+        #       and iterate again? maybe a modulo type situation?
+        return tuple(self.__iter__() for _ in range(copies))
+    
+    def _iteration_arrays(self, params=None, windows=None):
+        # maps every indicator to a (stocks, bars) array, with a single row for single indicators
         if params is None:
             params = self.params
 
         params = self._fill_in_params(params)
-        self._add_parameters(params)
+        self._add_parameters(params, windows)
 
         # params maps function name to parameters
-        self._indicators_iterations = {indicator: array(list(self._get_cached(funcn, params[funcn], indicator).values())) for funcn, indicators in self._funcn_to_indicator_map.items() for indicator in indicators}
-        if copies is None:
-            self.__iter__()
-        # TODO: needlessly recreating iterator - could we just reset iterator related fields
-        #       and iterate again? maybe a modulo type situation?
-        return tuple(self.__iter__() for _ in range(copies))
+        return {indicator: array(list(self._get_cached(funcn, params[funcn], indicator).values())) for funcn, indicators in self._funcn_to_indicator_map.items() for indicator in indicators}
+
+    def _cursor(self, arrays: dict, start: int = 0, end: int = None, matrix: bool = False, offset: int = 0):
+        '''
+        Iterates over bars ``start`` to ``end`` of arrays from ``_iteration_arrays``, yielding the same dictionary 
+        of indicators as iterating over the class. Slices are only taken for the bars reached, so starting at any 
+        bar takes constant time. If ``matrix``, multi indicators are instead ``(bars, stocks)`` arrays with stocks
+        in sorted order. ``offset`` is the bar the arrays start at, when they don't start at the first bar.
+        '''
+        end = self._L if end is None else end
+        if not offset <= start <= end <= self._L:
+            raise ValueError(f'Invalid range {start} to {end} for {self._L} bars')
+        start, end = start - offset, end - offset
+
+        if matrix:
+            # columns follow StockData.stocks, which is sorted, rather than the order the stocks were given in
+            order = np.argsort(self._stocks)
+            columns = [(indicator, np.ascontiguousarray(arrays[indicator][order].T)) for indicator in self._multis]
+            columns += [(indicator, arrays[indicator][0]) for indicator in self._singles]
+            current = dict()
+            for i in range(start + 1, end + 1):
+                for indicator, values in columns:
+                    current[indicator] = values[:i]
+                yield current
+            return
+
+        multis = [(indicator, stock, arrays[indicator][s]) for indicator in self._multis 
+                  for s, stock in enumerate(self._stocks)]
+        singles = [(indicator, arrays[indicator][0]) for indicator in self._singles]
+
+        current = {indicator: dict() for indicator in self._multis}
+        for i in range(start + 1, end + 1):
+            for indicator, stock, values in multis:
+                current[indicator][stock] = values[:i]
+            for indicator, values in singles:
+                current[indicator] = values[:i]
+            yield current
     
+    def _chunks(self, params: dict, start: int, end: int, chunk_size: int, overlap: int = None, matrix: bool = False):
+        '''
+        Iterates over bars ``start`` to ``end`` like ``_cursor``, computing the indicators ``chunk_size`` bars at a 
+        time rather than over every bar up front, and without caching them. Each chunk is computed from its warm-up
+        (the lookback before it), so every indicator needs a lookback, and the last ``overlap`` bars of a chunk 
+        (the longest lookback if ``None``) are kept as the history of the next, the first chunk computing the 
+        ``overlap`` bars before ``start``. Memory depends on ``chunk_size`` rather than the number of bars.
+        '''
+        params = self._fill_in_params(params)
+        self._raise_invalid_params(params)
+
+        lookbacks = {func_name: self._lookback(func_name, func_params) for func_name, func_params in params.items()}
+        missing = sorted(func_name for func_name, lookback in lookbacks.items() if lookback is None)
+        if missing:
+            raise ValueError(f'Indicators must have a lookback to be computed in chunks, {missing} don\'t')
+        if overlap is None:
+            overlap = max(lookbacks.values(), default=0)
+        functions = self._indicator_functions
+
+        kept = None
+        for chunk_start in range(start, end, chunk_size):
+            chunk_end = min(chunk_start + chunk_size, end)
+            history = min(overlap, chunk_start)
+
+            # the first chunk also computes the history before the fold, later ones take it from the chunk before
+            first = chunk_start - history if kept is None else chunk_start
+            jobs = [(func_name, functions[func_name], func_params, stock, 
+                     (max(0, first - lookbacks[func_name]), first, chunk_end)) 
+                    for func_name, func_params in params.items()
+                    for stock in (self._stocks if self._is_multi(func_name) else [self._NULL_STOCK])]
+            if self.n_threads == 1 or len(jobs) == 1:
+                computed = list(map(self._compute_indicator, jobs))
+            else:
+                with ThreadPool(self.n_threads) as pool:
+                    computed = pool.map(self._compute_indicator, jobs)
+            self._stage_cache.clear()
+            self._stage_locks.clear()
+
+            # rows in stock order, as in _iteration_arrays
+            outputs = defaultdict(list)
+            for (func_name, *_), (_, _, _, out) in zip(jobs, computed):
+                self._funcn_to_indicator_map[func_name] = sorted(out)
+                outputs[func_name].append(out)
+            arrays = {indicator: np.array([out[indicator] for out in outs], dtype='float64') 
+                      for func_name, outs in outputs.items() for indicator in self._funcn_to_indicator_map[func_name]}
+
+            if kept is not None:
+                for indicator, values in arrays.items():
+                    before = kept[indicator]
+                    arrays[indicator] = np.concatenate([before[:, before.shape[1] - history:], values], axis=1)
+            kept = {indicator: values[:, values.shape[1] - overlap:] for indicator, values in arrays.items()}
+
+            yield from self._cursor(arrays, chunk_start, chunk_end, matrix, chunk_start - history)
+
     #---------[CACHE]---------#
     def _hashable(self, function_name, params):
         return (function_name, tuple(sorted(params.items())))
@@ -368,4 +851,47 @@ class Indicators:
         return self._iterate_indicators
 
     def __len__(self):
-        return self._L
\ No newline at end of file
+        return self._L
+
+
+def _merge(intervals, gap=0):
+    # sorts (start, end) intervals and joins those at most gap bars apart
+    merged = []
+    for start, end in sorted(intervals):
+        if start >= end:
+            continue
+        if merged and start <= merged[-1][1] + gap:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _subtract(intervals, covered):
+    # the parts of merged intervals that aren't in the merged intervals covered
+    missing = []
+    for start, end in intervals:
+        for a, b in covered:
+            if b <= start or a >= end:
+                continue
+            if a > start:
+                missing.append((start, a))
+            start = max(start, b)
+        if start < end:
+            missing.append((start, end))
+    return missing
+
+
+def _stage_input(data):
+    # identifies the input of a stage by the memory it views (a column of the stock data, or a view of its bars, is
+    # the same for every parameter set, while a different column or a derived series is not), and returns the
+    # objects that keep that memory alive
+    if isinstance(data, np.ndarray) and data.dtype != object:
+        return (data.__array_interface__['data'][0], data.shape, data.strides, data.dtype), data
+    if hasattr(data, 'columns') and hasattr(data, 'to_numpy'):
+        columns = [data[column] for column in data.columns]
+        return tuple((column, _stage_input(data[column])[0]) for column in data.columns), columns
+    if hasattr(data, 'to_numpy'):
+        values = data.to_numpy()
+        return (data.name, _stage_input(values)[0]), values
+    return id(data), data
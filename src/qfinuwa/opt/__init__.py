@@ -1,4 +1,8 @@
 from ._stockdata import StockData
+from ._queue import WorkQueue
 
 class StockData(StockData):
-    pass
\ No newline at end of file
+    pass
+
+class WorkQueue(WorkQueue):
+    pass
@@ -0,0 +1,153 @@
+import numpy as np
+from ._portfolio import TRADE_DTYPE
+
+# numba takes a while to import, so it is only imported (and the kernels below compiled) on the first run
+njit = None
+
+_KERNELS = []
+_kernels = dict()
+
+def _jit(func):
+    # marks a function to be compiled with numba when the jit backend is first used
+    _KERNELS.append(func.__name__)
+    return func
+
+#---------------[Public Functions]-----------------#
+def run_compiled(kernel, prices: np.ndarray, indicators: np.ndarray, params: np.ndarray,
+                 delta_limits: np.ndarray, fee: float, start: int, end: int) -> tuple:
+    '''
+    Runs a ``JitStrategy`` kernel over bars ``start`` to ``end`` with a compiled portfolio, returning the value
+    history and trades in the same form as ``Portfolio.wrap_up``.
+    '''
+    _load_numba()
+
+    if kernel not in _kernels:
+        _kernels[kernel] = njit(kernel)
+
+    value, trade_i, trade_s, trade_q, trade_p = _simulate(_kernels[kernel], prices, indicators, params,
+                                                          delta_limits, float(fee), start, end)
+
+    trades = np.empty(len(trade_i), dtype=TRADE_DTYPE)
+    trades['i'], trades['stock'], trades['quantity'], trades['price'] = trade_i, trade_s, trade_q, trade_p
+    return value, trades
+
+def build_arrays(stockdata, indicators, indicator_params: dict, strategy_class, strategy_params: dict, 
+                 periods: list = None) -> tuple:
+    '''
+    The ``prices``, ``indicators`` and ``params`` arrays passed to a ``JitStrategy`` kernel: prices as 
+    ``(measurement, bar, stock)`` and indicators as ``(indicator, bar, stock)``, with stocks in sorted order.
+    Indicators with a lookback are only computed over ``periods`` (every bar if ``None``).
+    '''
+    stocks = stockdata.stocks
+    n = len(stocks)
+    data = stockdata._data
+    prices = np.ascontiguousarray(data.reshape(len(data), n, 5).transpose(2, 0, 1), dtype='float64')
+
+    params = indicators._fill_in_params(indicator_params)
+    indicators._add_parameters(params, periods)
+    columns = dict()
+    for funcn, names in indicators._funcn_to_indicator_map.items():
+        for indicator in names:
+            cached = indicators._get_cached(funcn, params[funcn], indicator)
+            columns[indicator] = np.stack([cached.get(indicators._NULL_STOCK, cached.get(stock)) 
+                                           for stock in stocks], axis=-1)
+    values = np.array([columns[indicator] for indicator in indicators.names], dtype='float64')
+    values = values.reshape(len(columns), len(data), n)
+
+    return prices, values, strategy_class._params_array(strategy_params)
+
+#---------------[Private Functions]-----------------#
+def _load_numba():
+    global njit
+    if njit is not None:
+        return
+    try:
+        from numba import njit as _njit
+    except ImportError:
+        raise ImportError('The jit backend requires numba, install it with "pip install numba"')
+
+    # numba resolves the kernels called by _simulate from the module globals when it compiles it
+    for name in _KERNELS:
+        globals()[name] = _njit(globals()[name])
+    njit = _njit
+
+#---------------[Kernels]-----------------#
+@_jit
+def _fill(s, quantity, price, delta, capital, fees, delta_limits, fee):
+    # mirrors Portfolio.order
+    if abs(delta[s] + quantity) > delta_limits[s]:
+        return False
+
+    if quantity == 0:
+        return False
+
+    # a stock can't be traded at a time it has no bar
+    if price != price:
+        return False
+
+    delta[s] += quantity
+    price = quantity*price
+    fees[s] += abs(fee*price)
+    capital[s] -= price
+    return True
+
+
+@_jit
+def _log(trades, n_trades, i, s, quantity, price):
+    trade_i, trade_s, trade_q, trade_p = trades
+    if n_trades == len(trade_i):
+        n = 2*len(trade_i)
+        trade_i, trade_s = np.resize(trade_i, n), np.resize(trade_s, n)
+        trade_q, trade_p = np.resize(trade_q, n), np.resize(trade_p, n)
+    trade_i[n_trades], trade_s[n_trades], trade_q[n_trades], trade_p[n_trades] = i, s, quantity, price
+    return (trade_i, trade_s, trade_q, trade_p), n_trades + 1
+
+
+@_jit
+def _record(value, j, delta, capital, fees, price):
+    # mirrors Portfolio._value_history, price is the last price of each stock
+    for s in range(len(delta)):
+        value[j, s, 0] = delta[s]*price[s] if delta[s] != 0 else 0.
+        value[j, s, 1] = capital[s]
+        value[j, s, 2] = fees[s]
+
+
+@_jit
+def _simulate(kernel, prices, indicators, params, delta_limits, fee, start, end):
+    n = prices.shape[2]
+    length = end - start
+
+    value = np.zeros((length + 1, n, 3))
+    delta = np.zeros(n)
+    capital = np.zeros(n)
+    fees = np.zeros(n)
+    orders = np.zeros(n)
+    # the last price of each stock, which only differs from the current one on bars a stock is missing
+    last = np.full(n, np.nan)
+
+    trades = (np.empty(64, np.int64), np.empty(64, np.int64), np.empty(64), np.empty(64))
+    n_trades = 0
+
+    for j in range(length):
+        i = start + j
+        for s in range(n):
+            if prices[1, i, s] == prices[1, i, s]:
+                last[s] = prices[1, i, s]
+        _record(value, j, delta, capital, fees, last)
+
+        orders[:] = 0.
+        kernel(i, prices, indicators, delta, orders, params)
+
+        for s in range(n):
+            if _fill(s, orders[s], prices[1, i, s], delta, capital, fees, delta_limits, fee):
+                trades, n_trades = _log(trades, n_trades, j, s, orders[s], prices[1, i, s])
+
+    # wrap up: close every position at the last price
+    for s in range(n):
+        quantity = -delta[s]
+        if _fill(s, quantity, last[s], delta, capital, fees, delta_limits, fee):
+            trades, n_trades = _log(trades, n_trades, length - 1, s, quantity, last[s])
+    _record(value, length, delta, capital, fees, last)
+
+    trade_i, trade_s, trade_q, trade_p = trades
+    return value, trade_i[:n_trades], trade_s[:n_trades], trade_q[:n_trades], trade_p[:n_trades]
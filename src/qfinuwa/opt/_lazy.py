@@ -0,0 +1,11 @@
+# progress bars and tables are only needed once something is run or printed, so their packages are
+# imported on first use rather than with qfinuwa
+
+def tqdm(*args, **kwargs):
+    from tqdm import tqdm
+    return tqdm(*args, **kwargs)
+
+
+def tabulate(*args, **kwargs) -> str:
+    from tabulate import tabulate
+    return tabulate(*args, **kwargs)
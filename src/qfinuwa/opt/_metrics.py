@@ -0,0 +1,113 @@
+import numpy as np
+
+TRADING_DAYS = 252
+
+# the scalar metrics of a run, in the order they are reported
+METRICS = ['sharpe_ratio', 'sortino_ratio', 'max_drawdown', 'max_drawdown_duration',
+           'turnover', 'exposure', 'hit_rate', 'n_round_trips']
+
+# metrics where a smaller value is better, used to pick the direction to rank in
+LOWER_IS_BETTER = {'roi_std', 'max_drawdown', 'max_drawdown_duration', 'turnover'}
+
+#---------------[Public Functions]-----------------#
+def compute(values: np.ndarray, trades: np.ndarray, fee: float, times: np.ndarray) -> tuple:
+    '''
+    Computes every performance metric of a run in one pass over its value history.
+
+    ## Parameters
+    - ``values`` (``np.ndarray``): The ``(bars + 1, stocks, 3)`` value history from ``Portfolio.wrap_up``.
+    - ``trades`` (``np.ndarray``): The trades from ``Portfolio.wrap_up``.
+    - ``fee`` (``float``): The fee paid on each transaction.
+    - ``times`` (``np.ndarray``): The time of each bar.
+
+    ## Returns
+    ``dict`` of the metrics in ``METRICS`` for the whole run, and ``dict`` of per stock arrays of the turnover,
+    exposure, hit rate and contribution (share of the net PnL) of each stock.
+    '''
+    position, capital, fees = np.moveaxis(values, 2, 0)
+    stock_value = position - np.abs(fee*position) + capital - fees
+    value = stock_value.sum(axis=1)
+
+    # ratios are of the change in value per bar, annualised by the number of bars in a trading year
+    pnl = np.diff(value)
+    days = len(np.unique(times.astype('datetime64[D]')))
+    scale = np.sqrt(TRADING_DAYS*len(times)/max(days, 1))
+    mean = pnl.mean() if len(pnl) else 0.
+    std = pnl.std(ddof=1) if len(pnl) > 1 else 0.
+    downside = np.sqrt(np.mean(np.minimum(pnl, 0)**2)) if len(pnl) else 0.
+
+    # bars since the last peak, whose maximum is the longest drawdown
+    bars = np.arange(len(value))
+    peak = np.maximum.accumulate(value)
+    last_peak = np.maximum.accumulate(np.where(value >= peak, bars, 0))
+
+    n_stocks = values.shape[1]
+    stock_turnover = np.bincount(trades['stock'], weights=np.abs(trades['quantity']*trades['price']), minlength=n_stocks)
+    held = position[:-1] != 0
+    stock_exposure = held.mean(axis=0) if len(held) else np.zeros(n_stocks)
+
+    wins, trips = _round_trips(stock_value, position)
+    net = stock_value[-1]
+    total = net.sum()
+
+    metrics = {
+        'sharpe_ratio': mean/std*scale if std > 0 else 0.,
+        'sortino_ratio': mean/downside*scale if downside > 0 else 0.,
+        'max_drawdown': float((peak - value).max()),
+        'max_drawdown_duration': int((bars - last_peak).max()),
+        'turnover': float(stock_turnover.sum()),
+        'exposure': float(held.any(axis=1).mean()) if len(held) else 0.,
+        'hit_rate': wins.sum()/trips.sum() if trips.sum() else 0.,
+        'n_round_trips': int(trips.sum()),
+    }
+    per_stock = {
+        'turnover': stock_turnover,
+        'exposure': stock_exposure,
+        'hit_rate': np.divide(wins, trips, out=np.zeros(n_stocks), where=trips > 0),
+        'contribution': net/total if total != 0 else np.zeros(n_stocks),
+    }
+    return metrics, per_stock
+
+
+def percentage_returns(value: np.ndarray) -> np.ndarray:
+    '''
+    The finite percentage changes of a value series, forward filling missing values.
+    '''
+    filled = np.maximum.accumulate(np.where(np.isnan(value), 0, np.arange(len(value))))
+    value = value[filled]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = value[1:]/value[:-1] - 1
+    return returns[np.isfinite(returns)]
+
+
+def pareto_front(scores: np.ndarray) -> np.ndarray:
+    '''
+    A mask of the rows of ``scores`` (one column per objective, larger is better) that no other row dominates.
+    '''
+    scores = np.asarray(scores, dtype='float64')
+    front = np.zeros(len(scores), dtype=bool)
+
+    # in descending lexicographic order a row can only be dominated by rows before it, so each row
+    # only needs to be compared with the (usually small) front found so far
+    order = np.lexsort(-scores.T[::-1])
+    kept = np.empty((0, scores.shape[1]))
+    for i in order:
+        row = scores[i]
+        if len(kept) and ((kept >= row).all(axis=1) & (kept > row).any(axis=1)).any():
+            continue
+        front[i] = True
+        kept = np.vstack([kept, row])
+    return front
+
+#---------------[Private Functions]-----------------#
+def _round_trips(stock_value, position):
+    # a round trip runs from one flat bar to the next with a position held in between, and wins if the
+    # value of the stock rose over it
+    wins = np.zeros(position.shape[1])
+    trips = np.zeros(position.shape[1])
+    for s in range(position.shape[1]):
+        flat = np.flatnonzero(position[:, s] == 0)
+        held = np.diff(flat) > 1
+        gain = np.diff(stock_value[flat, s])[held]
+        wins[s], trips[s] = (gain > 0).sum(), len(gain)
+    return wins, trips
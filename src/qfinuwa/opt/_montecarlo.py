@@ -0,0 +1,157 @@
+import numpy as np
+from multiprocessing import Pool
+from ._portfolio import Portfolio
+from ._stockdata import StockData
+from . import _metrics
+from . import _jit
+
+# set in every worker process by _initialise
+_state = None
+
+#---------------[Public Functions]-----------------#
+def simulate(state: dict, n_paths: int, batch_size: int, seed: int, n_processes: int = None):
+    '''
+    Runs ``n_paths`` randomised paths in batches, yielding the summary of each path as its batch completes.
+    Paths are generated from seeds spawned from ``seed``, so the results don't depend on the number of processes.
+
+    ## Parameters
+    - ``state`` (``dict``): Everything a path needs, see ``Backtester.monte_carlo``.
+    - ``n_paths`` (``int``): The number of paths.
+    - ``batch_size`` (``int``): The number of paths per task sent to a process.
+    - ``seed`` (``int``): The seed of the random number generator.
+    - ``n_processes`` (``int``): The number of processes, ``1`` runs every path in this process.
+
+    ## Returns
+    A generator of ``dict`` summaries of each path.
+    '''
+    batches = [(i, min(batch_size, n_paths - i)) for i in range(0, n_paths, batch_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(batches))
+    tasks = [(first, n, s) for (first, n), s in zip(batches, seeds)]
+
+    if n_processes == 1 or len(tasks) == 1:
+        _initialise(state)
+        for task in tasks:
+            yield from _run_batch(task)
+        return
+
+    with Pool(n_processes, initializer=_initialise, initargs=(state,)) as pool:
+        for batch in pool.imap(_run_batch, tasks):
+            yield from batch
+
+
+def bootstrap(data: np.ndarray, length: int, block_size: int, rng: np.random.Generator) -> np.ndarray:
+    '''
+    A price path made by a moving block bootstrap of ``data`` (laid out like ``StockData._data``). Each bar's
+    open, close, high and low are resampled relative to the previous close, with every stock resampled
+    together so their correlations are kept, and the path starts from the first bar of ``data``.
+    '''
+    bars = data.reshape(len(data), -1, 5)
+    if length > len(bars):
+        raise ValueError(f'Paths can be at most {len(bars)} bars long, got {length}')
+    if not 0 < block_size < len(bars):
+        raise ValueError(f'block_size must be between 1 and {len(bars) - 1}, got {block_size}')
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratios = bars[1:, :, :4]/bars[:-1, :, 1:2]
+
+    starts = rng.integers(0, len(ratios) - block_size + 1, size=-(-(length - 1)//block_size))
+    sample = (starts[:, None] + np.arange(block_size)).ravel()[:length - 1]
+
+    path = np.empty((length, bars.shape[1], 5))
+    path[0] = bars[0]
+    close = bars[0, :, 1]*np.cumprod(ratios[sample, :, 1], axis=0)
+    previous = np.concatenate([bars[:1, :, 1], close[:-1]])
+    path[1:, :, :4] = ratios[sample]*previous[:, :, None]
+    path[1:, :, 4] = bars[1:, :, 4][sample]
+    return path.reshape(length, -1)
+
+
+def slip(values: np.ndarray, trades: np.ndarray, slippage: float, rng: np.random.Generator) -> np.ndarray:
+    '''
+    Charges every trade a random slippage, a half normal fraction (with scale ``slippage``) of the value traded,
+    as an extra fee from the bar after the trade onwards.
+    '''
+    if slippage == 0 or len(trades) == 0:
+        return values
+    i, s = trades['i'], trades['stock']
+    cost = np.abs(trades['quantity']*trades['price']*rng.normal(0, slippage, len(trades)))
+    costs = np.zeros(values.shape[:2])
+    np.add.at(costs, (i + 1, s), cost)
+
+    values = values.copy()
+    values[:, :, 2] += np.cumsum(costs, axis=0)
+    return values
+
+
+def round_trips(values: np.ndarray, trades: np.ndarray, fee: float) -> tuple:
+    '''
+    The PnL and value traded of every round trip (from one flat bar of a stock to the next) of a run.
+    '''
+    position, capital, fees = np.moveaxis(values, 2, 0)
+    stock_value = position - np.abs(fee*position) + capital - fees
+
+    pnl, traded = [], []
+    for s in range(values.shape[1]):
+        flat = np.flatnonzero(position[:, s] == 0)
+        held = np.flatnonzero(np.diff(flat) > 1)
+        pnl.append(np.diff(stock_value[flat, s])[held])
+
+        # a trade at bar i moves the position between rows i and i + 1
+        ours = trades[trades['stock'] == s]
+        trip = np.searchsorted(flat, ours['i'], 'right') - 1
+        notional = np.bincount(trip, weights=np.abs(ours['quantity']*ours['price']), minlength=len(flat))
+        traded.append(notional[held])
+    return np.concatenate(pnl), np.concatenate(traded)
+
+
+def shuffle(pnl: np.ndarray, traded: np.ndarray, n_paths: int, slippage: float, seed: int):
+    '''
+    Reorders the round trips of a run at random, yielding the summary of each path. Slippage is charged as
+    in ``slip``.
+    '''
+    rng = np.random.default_rng(seed)
+    for path in range(n_paths):
+        order = rng.permutation(len(pnl))
+        trips = pnl[order] - np.abs(traded[order]*rng.normal(0, slippage, len(pnl))) if slippage else pnl[order]
+        equity = np.concatenate([[0], np.cumsum(trips)])
+        std = trips.std(ddof=1) if len(trips) > 1 else 0.
+        yield {'path': path, 'roi': float(equity[-1]),
+               'sharpe_ratio': float(trips.mean()/std) if std > 0 else 0.,
+               'max_drawdown': float((np.maximum.accumulate(equity) - equity).max()),
+               'n_trades': len(trips)}
+
+#---------------[Private Functions]-----------------#
+def _initialise(state):
+    global _state
+    _state = state
+
+
+def _run_batch(task):
+    first, n, seed = task
+    rng = np.random.default_rng(seed)
+    return [_run_path(first + k, rng) for k in range(n)]
+
+
+def _run_path(path, rng):
+    state = _state
+    data = bootstrap(state['data'], state['length'], state['block_size'], rng)
+    stockdata = StockData._from_arrays(state['stocks'], state['times'], data, low_memory=True)
+    indicators = state['indicator_class'](data=stockdata, n_threads=1)
+
+    strategy = state['strategy_class'](**state['strategy_params'])
+    if state['jit']:
+        strategy._bind(*_jit.build_arrays(stockdata, indicators, state['indicator_params'],
+                                          state['strategy_class'], state['strategy_params']), 0)
+
+    portfolio = Portfolio(stockdata.stocks, state['delta_limits'], state['fee'], stockdata)
+    arrays = indicators._iteration_arrays(state['indicator_params'])
+    matrix = state['strategy_class']._matrix
+    for (curr_prices, prices), current in zip(stockdata._cursor(matrix=matrix), indicators._cursor(arrays, matrix=matrix)):
+        strategy.run_on_data((curr_prices, prices, current), portfolio)
+    values, trades = portfolio.wrap_up()
+
+    values = slip(values, trades, state['slippage'], rng)
+    metrics, _ = _metrics.compute(values, trades, state['fee'], stockdata._times[:len(data)])
+    return {'path': path, 'roi': float(values[-1, :, 1].sum() - values[-1, :, 2].sum()),
+            'sharpe_ratio': metrics['sharpe_ratio'], 'sortino_ratio': metrics['sortino_ratio'],
+            'max_drawdown': metrics['max_drawdown'], 'n_trades': len(trades)}
@@ -1,11 +1,25 @@
 from typing import Union
-from tabulate import tabulate
+from collections.abc import Mapping
+from operator import itemgetter
+from heapq import heappush, heappop
+from ._lazy import tabulate
+import numpy as np
+
+# trades are stored as (bar, index of the stock, quantity, price)
+TRADE_DTYPE = np.dtype([('i', 'int64'), ('stock', 'int32'), ('quantity', 'float64'), ('price', 'float64')])
 
 class Portfolio:
 
-    # buy long, se
-    def __init__(self, stocks: list, delta_limits: dict, fee: float):
+    # the number of single orders logged as tuples before they're moved into the trade buffer
+    _FLUSH = 4096
 
+    # buy long, se
+    def __init__(self, stocks: list, delta_limits: dict, fee: float, stockdata = None, start: int = 0):
+        '''
+        Holds the positions, capital and trades of a run. Orders are filled at the current (close) price, except
+        for pending limit and stop orders which are matched against the open, high and low of each following bar
+        of ``stockdata`` (whose bar ``start`` is the portfolio's first bar).
+        '''
         self._curr_prices = None
 
         self._i = -1
@@ -13,32 +27,67 @@ class Portfolio:
         self._fee = fee
         self._stocks = stocks
         self._stock_to_id = {stock: i for i, stock in enumerate(stocks)}
+        # gathers the prices of every stock from a dictionary of prices, in the order of stocks
+        self._gather = itemgetter(*stocks)
 
 
         self._delta_limits = delta_limits
+        self._limits = np.array([delta_limits[stock] for stock in stocks], dtype='float64')
+
+        # state is kept in arrays aligned with stocks, so orders for every stock can be placed at once
+        self._prices = None
+        self._delta = np.zeros(len(stocks))
+        self._fees_paid = np.zeros(len(stocks))
+        self._capital = np.zeros(len(stocks))
 
-        self._value = {stock: [] for stock in stocks}
-        self._delta = {stock: 0 for stock in stocks}   
-        self._fees_paid = {stock: 0 for stock in stocks}  
-        self._capital = {stock: 0 for stock in stocks}  
+        # the prices of every bar, the value history is rebuilt from them and the trades in wrap_up. With the bar
+        # data they are its closes, so they're read back from it rather than kept
+        self._price_history = []
 
+        # pending orders by id, and per stock heaps of (trigger price, id) for the orders that trigger when the low
+        # falls to their price (limit buys and stop sells, highest price first) and when the high rises to it 
+        # (limit sells and stop buys, lowest price first). Cancelled orders are dropped from the heaps lazily.
+        self._stockdata = stockdata
+        self._start = start
+        if stockdata is not None:
+            # the column of the open of each stock in the bar data
+            columns = {stock: 5*i for i, stock in enumerate(stockdata.stocks)}
+            self._columns = [columns[stock] for stock in stocks]
+            self._closes = [column + 1 for column in self._columns]
+        self._pending = dict()
+        self._falling = [[] for _ in stocks]
+        self._rising = [[] for _ in stocks]
+        self._waiting = set()
+        self._next_id = 0
+
+        # single orders are logged as tuples, and moved along with batches of orders into a TRADE_DTYPE buffer
+        # that grows in amortised O(1) time per trade
         self._trades = []
+        self._trade_buffer = np.empty(0, dtype=TRADE_DTYPE)
+        self._n_trades = 0
 
-        # TODO: add delta history 
+        # TODO: add delta history
 
     #---------------[Properties]-----------------#
     @property
     def stocks(self):
         return self._stocks
-    
+
     @property
     def delta(self):
-        return self._delta
-    
+        return _ByStock(self._delta, self._stock_to_id)
+
+    @property
+    def positions(self) -> np.ndarray:
+        '''
+        The current position in each stock, aligned with ``stocks``.
+        '''
+        return self._delta.copy()
+
     @property
     def delta_limits(self):
         return self._delta_limits
-        
+
     @property
     def curr_prices(self):
         return self._curr_prices
@@ -47,38 +96,283 @@ class Portfolio:
     def curr_prices(self, prices: dict):
         self._i += 1
         self._curr_prices = prices
+        self._prices = None
+        if self._stockdata is None:
+            self._price_history.append(prices)
+        if self._waiting:
+            self._match()
 
-        for s in self._stocks:
-            self._value[s].append((self._delta[s]*self._curr_prices[s], self._capital[s], self._fees_paid[s]))
+    @property
+    def pending(self) -> dict:
+        '''
+        The pending orders by id, as ``(stock, kind, quantity, price)`` with ``kind`` either ``'limit'`` or ``'stop'``.
+        '''
+        return {order_id: (self._stocks[s], kind, quantity, price) 
+                for order_id, (s, kind, quantity, price) in self._pending.items()}
 
     #---------------[Public Methods]-----------------#
 
     def order(self, stock: str, quantity: Union[int, float]) -> bool:
-        
-        if abs(self._delta[stock] + quantity) > self._delta_limits[stock]:
-            return False 
-        
+
+        s = self._stock_to_id[stock]
+        if abs(self._delta[s] + quantity) > self._limits[s]:
+            return False
+
         if quantity == 0:
             return False
 
-        self._delta[stock] += quantity
-        price = quantity*self._curr_prices[stock]
-        self._fees_paid[stock] += abs(self._fee*price)
-        self._capital[stock] -= price
-        self._trades.append((self._i, stock, quantity))
+        # a stock can't be traded at a time it has no bar
+        price = self._curr_prices[stock]
+        if price != price:
+            return False
+
+        self._fill(s, quantity, price)
         return True
-    
-        
+
+    def limit_order(self, stock: str, quantity: Union[int, float], price: float) -> int:
+        '''
+        Places an order that is filled on a later bar once the price reaches ``price`` or better: a buy when the 
+        bar's low is at or below ``price``, a sell when its high is at or above it. A bar that opens past the 
+        price fills at the open. Orders that would break the delta limit when triggered are dropped.
+
+        ## Parameters
+        - ``stock`` (``str``): The stock to order.
+        - ``quantity`` (``int`` or ``float``): The quantity to buy (positive) or sell (negative).
+        - ``price`` (``float``): The limit price.
+
+        ## Returns
+        ``int``: The id of the order, which can be passed to ``cancel``.
+        '''
+        return self._place(stock, 'limit', quantity, price)
+
+    def stop_order(self, stock: str, quantity: Union[int, float], price: float) -> int:
+        '''
+        Places an order that is filled on a later bar once the price moves through ``price``: a buy when the 
+        bar's high is at or above ``price``, a sell when its low is at or below it. A bar that opens past the 
+        price fills at the open. Orders that would break the delta limit when triggered are dropped.
+
+        ## Parameters
+        - ``stock`` (``str``): The stock to order.
+        - ``quantity`` (``int`` or ``float``): The quantity to buy (positive) or sell (negative).
+        - ``price`` (``float``): The stop price.
+
+        ## Returns
+        ``int``: The id of the order, which can be passed to ``cancel``.
+        '''
+        return self._place(stock, 'stop', quantity, price)
+
+    def cancel(self, order_id: int) -> bool:
+        '''
+        Cancels a pending order.
+
+        ## Returns
+        ``bool``: Whether the order was still pending.
+        '''
+        return self._pending.pop(order_id, None) is not None
+
+    def order_many(self, quantities) -> np.ndarray:
+        '''
+        Places an order for every stock at once, checking the delta limits, charging fees and updating capital
+        for all of them in one step.
+
+        ## Parameters
+        - ``quantities`` (``dict`` or ``np.ndarray``): The quantity to order of each stock, either by stock or as an
+          array aligned with ``stocks``. Stocks with a quantity of zero aren't ordered.
+
+        ## Returns
+        ``np.ndarray``: Whether each stock's order was filled, aligned with ``stocks``.
+        '''
+        if isinstance(quantities, dict):
+            if quantities.keys() - self._stock_to_id.keys():
+                raise ValueError(f'Unknown stocks: {quantities.keys() - self._stock_to_id.keys()}')
+            quantities = [quantities.get(stock, 0) for stock in self._stocks]
+        quantities = np.asarray(quantities, dtype='float64')
+        if quantities.shape != (len(self._stocks),):
+            raise ValueError(f'Expected {len(self._stocks)} quantities, got an array of shape {quantities.shape}')
+
+        delta = self._delta + quantities
+        filled = (quantities != 0) & (np.abs(delta) <= self._limits)
+        if not filled.any():
+            return filled
+
+        if self._prices is None:
+            self._prices = self._price_array(self._curr_prices)
+
+        # stocks can't be traded at a time they have no bar
+        filled &= ~np.isnan(self._prices)
+        s = np.flatnonzero(filled)
+        if len(s) == 0:
+            return filled
+
+        quantities = quantities[s]
+        price = quantities*self._prices[s]
+        self._delta[s] = delta[s]
+        self._fees_paid[s] += np.abs(self._fee*price)
+        self._capital[s] -= price
+
+        batch = np.empty(len(s), dtype=TRADE_DTYPE)
+        batch['i'], batch['stock'], batch['quantity'], batch['price'] = self._i, s, quantities, self._prices[s]
+        self._log_batch(batch)
+        return filled
+
+
     def wrap_up(self):
-        for stock in self._stocks:
-            self.order(stock, -self._delta[stock])
+        '''
+        Closes every position and returns the value history, an array of shape ``(bars + 1, stocks, 3)`` holding the
+        position value, capital and fees paid of each stock, and the trades as an array of ``TRADE_DTYPE``.
+        '''
+        self._pending.clear()
+        self._waiting.clear()
+        if self._stockdata is not None and self._stockdata.ragged:
+            # stocks without a bar at the end are closed at their last price
+            self._prices = self._last_prices()
+        self.order_many(-self._delta)
         self.curr_prices = self.curr_prices
-        return (self._value,  self._trades)
-    
+
+        self._log_batch(None)
+        trades = self._trade_buffer[:self._n_trades]
+        return (self._value_history(trades), trades)
+
+    #---------------[Private Methods]-----------------#
+    def _fill(self, s: int, quantity: float, price: float) -> None:
+        self._delta[s] += quantity
+        value = quantity*price
+        self._fees_paid[s] += abs(self._fee*value)
+        self._capital[s] -= value
+        self._trades.append((self._i, s, quantity, price))
+        if len(self._trades) >= self._FLUSH:
+            self._log_batch(None)
+
+    def _place(self, stock, kind, quantity, price):
+        if self._stockdata is None:
+            raise ValueError('Pending orders need the bar data, the portfolio was created without stockdata')
+        if quantity == 0:
+            raise ValueError('Cannot place an order for a quantity of 0')
+
+        s = self._stock_to_id[stock]
+        order_id = self._next_id
+        self._next_id += 1
+
+        # buy limits and sell stops trigger on the way down, the rest on the way up
+        falling = (quantity > 0) == (kind == 'limit')
+        self._pending[order_id] = (s, kind, quantity, price)
+        if falling:
+            heappush(self._falling[s], (-price, order_id))
+        else:
+            heappush(self._rising[s], (price, order_id))
+        self._waiting.add(s)
+        return order_id
+
+    def _match(self):
+        # only stocks with pending orders are checked, and each fill pops one order off a heap
+        row = self._stockdata._data[self._start + self._i]
+        for s in list(self._waiting):
+            column = self._columns[s]
+            open_, high, low = row[column], row[column + 2], row[column + 3]
+
+            falling, rising = self._falling[s], self._rising[s]
+            while falling and -falling[0][0] >= low:
+                price, order_id = heappop(falling)
+                self._trigger(order_id, min(-price, open_))
+            while rising and rising[0][0] <= high:
+                price, order_id = heappop(rising)
+                self._trigger(order_id, max(price, open_))
+
+            if not falling and not rising:
+                self._waiting.discard(s)
+
+    def _trigger(self, order_id, price):
+        order = self._pending.pop(order_id, None)
+        if order is None:
+            return
+        s, _, quantity, _ = order
+        if abs(self._delta[s] + quantity) <= self._limits[s]:
+            self._fill(s, quantity, price)
+
+    def _last_prices(self) -> np.ndarray:
+        # the close of each stock at its last bar up to the current one
+        bar = self._start + self._i
+        prices = np.full(len(self._stocks), np.nan)
+        for s, stock in enumerate(self._stocks):
+            bars = self._stockdata._stock_bars(stock)
+            k = np.searchsorted(bars, bar, 'right') - 1
+            if k >= 0:
+                prices[s] = self._stockdata._data[bars[k], self._closes[s]]
+        return prices
+
+    def _price_array(self, prices: dict) -> np.ndarray:
+        return np.array(self._gather(prices), dtype='float64').reshape(len(self._stocks))
+
+    def _log_batch(self, batch):
+        # keeps the trades in the order they were made, None just logs the pending single orders
+        batches = [np.array(self._trades, dtype=TRADE_DTYPE)] if self._trades else []
+        self._trades = []
+        if batch is not None:
+            batches.append(batch)
+
+        for batch in batches:
+            n = self._n_trades + len(batch)
+            if n > len(self._trade_buffer):
+                buffer = np.empty(max(2*n, 64), dtype=TRADE_DTYPE)
+                buffer[:self._n_trades] = self._trade_buffer[:self._n_trades]
+                self._trade_buffer = buffer
+            self._trade_buffer[self._n_trades: n] = batch
+            self._n_trades = n
+
+    def _value_history(self, trades: np.ndarray) -> np.ndarray:
+        # positions, capital and fees only change when a trade is made, and a trade on bar i shows from row i + 1 
+        if self._stockdata is None:
+            prices = np.array(list(map(self._gather, self._price_history)), dtype='float64')
+            prices = prices.reshape(len(self._price_history), len(self._stocks))
+        else:
+            # wrap_up sets the prices of the last bar again
+            bars = self._start + np.minimum(np.arange(self._i + 1), self._i - 1)
+            prices = self._stockdata._data[np.ix_(bars, self._closes)]
+            if self._stockdata.ragged:
+                # positions are valued at the last price of their stock
+                filled = np.maximum.accumulate(np.where(np.isnan(prices), 0, np.arange(len(prices))[:, None]), axis=0)
+                prices = np.take_along_axis(prices, filled, axis=0)
+
+        # group the trades by stock, keeping the order they were made in
+        trades = trades[np.argsort(trades['stock'], kind='stable')]
+        bounds = np.searchsorted(trades['stock'], np.arange(len(self._stocks) + 1))
+
+        value = np.zeros(prices.shape + (3,))
+        for s in range(len(self._stocks)):
+            ours = trades[bounds[s]:bounds[s + 1]]
+            if len(ours) == 0:
+                continue
+            traded = ours['quantity']*ours['price']
+
+            # running totals are summed in the same order as the orders were made
+            rows = np.searchsorted(ours['i'] + 1, np.arange(len(prices)), 'right') - 1
+            made = rows >= 0
+            value[made, s, 0] = np.cumsum(ours['quantity'])[rows[made]]*prices[made, s]
+            value[made, s, 1] = np.cumsum(-traded)[rows[made]]
+            value[made, s, 2] = np.cumsum(np.abs(self._fee*traded))[rows[made]]
+        return value
+
 
     #---------------[Internal Methods]-----------------#
     def __str__(self):
-        table = str(tabulate(list(self._delta.items()), 
+        table = str(tabulate(list(self.delta.items()),
                                 headers = ['Stock', 'Delta'],
                                 tablefmt="grid"))
-        return f'CASH:\t${self._cash:.2f}\nFEES PAID:\t${sum(self._fees_paid.values()):.2f}\n' + table 
\ No newline at end of file
+        return f'CASH:\t${self._cash:.2f}\nFEES PAID:\t${self._fees_paid.sum():.2f}\n' + table
+
+
+class _ByStock(Mapping):
+    # read only view of an array aligned with the stocks, indexed by stock
+
+    def __init__(self, values: np.ndarray, stock_to_id: dict):
+        self._values = values
+        self._stock_to_id = stock_to_id
+
+    def __getitem__(self, stock):
+        return self._values[self._stock_to_id[stock]]
+
+    def __iter__(self):
+        return iter(self._stock_to_id)
+
+    def __len__(self):
+        return len(self._stock_to_id)
@@ -0,0 +1,309 @@
+import os
+import time
+import pickle
+import socket
+import shutil
+import threading
+import traceback
+
+class WorkQueue:
+
+    _JOB, _SETTINGS = 'job.pkl', 'settings.pkl'
+    _TASKS, _LEASES, _RESULTS = 'tasks', 'leases', 'results'
+
+    def __init__(self, path: str, retries: int = 2, lease_timeout: float = 60.0, poll_interval: float = 0.2):
+        '''
+        A work queue kept in a folder shared by every host (e.g. over NFS), used to spread a parameter sweep over
+        ``qfinuwa worker`` processes. Each sweep is published as a job folder holding one file per task. A worker
+        claims a task by renaming it into ``leases`` (which only one worker can do) and keeps the lease alive while
+        it runs. Tasks whose worker raises, or stops renewing its lease, are put back on the queue up to ``retries``
+        times.
+
+        ## Parameters
+        - ``path`` (``str``): The shared folder.
+        - ``retries`` (``int``): The number of times a failed task is retried before the sweep is stopped.
+        - ``lease_timeout`` (``float``): Seconds after which a task whose worker hasn't renewed its lease is retried.
+        - ``poll_interval`` (``float``): Seconds between checks of the folder for new tasks or results.
+        '''
+        if int(retries) != retries or retries < 0:
+            raise ValueError(f'retries must be a non-negative integer, got {retries}')
+        if lease_timeout <= 0 or poll_interval <= 0:
+            raise ValueError(f'lease_timeout and poll_interval must be positive, got {lease_timeout} and {poll_interval}')
+        self.path = path
+        self.retries = retries
+        self.lease_timeout = lease_timeout
+        self.poll_interval = poll_interval
+        os.makedirs(path, exist_ok=True)
+
+    #---------------[Public Methods]-----------------#
+    def publish(self, job: dict, tasks: list) -> str:
+        '''
+        Adds a job and its tasks to the queue, returning the job's id. ``job`` is everything shared by the tasks,
+        and is only visible to workers once every task has been written.
+        '''
+        job_id = f'{time.time():.6f}-{socket.gethostname()}-{os.getpid()}'
+        folder = os.path.join(self.path, job_id)
+        for name in (self._TASKS, self._LEASES, self._RESULTS):
+            os.makedirs(os.path.join(folder, name))
+
+        for task_id, task in enumerate(tasks):
+            _write(os.path.join(folder, self._TASKS, str(task_id)), {'task': task, 'errors': []})
+        # kept apart from the job so a worker that can't load the job's classes can still fail its tasks
+        _write(os.path.join(folder, self._SETTINGS), {'retries': self.retries, 'lease_timeout': self.lease_timeout})
+        _write(os.path.join(folder, self._JOB), job)
+        return job_id
+
+    def collect(self, job_id: str, n_tasks: int):
+        '''
+        Yields the id and result of each task of a job as they complete, retrying the tasks of workers that have
+        stopped, and raising ``RuntimeError`` if a task fails more than ``retries`` times. The job is removed from
+        the queue once every result is in, or if the generator is closed early.
+        '''
+        folder = os.path.join(self.path, job_id)
+        done = set()
+        try:
+            while len(done) < n_tasks:
+                self._expire(folder)
+
+                found = False
+                for name in os.listdir(os.path.join(folder, self._RESULTS)):
+                    task_id, ext = os.path.splitext(name)
+                    if ext not in ('.pkl', '.error'):
+                        continue
+                    path = os.path.join(folder, self._RESULTS, name)
+                    output = _read(path)
+                    os.remove(path)
+                    if ext == '.error':
+                        raise RuntimeError(f'Task {task_id} failed {len(output)} times, the last error was:\n{output[-1]}')
+                    # a task retried after its lease expired may be completed twice
+                    if int(task_id) not in done:
+                        done.add(int(task_id))
+                        found = True
+                        yield int(task_id), output
+
+                if not found:
+                    time.sleep(self.poll_interval)
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+
+    def claim(self, skip: set = ()) -> tuple:
+        '''
+        Leases the oldest task on the queue (of jobs not in ``skip``), returning its job id and task id, or
+        ``None`` if there are no tasks.
+        '''
+        for job_id in sorted(os.listdir(self.path)):
+            if job_id in skip or not os.path.isfile(os.path.join(self.path, job_id, self._JOB)):
+                continue
+            tasks = os.path.join(self.path, job_id, self._TASKS)
+            try:
+                # tasks being written are named <task>.<writer>.tmp until they are complete
+                names = sorted((name for name in os.listdir(tasks) if name.isdigit()), key=int)
+            except FileNotFoundError:
+                continue
+            for task_id in names:
+                try:
+                    # the lease starts from when it was claimed rather than when the task was written
+                    os.utime(os.path.join(tasks, task_id))
+                    os.rename(os.path.join(tasks, task_id), self._lease(job_id, task_id))
+                except FileNotFoundError:
+                    # taken by another worker
+                    continue
+                return job_id, task_id
+        return None
+
+    def job(self, job_id: str) -> dict:
+        '''
+        The job shared by the tasks of ``job_id``.
+        '''
+        return _read(os.path.join(self.path, job_id, self._JOB))
+
+    def settings(self, job_id: str) -> dict:
+        '''
+        The ``retries`` and ``lease_timeout`` of the queue that published ``job_id``.
+        '''
+        return _read(os.path.join(self.path, job_id, self._SETTINGS))
+
+    def task(self, job_id: str, task_id: str):
+        '''
+        The parameters of a leased task.
+        '''
+        return _read(self._lease(job_id, task_id))['task']
+
+    def renew(self, job_id: str, task_id: str) -> None:
+        '''
+        Renews the lease on a task, which expires ``lease_timeout`` seconds after it was last renewed.
+        '''
+        os.utime(self._lease(job_id, task_id))
+
+    def complete(self, job_id: str, task_id: str, result) -> None:
+        '''
+        Hands in the result of a leased task.
+        '''
+        path = os.path.join(self.path, job_id, self._RESULTS, task_id)
+        try:
+            _write(path + '.pkl', result)
+            os.remove(self._lease(job_id, task_id))
+        except FileNotFoundError:
+            # the job finished (or the lease expired and the task was run elsewhere) in the meantime
+            pass
+
+    def fail(self, job_id: str, task_id: str, error: str) -> None:
+        '''
+        Returns a leased task to the queue after it raised ``error``, or fails the job if it has no retries left.
+        '''
+        lease = self._lease(job_id, task_id)
+        try:
+            # taking the lease first stops it being expired (and retried twice) at the same time
+            taken = f'{lease}.{socket.gethostname()}-{os.getpid()}'
+            os.rename(lease, taken)
+            self._retry(os.path.join(self.path, job_id), task_id, taken, error, self.settings(job_id)['retries'])
+        except FileNotFoundError:
+            # the job finished, or the lease expired, in the meantime
+            pass
+
+    #---------------[Private Methods]-----------------#
+    def _lease(self, job_id, task_id):
+        return os.path.join(self.path, job_id, self._LEASES, task_id)
+
+    def _expire(self, folder):
+        leases = os.path.join(folder, self._LEASES)
+        now = time.time()
+        for task_id in os.listdir(leases):
+            if not task_id.isdigit():
+                continue
+            lease = os.path.join(leases, task_id)
+            try:
+                if now - os.stat(lease).st_mtime <= self.lease_timeout:
+                    continue
+                taken = f'{lease}.expired'
+                os.rename(lease, taken)
+            except FileNotFoundError:
+                continue
+            self._retry(folder, task_id, taken, f'The lease expired after {self.lease_timeout}s without being renewed',
+                        self.retries)
+
+    def _retry(self, folder, task_id, taken, error, retries):
+        entry = _read(taken)
+        entry['errors'].append(error)
+        if len(entry['errors']) > retries:
+            _write(os.path.join(folder, self._RESULTS, f'{task_id}.error'), entry['errors'])
+        else:
+            _write(os.path.join(folder, self._TASKS, task_id), entry)
+        os.remove(taken)
+
+    def __repr__(self):
+        return f'WorkQueue({self.path!r}, retries={self.retries}, lease_timeout={self.lease_timeout})'
+
+#---------------[Worker]-----------------#
+def work(path: str, data_folder: str = None, idle_timeout: float = None, verbose: bool = True) -> int:
+    '''
+    Runs the tasks on the queue at ``path`` until there have been none for ``idle_timeout`` seconds (forever if
+    ``None``), returning the number of tasks run. The data of each job is loaded once and kept (along with the
+    indicator cache) for later tasks and jobs on the same data.
+
+    ## Parameters
+    - ``path`` (``str``): The queue's folder.
+    - ``data_folder`` (``str``): Where the data is on this host, if not at the path the sweep was started with (which
+      it has to be given for data that wasn't loaded from a folder).
+    - ``idle_timeout`` (``float``): Seconds without tasks before the worker stops.
+    - ``verbose`` (``bool``): Whether to print each task as it completes.
+    '''
+    # the retries and lease timeout of each job are those it was published with, see WorkQueue.settings
+    queue = WorkQueue(path)
+    name = f'{socket.gethostname()}-{os.getpid()}'
+    backtesters = dict()
+    jobs = dict()
+    skip = set()
+    n_run = 0
+    idle = time.time()
+
+    while idle_timeout is None or time.time() - idle < idle_timeout:
+        claimed = queue.claim(skip)
+        if claimed is None:
+            # forget jobs that have finished
+            jobs = {job_id: job for job_id, job in jobs.items() if os.path.isdir(os.path.join(path, job_id))}
+            time.sleep(queue.poll_interval)
+            continue
+        job_id, task_id = claimed
+
+        stop = threading.Event()
+        heartbeat = None
+        loaded = False
+        try:
+            if job_id not in jobs:
+                jobs[job_id] = queue.job(job_id)
+            job = jobs[job_id]
+            interval = queue.settings(job_id)['lease_timeout']/4
+            heartbeat = threading.Thread(target=_renew, args=(queue, job_id, task_id, interval, stop), daemon=True)
+            heartbeat.start()
+
+            backtester = _backtester(backtesters, job, data_folder)
+            strategy_params, indicator_params = queue.task(job_id, task_id)
+            loaded = True
+            t = time.time()
+            result = backtester.run(strategy_params, indicator_params, start_dates=job['periods'], progressbar=False,
+                                    chunk_size=job['chunk_size'], overlap=job['overlap'])
+        except Exception:
+            stop.set()
+            queue.fail(job_id, task_id, f'[{name}] {traceback.format_exc()}')
+            # a job this worker can't load (its classes can't be imported, or the data differs) is left to others
+            if not loaded:
+                skip.add(job_id)
+            if verbose:
+                print(f'> {name}: task {task_id} of job {job_id} failed')
+        else:
+            stop.set()
+            queue.complete(job_id, task_id, result)
+            n_run += 1
+            if verbose:
+                print(f'> {name}: task {task_id} of job {job_id} done in {time.time() - t:.2f}s')
+        finally:
+            stop.set()
+            if heartbeat is not None:
+                heartbeat.join()
+        idle = time.time()
+    return n_run
+
+
+def _backtester(backtesters, job, data_folder):
+    # one backtester per dataset, switched to the strategy, indicators, fee and delta limits of each job
+    folder = data_folder or job.get('data_folder')
+    if folder is None:
+        raise ValueError("The sweep's data wasn't loaded from a folder, give the worker the data folder with --data")
+    key = (folder, tuple(job['stocks']))
+    if key not in backtesters:
+        from ..backtester import Backtester
+        backtesters[key] = Backtester(job['strategy_class'], job['indicator_class'], job['stocks'], folder,
+                                      progressbar=False)
+    backtester = backtesters[key]
+    if backtester._data.fingerprint != job['fingerprint']:
+        raise ValueError(f'The data in {folder} differs from the data the sweep was started with')
+
+    if backtester._strategy is not job['strategy_class']:
+        backtester.strategy = job['strategy_class']
+    if type(backtester._indicators) is not job['indicator_class']:
+        backtester.indicators = job['indicator_class']
+    backtester._fee = job['fee']
+    backtester._delta_limits = job['delta_limits']
+    return backtester
+
+
+def _renew(queue, job_id, task_id, interval, stop):
+    while not stop.wait(interval):
+        try:
+            queue.renew(job_id, task_id)
+        except FileNotFoundError:
+            return
+
+
+def _write(path, obj):
+    # written to a temporary file and renamed, so readers never see a partial file
+    temporary = f'{path}.{socket.gethostname()}-{os.getpid()}-{threading.get_ident()}.tmp'
+    with open(temporary, 'wb') as f:
+        pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary, path)
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
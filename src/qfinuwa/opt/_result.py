@@ -1,42 +1,90 @@
+import warnings
 from itertools import chain, product
 from pandas import concat, DataFrame, DatetimeIndex
 import numpy as np
-from tabulate import tabulate
+from ._lazy import tabulate
+from ._store import summarise
+from . import _metrics
 
 class SingleRunResult:
 
     def __init__(self, stocks: list, stockdata, 
             datetimeindex: DatetimeIndex, startend: tuple, 
-            value: dict, trades: list, fee: float, on_finish: object):
+            value: np.ndarray, trades: np.ndarray, fee: float, on_finish: object):
         self._start, self._end = startend
         self.fee = fee
 
-        datetimeindex = datetimeindex[self._start: self._end]
-
-        self.buys = [(i,s,q) for i, s,q in trades if q > 0]
-        self.sells = [(i, s,-q) for i,s,q in trades if q < 0]
-
-        self.n_buys = {stock: len([q for i,s,q in self.buys if s == stock]) for stock in stocks}
-        self.n_sells = {stock: len([-q for i,s,q in self.sells if s == stock]) for stock in stocks}
-        self.gross_pnl = {stock: value[stock][-1][1] for stock in stocks}
-        self.fees_paid = {stock: value[stock][-1][2] for stock in stocks}
-        self.net_pnl = {stock: value[stock][-1][1] - value[stock][-1][2]  for stock in stocks}
-
-        self.value = value
-        self._datetimeindex = datetimeindex.reset_index(drop=True)
+        # value is the (bars + 1, stocks, 3) matrix from Portfolio.wrap_up and trades its structured trade array,
+        # anything larger is derived from them when it is first needed
+        self._values = value
+        self.trades = trades
         self._stocks = stocks
 
-        self._stockdata = stockdata._stock_df
+        self._stockdata = stockdata
+        self._index = datetimeindex
 
         self.on_finish = on_finish
 
-        self.value_over_time = DataFrame([
-                                    sum(self.value[s][i][0] - abs(self.fee*self.value[s][i][0]) + self.value[s][i][1] - self.value[s][i][2] \
-                                    for s in self._stocks) 
-                                    for i in range(len(list(self.value.values())[0]))], columns=["value"])
+        def per_stock(values):
+            return dict(zip(stocks, values.tolist()))
+
+        quantity = trades['quantity']
+        self.n_buys = per_stock(np.bincount(trades['stock'][quantity > 0], minlength=len(stocks)))
+        self.n_sells = per_stock(np.bincount(trades['stock'][quantity < 0], minlength=len(stocks)))
+        self.gross_pnl = per_stock(value[-1, :, 1])
+        self.fees_paid = per_stock(value[-1, :, 2])
+        self.net_pnl = per_stock(value[-1, :, 1] - value[-1, :, 2])
 
+        self._value_over_time = None
+        self._statistics = None
+        self._metrics = None
+        self._returns = None
 
     #---------------[Properties]-----------------#
+    @property
+    def buys(self):
+        return [(i, self._stocks[s], q) for i, s, q, _ in self.trades[self.trades['quantity'] > 0].tolist()]
+
+    @property
+    def sells(self):
+        return [(i, self._stocks[s], -q) for i, s, q, _ in self.trades[self.trades['quantity'] < 0].tolist()]
+
+    @property
+    def value(self):
+        return {stock: self._values[:, s] for s, stock in enumerate(self._stocks)}
+
+    @property
+    def value_over_time(self):
+        if self._value_over_time is None:
+            position, capital, fees = np.moveaxis(self._values, 2, 0)
+            value = (position - np.abs(self.fee*position) + capital - fees).sum(axis=1)
+            self._value_over_time = DataFrame(value, columns=["value"])
+        return self._value_over_time
+
+    @property
+    def metrics(self):
+        '''
+        Performance metrics of the run: the annualised Sharpe and Sortino ratios (of the change in value per bar), 
+        maximum drawdown and its duration in bars, turnover (value traded), exposure (fraction of bars with an 
+        open position), hit rate (fraction of round trips that made money) and number of round trips.
+        '''
+        if self._metrics is None:
+            times = self._index.to_numpy()[self._start: self._end]
+            self._metrics = _metrics.compute(self._values, self.trades, self.fee, times)
+        return self._metrics[0]
+
+    @property
+    def stock_metrics(self):
+        '''
+        The turnover, exposure, hit rate and contribution (share of the net PnL) of each stock.
+        '''
+        self.metrics
+        return {name: dict(zip(self._stocks, values.tolist())) for name, values in self._metrics[1].items()}
+
+    @property
+    def _datetimeindex(self):
+        return self._index[self._start: self._end].reset_index(drop=True)
+
     @property
     def roi(self):
         return sum(self.net_pnl.values())
@@ -48,7 +96,10 @@ class SingleRunResult:
 
     @property
     def statistics(self):
+        if self._statistics is not None:
+            return self._statistics
 
+        stock_metrics = self.stock_metrics
         df = DataFrame({stock: [
                 self.n_buys[stock] + self.n_sells[stock],
                 self.n_buys[stock],
@@ -57,8 +108,13 @@ class SingleRunResult:
                 self.fees_paid[stock],
                 self.net_pnl[stock],
                 0 if self.n_buys[stock] + self.n_sells[stock] == 0 else self.net_pnl[stock]/(self.n_buys[stock] + self.n_sells[stock]),
+                stock_metrics['turnover'][stock],
+                stock_metrics['exposure'][stock],
+                stock_metrics['hit_rate'][stock],
+                stock_metrics['contribution'][stock],
                     ] for stock in self._stocks}, 
-                    index = ['n_trades', 'n_buys', 'n_sells', 'gross_pnl', 'fees_paid', 'net_pnl', 'pnl_per_trade'])
+                    index = ['n_trades', 'n_buys', 'n_sells', 'gross_pnl', 'fees_paid', 'net_pnl', 'pnl_per_trade',
+                             'turnover', 'exposure', 'hit_rate', 'contribution'])
 
         n_trades = sum(self.n_buys.values()) + sum(self.n_sells.values()) 
         pnl_per_trade = 0
@@ -72,13 +128,30 @@ class SingleRunResult:
                         df.iloc[4, :].sum(),
                         df.iloc[5, :].sum(),
                         pnl_per_trade,
+                        self.metrics['turnover'],
+                        self.metrics['exposure'],
+                        self.metrics['hit_rate'],
+                        df.iloc[10, :].sum(),
                         ]
 
+        self._statistics = df
         return df
     
     def sharp_ratio(self, risk_free_rate = 0):
-        percentage_returns = self.value_over_time.ffill().pct_change(1).replace([np.inf, -np.inf], np.nan).dropna()
-        ret = ((percentage_returns.mean(axis=0)[0] - risk_free_rate) / percentage_returns.std(axis=0)[0])
+        '''
+        Deprecated, use ``metrics['sharpe_ratio']``. The unannualised ratio of the mean percentage change in value
+        per bar, less ``risk_free_rate``, to its standard deviation.
+        '''
+        warnings.warn("sharp_ratio is deprecated, use metrics['sharpe_ratio']", DeprecationWarning, stacklevel=2)
+        return self._sharp_ratio(risk_free_rate)
+
+    def _sharp_ratio(self, risk_free_rate):
+        if getattr(self, '_returns', None) is None:
+            returns = _metrics.percentage_returns(self.value_over_time['value'].to_numpy())
+            self._returns = (returns.mean() if len(returns) else np.nan, returns.std(ddof=1) if len(returns) > 1 else np.nan)
+        mean, std = self._returns
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ret = (mean - risk_free_rate) / np.float64(std)
         # check NaN
         if np.isnan(ret):
             return -risk_free_rate
@@ -91,9 +164,19 @@ class SingleRunResult:
     def __str__(self):
         table =  str(tabulate(self.statistics, headers = 'keys', tablefmt="github", showindex = True, numalign="right"))
         return '\n' + ' -> '.join(self.date_range) + \
-            f'\n\nROI:\t{self.roi}\n' +  \
-            f'\nSharp Ratio (0% risk free):\t{self.sharp_ratio()}\n\n' + \
-            'RUN RESULTS:\n' + table
+            f'\n\nROI:\t{self.roi}\n\n' +  \
+            ''.join(f'{name}:\t{value}\n' for name, value in self.metrics.items()) + \
+            '\nRUN RESULTS:\n' + table
+
+    def __getstate__(self):
+        # the stock data is shared by every result, so it is left out and reattached when loaded
+        state = self.__dict__.copy()
+        state.update(_stockdata=None, _index=None, _value_over_time=None, _statistics=None)
+        return state
+
+    def _attach(self, stockdata) -> None:
+        self._stockdata = stockdata
+        self._index = stockdata.index
 
     def __repr__(self) -> str:
         return self.__str__()
@@ -122,7 +205,12 @@ class MultiRunResult:
             f.write(str(self) )
 
     def sharp_ratio(self, risk_free_rate = 0):
-        sharp_ratios = [result.sharp_ratio(risk_free_rate) for result in self.results]
+        '''
+        Deprecated, use ``metrics['sharpe_ratio']``. The mean and standard deviation over the runs of
+        ``SingleRunResult.sharp_ratio``.
+        '''
+        warnings.warn("sharp_ratio is deprecated, use metrics['sharpe_ratio']", DeprecationWarning, stacklevel=2)
+        sharp_ratios = [result._sharp_ratio(risk_free_rate) for result in self.results]
         return (np.mean(sharp_ratios), np.std(sharp_ratios))
         
     #---------------[Properties]-----------------#
@@ -131,6 +219,13 @@ class MultiRunResult:
         rois = [result.roi for result in self.results]
         return (np.mean(rois), np.std(rois))
     
+    @property
+    def metrics(self):
+        '''
+        The metrics of each run, one row per run.
+        '''
+        return DataFrame([result.metrics for result in self.results])
+
     @property
     def statistics(self):
         dfs = [result.statistics for result in self.results]
@@ -140,9 +235,10 @@ class MultiRunResult:
 
     def __str__(self):
         table = str(tabulate(self.statistics, headers = 'keys', tablefmt="github", showindex = True, numalign="right"))
+        metrics = self.metrics.agg(['mean', 'std']).T
         return '\n' + str(self.parameters) + \
             f'\n\nMean ROI:\t{self.roi[0]}\nSTD ROI:\t{self.roi[1]}\n\n' + \
-            f'\nMean SHARP RATIO:\t{self.sharp_ratio(0)[0]}\nSTD SHARP RATIO:\t{self.sharp_ratio()[1]}\n\n' + \
+            str(tabulate(metrics, headers = 'keys', tablefmt="github", showindex = True, numalign="right")) + '\n\n' + \
               '\n'.join([(' -> '.join(res.date_range) + f':\t{res.roi:.3f}') for res in self]) \
                 +'\n\n'  + f'AVERAGED RESULTS FOR {len(self.results)} RUNS:\n' + table
 
@@ -151,7 +247,7 @@ class MultiRunResult:
 
 class ParameterSweepResult:
 
-    def __init__(self, multi_results: MultiRunResult, params: dict):
+    def __init__(self, multi_results: MultiRunResult, params: dict, store=None):
 
         # a = dict()
         # i = dict()
@@ -168,20 +264,118 @@ class ParameterSweepResult:
 
         self.parameters = params
 
+        # when results are streamed to a store only the best result is kept in memory
+        self._store = store
         self.results = sorted(multi_results, key=lambda res: -res.roi[0])
+        self._scores = None
 
     #---------------[Properties]-----------------#
     @property
     def best(self):
         return self.results[0]
 
+    @property
+    def scores(self) -> DataFrame:
+        '''
+        The metrics used for ranking, one row per result (in the current order): the mean and standard deviation 
+        of the ROI and the mean of each of ``SingleRunResult.metrics``.
+        Computed once and reused by ``rank``, ``top`` and ``pareto``. Not available for a sweep written to a 
+        ``store``, which only keeps its best result in memory (``to_frame`` has every run).
+        '''
+        if self._store is not None:
+            raise RuntimeError('Only the best result of a sweep written to a store is kept in memory, '
+                               'rank the stored runs with to_frame() instead')
+        if self._scores is None:
+            self._scores = DataFrame([{'roi': result.roi[0], 'roi_std': result.roi[1],
+                                       **result.metrics.mean().to_dict()} for result in self.results],
+                                     columns=['roi', 'roi_std'] + _metrics.METRICS)
+        return self._scores
+
     #----------------[Public Methods]-----------------#
     def save(self, filename: str):
         with open(filename, 'w') as f:
             f.write(str(self) )
-        # TODO: add big dataframe of all results
+
+    def rank(self, by='roi', ascending: bool = None) -> 'ParameterSweepResult':
+        '''
+        Orders the results by a metric.
+
+        ## Parameters
+        - ``by`` (``str`` or ``callable``): A column of ``scores``, or a function taking ``scores`` and returning a 
+          value for every result (e.g. ``lambda s: s.sharpe_ratio - s.max_drawdown/1000``).
+        - ``ascending`` (``bool``): Whether smaller values rank first, by default only for metrics where smaller is 
+          better (such as ``max_drawdown``).
+
+        ## Returns
+        ``ParameterSweepResult``: The same results in ranked order, the best being ``best``.
+        '''
+        values = self._score(by)
+        if ascending is None:
+            ascending = by in _metrics.LOWER_IS_BETTER
+        order = np.argsort(values if ascending else -values, kind='stable')
+        return self._subset(order)
+
+    def top(self, k: int, by='roi', ascending: bool = None) -> 'ParameterSweepResult':
+        '''
+        Keeps the ``k`` best results by a metric, see ``rank``.
+
+        ## Returns
+        ``ParameterSweepResult``: The ``k`` best results, in ranked order.
+        '''
+        ranked = self.rank(by, ascending)
+        return ranked._subset(np.arange(min(k, len(ranked.results))))
+
+    def pareto(self, objectives) -> 'ParameterSweepResult':
+        '''
+        Selects the results on the Pareto front of several objectives, those which no other result is at least as 
+        good as in every objective and better in one.
+
+        ## Parameters
+        - ``objectives`` (``list`` or ``dict``): Columns of ``scores`` or functions (see ``rank``), or a dictionary 
+          mapping each to ``'max'`` or ``'min'``. Without a direction, objectives are maximised unless smaller is 
+          better (such as ``max_drawdown``).
+
+        ## Returns
+        ``ParameterSweepResult``: The results on the front, ranked by the first objective.
+        '''
+        if not isinstance(objectives, dict):
+            objectives = {by: 'min' if by in _metrics.LOWER_IS_BETTER else 'max' for by in objectives}
+        if set(objectives.values()) - {'max', 'min'}:
+            raise ValueError(f"Objectives must be either 'max' or 'min', got {set(objectives.values())}")
+
+        scores = np.column_stack([self._score(by)*(1 if direction == 'max' else -1) for by, direction in objectives.items()])
+        front = self._subset(np.flatnonzero(_metrics.pareto_front(scores)))
+        first, direction = next(iter(objectives.items()))
+        return front.rank(first, ascending=direction == 'min')
+
+    def to_frame(self) -> DataFrame:
+        '''
+        Tabulates the sweep, with the parameters (``strategy.<param>`` and ``<indicator function>.<param>``) 
+        and summary metrics of every fold of every run.
+
+        ## Returns
+        ``DataFrame``: One row per fold of every run.
+        '''
+        if self._store is not None:
+            return self._store.to_frame()
+        return DataFrame([row for run, result in enumerate(self.results) for row in summarise(run, result)])
     
     #---------------[Internal Methods]-----------------#
+    def _score(self, by) -> np.ndarray:
+        if callable(by):
+            return np.asarray(by(self.scores), dtype='float64')
+        if by not in self.scores:
+            raise ValueError(f'Unknown metric {by}, expected one of {list(self.scores.columns)}')
+        return self.scores[by].to_numpy(dtype='float64')
+
+    def _subset(self, order) -> 'ParameterSweepResult':
+        # a new sweep result of the results at the positions in order, reusing their scores
+        subset = object.__new__(ParameterSweepResult)
+        subset.__dict__.update(self.__dict__)
+        subset.results = [self.results[i] for i in order]
+        subset._scores = self.scores.iloc[order].reset_index(drop=True)
+        return subset
+
     def __getitem__(self, idx):
 
         return self.results[idx]
@@ -195,3 +389,72 @@ class ParameterSweepResult:
 
     def __repr__(self):
         return self.__str__()
+
+
+class MonteCarloResult:
+
+    def __init__(self, summaries: dict, parameters: tuple, method: str):
+        a, i = parameters
+        self.parameters = {
+            'strategy': a,
+            'indicator': i,
+        }
+        self.method = method
+
+        # only the summary metrics of each path are kept, as arrays
+        self._summaries = summaries
+
+    #---------------[Properties]-----------------#
+    @property
+    def roi(self):
+        return self._summaries['roi']
+
+    @property
+    def sharpe_ratio(self):
+        return self._summaries['sharpe_ratio']
+
+    @property
+    def max_drawdown(self):
+        return self._summaries['max_drawdown']
+
+    @property
+    def n_paths(self):
+        return len(self.roi)
+
+    #----------------[Public Methods]-----------------#
+    def quantiles(self, q: list = [0.05, 0.25, 0.5, 0.75, 0.95]) -> DataFrame:
+        '''
+        Quantiles of the distribution of each metric over the paths.
+
+        ## Parameters
+        - ``q`` (``list``): The quantiles to compute.
+
+        ## Returns
+        ``DataFrame``: One column per metric.
+        '''
+        return self.to_frame().drop(columns='path').quantile(q)
+
+    def to_frame(self) -> DataFrame:
+        '''
+        The metrics of every path.
+
+        ## Returns
+        ``DataFrame``: One row per path.
+        '''
+        return DataFrame(self._summaries)
+
+    def save(self, filename: str):
+        with open(filename, 'w') as f:
+            f.write(str(self))
+
+    #---------------[Internal Methods]-----------------#
+    def __len__(self):
+        return self.n_paths
+
+    def __str__(self):
+        table = self.to_frame().drop(columns='path').describe(percentiles=[0.05, 0.5, 0.95]).T
+        return '\n' + str(self.parameters) + f'\n\nMONTE CARLO ({self.method}) OVER {self.n_paths} PATHS:\n' + \
+            str(tabulate(table, headers = 'keys', tablefmt="github", showindex = True, numalign="right"))
+
+    def __repr__(self) -> str:
+        return self.__str__()
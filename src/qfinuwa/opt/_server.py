@@ -0,0 +1,307 @@
+import os
+import sys
+import json
+import time
+import importlib
+import threading
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+from ._stockdata import StockData
+from ._store import summarise
+
+# the fields a job can have, besides the strategy and indicator classes and the backtester settings
+_RUN = {'strategy_params', 'indicator_params', 'cv', 'seed', 'start_dates', 'backend', 'chunk_size', 'overlap'}
+_SWEEP = {'strategy_params', 'indicator_params', 'cv', 'seed', 'start_dates', 'checkpoint', 'chunk_size', 'overlap', 'queue'}
+_SETTINGS = {'strategy', 'indicators', 'days', 'fee', 'delta_limits', 'values'}
+
+class BacktestServer:
+
+    def __init__(self, data_folder: str, stocks: list = None, host: str = '127.0.0.1', port: int = 8765,
+                 days='all', delta_limits=10000, fee: float = 0.0, cache_size: int = 128,
+                 indicators: list = (), verbose: bool = True):
+        '''
+        A long-running process that loads a data folder once and runs backtests on it over HTTP. The data, the
+        indicator cache of every indicator class used and the results of recent runs stay in memory between jobs,
+        so a short backtest doesn't wait on loading the data or computing indicators.
+
+        A job is a JSON object naming its ``strategy`` and ``indicators`` classes as ``'module:Class'`` (modules are
+        reloaded when their file changes), with the arguments of ``Backtester.run`` or ``run_grid_search`` and
+        optionally its ``days``, ``fee`` and ``delta_limits``, and ``values`` to also return the value over time of
+        each fold. Results are streamed back as newline delimited JSON, one line per fold as it completes, ending
+        with ``{"done": true}`` (or ``{"error": ...}`` if the job fails part way). Jobs run one at a time.
+
+        - ``GET /status``: the data, and the classes and cached results in memory.
+        - ``POST /run``: runs the strategy on each fold.
+        - ``POST /sweep``: runs a grid search, streaming the folds of each combination as it completes.
+
+        ## Parameters
+        - ``data_folder`` (``str``): The data folder (or store) to load.
+        - ``stocks`` (``list``): The stocks to load, every stock in the folder if ``None``.
+        - ``host`` (``str``): The address to listen on, only this machine by default.
+        - ``port`` (``int``): The port to listen on, ``0`` picks a free one.
+        - ``days``, ``delta_limits``, ``fee``: The defaults for jobs that don't give them, see ``Backtester``.
+        - ``cache_size`` (``int``): The number of run results kept for identical jobs, per indicator class.
+        - ``indicators`` (``list``): Indicator classes (``'module:Class'``) to compute up front.
+        - ``verbose`` (``bool``): Whether to print each job.
+        '''
+        self._data = StockData(data_folder, stocks=stocks, verbose=verbose)
+        self._days, self._delta_limits, self._fee = days, delta_limits, fee
+        self._cache_size = cache_size
+        self._verbose = verbose
+
+        self._backtesters = dict()
+        self._mtimes = dict()
+        self._lock = threading.Lock()
+        self._started = time.time()
+        self._n_jobs = 0
+
+        self._http = ThreadingHTTPServer((host, port), _Handler)
+        self._http.daemon_threads = True
+        self._http.backtest = self
+
+        for name in indicators:
+            self._indicators(name)
+
+    #---------------[Properties]-----------------#
+    @property
+    def address(self) -> str:
+        host, port = self._http.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def status(self) -> dict:
+        start, end = self._data.date_range
+        return {'stocks': list(self._data.stocks), 'bars': len(self._data), 'start': str(start), 'end': str(end),
+                'ragged': self._data.ragged, 'out_of_core': self._data.out_of_core,
+                'indicators': {name: {'strategy': f'{backtester._strategy.__module__}:{backtester._strategy.__name__}',
+                                      'cached_results': len(backtester._result_cache or ())}
+                               for name, backtester in self._backtesters.items()},
+                'jobs': self._n_jobs, 'uptime': time.time() - self._started}
+
+    #---------------[Public Methods]-----------------#
+    def serve_forever(self) -> None:
+        '''
+        Handles requests until ``shutdown`` is called (from another thread) or the process is interrupted.
+        '''
+        if self._verbose:
+            print(f'> Serving {len(self._data)} bars of {self._data.stocks} on {self.address}', flush=True)
+        try:
+            self._http.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._http.server_close()
+
+    def shutdown(self) -> None:
+        self._http.shutdown()
+
+    def submit(self, endpoint: str, job: dict):
+        '''
+        Runs a job in this process, returning a generator of the lines a request to ``endpoint`` (``'run'`` or
+        ``'sweep'``) streams back. The job is checked before it is returned, raising ``ValueError`` or
+        ``TypeError`` if it is invalid.
+        '''
+        if endpoint not in ('run', 'sweep'):
+            raise ValueError(f"endpoint must be 'run' or 'sweep', not {endpoint}")
+        if not isinstance(job, dict):
+            raise TypeError(f'A job must be a JSON object, not {type(job)}')
+        unknown = job.keys() - _SETTINGS - (_RUN if endpoint == 'run' else _SWEEP)
+        if unknown:
+            raise ValueError(f'Unknown fields {sorted(unknown)} in {endpoint} job')
+        for field in ('strategy', 'indicators'):
+            if field not in job:
+                raise ValueError(f"A job needs its {field} class, as 'module:Class'")
+
+        with self._lock:
+            backtester = self._indicators(job['indicators'])
+            strategy = _load(job['strategy'], self._mtimes)
+        return self._stream(endpoint, job, backtester, strategy)
+
+    #---------------[Private Methods]-----------------#
+    def _indicators(self, name):
+        # the backtester of an indicator class, which keeps its indicator cache between jobs
+        from ..backtester import Backtester
+        indicators = _load(name, self._mtimes)
+        backtester = self._backtesters.get(name)
+        if backtester is None:
+            from ..strategy import Strategy
+            backtester = Backtester(Strategy, indicators, None, self._data, self._days, self._delta_limits, self._fee,
+                                    progressbar=False, cache_size=self._cache_size)
+            self._backtesters[name] = backtester
+        elif type(backtester._indicators) is not indicators:
+            # the module was changed and reloaded
+            backtester.indicators = indicators
+            if backtester._result_cache is not None:
+                backtester._result_cache.clear()
+        return backtester
+
+    def _stream(self, endpoint, job, backtester, strategy):
+        args = {k: v for k, v in job.items() if k not in _SETTINGS}
+        with self._lock:
+            t = time.time()
+            if backtester._strategy is not strategy:
+                # jobs give their own parameters, so the stored ones aren't kept (or reset with a warning)
+                from ..backtester import _StrategyModifier
+                backtester._strategy_wrapper = _StrategyModifier(strategy)
+            backtester.days = job.get('days', self._days)
+            backtester.fee = job.get('fee', self._fee)
+            backtester.delta_limits = job.get('delta_limits', self._delta_limits)
+
+            if endpoint == 'run':
+                # each fold is run (and streamed) on its own
+                periods = backtester._test_periods(args.pop('cv', 1), args.pop('seed', None), args.pop('start_dates', None))
+                results = (backtester.run(**args, start_dates=[period], progressbar=False) for period in periods)
+            else:
+                results = backtester.iter_grid_search(**args)
+
+            n = 0
+            for run, result in enumerate(results):
+                rows = summarise(run, result)
+                for fold, (row, single) in enumerate(zip(rows, result)):
+                    if endpoint == 'run':
+                        row.update(run=0, fold=run)
+                    if job.get('values'):
+                        row['values'] = single.value_over_time['value'].tolist()
+                    n += 1
+                    yield row
+
+            self._n_jobs += 1
+            if self._verbose:
+                print(f'> {endpoint} {job["strategy"]} with {job["indicators"]}: {n} folds in {time.time() - t:.3f}s', flush=True)
+            yield {'done': True, 'folds': n, 'seconds': time.time() - t}
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    server_version = 'qfinuwa'
+
+    def do_GET(self):
+        if self.path.rstrip('/') != '/status':
+            return self._reply(404, {'error': f'Unknown endpoint {self.path}'})
+        self._reply(200, self.server.backtest.status)
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            job = json.loads(self.rfile.read(length) or b'{}')
+            lines = self.server.backtest.submit(self.path.strip('/'), job)
+        except (ValueError, TypeError, ImportError, AttributeError) as e:
+            return self._reply(400, {'error': f'{type(e).__name__}: {e}'})
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.end_headers()
+        try:
+            for line in lines:
+                self._write(line)
+        except (BrokenPipeError, ConnectionResetError):
+            # the client went away, the job was stopped when the generator was closed
+            pass
+        except Exception:
+            self._write({'error': traceback.format_exc()})
+        finally:
+            lines.close()
+
+    def _reply(self, code, body):
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps(body).encode())
+
+    def _write(self, line):
+        self.wfile.write(json.dumps(line).encode() + b'\n')
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        # jobs are printed by the server instead
+        pass
+
+class BacktestClient:
+
+    def __init__(self, url: str = 'http://127.0.0.1:8765', timeout: float = None):
+        '''
+        Sends jobs to a ``BacktestServer``, yielding each line of the results as it is streamed back.
+
+        ## Parameters
+        - ``url`` (``str``): The address of the server.
+        - ``timeout`` (``float``): Seconds to wait for the server to respond, forever if ``None``.
+
+        ## Example
+        ```python
+        client = BacktestClient()
+        for fold in client.run('strategies:Momentum', 'strategies:MomentumIndicators', cv=5, seed=1):
+            print(fold)
+        ```
+        '''
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    #---------------[Public Methods]-----------------#
+    def status(self) -> dict:
+        '''
+        The data, and the classes and cached results in memory on the server.
+        '''
+        with urlopen(f'{self.url}/status', timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+    def run(self, strategy, indicators, **job):
+        '''
+        Runs a strategy on the server, yielding the summary of each fold as it completes and then
+        ``{"done": true, ...}``. The classes can be given as ``'module:Class'`` or as the classes themselves (whose
+        modules the server must be able to import), and ``job`` takes the arguments of ``Backtester.run`` along
+        with ``days``, ``fee``, ``delta_limits`` and ``values``.
+        '''
+        return self._submit('run', strategy, indicators, job)
+
+    def sweep(self, strategy, indicators, **job):
+        '''
+        Runs a grid search on the server, yielding the summary of each fold of each combination as it completes,
+        see ``run`` and ``Backtester.run_grid_search``.
+        '''
+        return self._submit('sweep', strategy, indicators, job)
+
+    #---------------[Private Methods]-----------------#
+    def _submit(self, endpoint, strategy, indicators, job):
+        job = {**job, 'strategy': _name(strategy), 'indicators': _name(indicators)}
+        request = Request(f'{self.url}/{endpoint}', data=json.dumps(job).encode(), 
+                          headers={'Content-Type': 'application/json'})
+        try:
+            response = urlopen(request, timeout=self.timeout)
+        except HTTPError as e:
+            raise ValueError(json.loads(e.read())['error'])
+
+        with response:
+            for line in response:
+                line = json.loads(line)
+                if 'error' in line:
+                    raise RuntimeError(f'The job failed on the server:\n{line["error"]}')
+                yield line
+
+    def __repr__(self):
+        return f'BacktestClient({self.url!r})'
+
+#---------------[Private Functions]-----------------#
+def _load(name, mtimes):
+    # the class named 'module:Class', reloading its module if the file has changed since it was loaded
+    module_name, _, class_name = name.partition(':')
+    if not module_name or not class_name:
+        raise ValueError(f"Classes are named as 'module:Class', got {name!r}")
+
+    module = sys.modules.get(module_name)
+    if module is None:
+        module = importlib.import_module(module_name)
+    elif module_name in mtimes and _mtime(module) != mtimes[module_name]:
+        module = importlib.reload(module)
+    mtimes[module_name] = _mtime(module)
+    return getattr(module, class_name)
+
+
+def _name(cls):
+    return cls if isinstance(cls, str) else f'{cls.__module__}:{cls.__qualname__}'
+
+
+def _mtime(module):
+    path = getattr(module, '__file__', None)
+    return os.stat(path).st_mtime_ns if path and os.path.exists(path) else None
@@ -1,6 +1,9 @@
 import numpy as np
 import pandas as pd
 import os
+import io
+import json
+import hashlib
 from itertools import product
 from collections import defaultdict
 
@@ -14,21 +17,31 @@ from collections import defaultdict
 #         from tqdm import tqdm   
 # except NameError:
 #     from tqdm import tqdm      # Probably standard Python interpreter
-from tqdm import tqdm
+from ._lazy import tqdm
 
 
 
 class StockData:
 
+    # the file that marks a folder as a store written by write_store
+    _STORE = 'store.json'
+
     def __init__(self, data_folder: str = None, stocks: list = None, verbose: bool=False, low_memory: bool = False):
 
         self._measurement = ['open', 'close', 'high', 'low', 'volume']
         self._i = 0
 
-        self._stock_df = dict()
+        self._frames = dict()
+        self._data_folder = data_folder
+        self._file_ends = dict()
+        self._columns = dict()
 
         self._L = 0
-        self._index = None
+        self._buffer = np.empty((0, 0))
+        self._times = np.empty(0, dtype='datetime64[ns]')
+        # whether each stock has a bar at each time, packed into bits along the bars of each stock (in sorted 
+        # order), or None when every stock has every bar
+        self._valid = None
 
         self._verbose = verbose
 
@@ -38,7 +51,13 @@ class StockData:
 
         self.low_memory = low_memory
 
+        self._invalidate()
+
         if data_folder is None: return
+
+        if os.path.isfile(os.path.join(data_folder, self._STORE)):
+            self._load_store(data_folder, stocks)
+            return
         
         if stocks is None:
             stocks = [f.split('.')[0] for f in os.listdir(data_folder) if f.endswith('.csv')]
@@ -47,26 +66,132 @@ class StockData:
         #     raise ValueError('No stocks provided')
         
         self._stocks = sorted(stocks)
+        index = None
+        times = dict()
         # stocks + ['SPY']
         for stock in (tqdm(stocks, desc='> Fetching data') if verbose else stocks):
 
-            _df = pd.read_csv(os.path.join(data_folder, f'{stock}.csv'))
+            path = os.path.join(data_folder, f'{stock}.csv')
+            _df = pd.read_csv(path)
+            # remembered so that bars appended to the file later can be read on their own
+            self._file_ends[stock] = os.path.getsize(path)
+            self._columns[stock] = list(_df.columns)
             
-            if self._L == 0:
-                self._L = len(_df)
-                self._index = pd.to_datetime(_df['time'])
+            times[stock] = pd.to_datetime(_df['time'])
+            if index is None:
+                index = times[stock]
 
             # if stock == 'SPY':
             #     self.spy = _df['close'].to_numpy()
-            _df.set_index(self._index, inplace=True)
-            self._stock_df[stock] = _df[self._measurement]
-        self._data = self._compress_data()
-        # pre calcualte the price at every iteration for efficiency
-        self._prices = np.array([{stock: self._data[i, 1 + s*5]
-                                for s, stock in enumerate(self._stocks)} for i in range(self._L)])
+            self._frames[stock] = _df[self._measurement]
 
-        self.sinames = [(measurement, stock , i) for i, (stock, measurement) in 
-                        enumerate(product(self._stocks, self._measurement))]
+        if all(len(t) == len(index) and (t.values == index.values).all() for t in times.values()):
+            self._frames = {stock: _df.set_index(index) for stock, _df in self._frames.items()}
+            self._set_data(index, self._compress_data())
+            return
+
+        # ragged histories are kept as they are on the union of their times, rather than interpolated
+        union, data, valid = _align(self._stocks, {stock: (times[stock].to_numpy(dtype='datetime64[ns]'), 
+                                                           self._frames[stock].to_numpy(dtype='float64'))
+                                                   for stock in self._stocks})
+        self._frames = {stock: None for stock in self._frames}
+        self._set_data(pd.Series(union, name='time'), data, valid)
+
+    #---------------[Class Methods]-----------------#
+    @classmethod
+    def _from_arrays(cls, stocks: list, times, data: np.ndarray, verbose: bool=False, low_memory: bool=False):
+        '''
+        Builds a ``StockData`` from an array laid out like ``_data`` (five columns per stock, stocks in sorted order).
+        '''
+        stockdata = cls(verbose=verbose, low_memory=low_memory)
+        stockdata._stocks = sorted(stocks)
+        stockdata._set_data(pd.Series(pd.to_datetime(times), name='time'), 
+                            np.asarray(data, dtype='float64').reshape(-1, len(stocks)*len(stockdata._measurement)))
+        return stockdata
+
+    @classmethod
+    def write_store(cls, data_folder: str, path: str, stocks: list = None, chunk_size: int = 100_000, 
+                    verbose: bool = False) -> None:
+        '''
+        Converts a data folder of ``.csv`` files into a store that ``StockData`` (and so ``Backtester``) memory maps
+        instead of loading, so only the bars in use are read from disk. The files are read ``chunk_size`` rows at 
+        a time, so the data never has to fit in memory.
+
+        ## Parameters
+        - ``data_folder`` (``str``): The folder of ``.csv`` files, which can have different times (see ``valid``).
+        - ``path`` (``str``): The folder to write the store to.
+        - ``stocks`` (``list``): The stocks to store, defaults to every file in the folder.
+        - ``chunk_size`` (``int``): The number of rows read at a time.
+        - ``verbose`` (``bool``): Whether to show a progress bar.
+
+        ## Returns
+        ``None``
+        '''
+        if int(chunk_size) != chunk_size or chunk_size < 1:
+            raise ValueError(f'chunk_size must be a positive integer, got {chunk_size}')
+        if stocks is None:
+            stocks = [f.split('.')[0] for f in os.listdir(data_folder) if f.endswith('.csv')]
+        stocks = sorted(stocks)
+        if not stocks:
+            raise ValueError(f'No stocks to store in {data_folder}')
+
+        measurement = ['open', 'close', 'high', 'low', 'volume']
+        n = len(measurement)
+        files = [os.path.join(data_folder, f'{stock}.csv') for stock in stocks]
+        def chunks(file, columns):
+            return pd.read_csv(file, usecols=columns, chunksize=chunk_size)
+
+        def read_times(file):
+            return np.concatenate([pd.to_datetime(chunk['time']).to_numpy(dtype='datetime64[ns]') 
+                                   for chunk in chunks(file, ['time'])])
+
+        # files with the same times are stored as they are, otherwise on the union of their times (as when loading
+        # the folder), one file's times are read at a time
+        index = read_times(files[0])
+        aligned = True
+        for file in files[1:]:
+            file_times = read_times(file)
+            if aligned and np.array_equal(file_times, index):
+                continue
+            index = np.union1d(index, file_times)
+            aligned = False
+        L = len(index)
+
+        os.makedirs(path, exist_ok=True)
+        for name in [cls._STORE, 'valid.npy']:
+            if os.path.exists(os.path.join(path, name)):
+                os.remove(os.path.join(path, name))
+        data = np.lib.format.open_memmap(os.path.join(path, 'data.npy'), mode='w+', dtype='float64', shape=(L, n*len(stocks)))
+        times = np.lib.format.open_memmap(os.path.join(path, 'times.npy'), mode='w+', dtype='datetime64[ns]', shape=(L,))
+        times[:] = index
+        valid = np.zeros((len(stocks), -(-L//8)), dtype='uint8')
+
+        for s, file in enumerate(tqdm(files, desc='> Writing store') if verbose else files):
+            row = 0
+            has = np.zeros(L, dtype=bool)
+            for chunk in chunks(file, ['time'] + measurement):
+                values = chunk[measurement].to_numpy(dtype='float64')
+                if aligned:
+                    data[row: row + len(chunk), s*n: (s + 1)*n] = values
+                else:
+                    at = np.searchsorted(index, pd.to_datetime(chunk['time']).to_numpy(dtype='datetime64[ns]'))
+                    if has[at].any() or len(np.unique(at)) != len(at):
+                        raise ValueError(f'{file} has more than one bar at the same time')
+                    data[at, s*n: (s + 1)*n] = values
+                    has[at] = True
+                row += len(chunk)
+            if not aligned:
+                data[~has, s*n: (s + 1)*n] = np.nan
+                valid[s] = np.packbits(has)
+        data.flush()
+        times.flush()
+        del data, times
+        if not aligned:
+            np.save(os.path.join(path, 'valid.npy'), valid)
+
+        # written last, so an interrupted conversion isn't mistaken for a store
+        with open(os.path.join(path, cls._STORE), 'w') as f:
+            json.dump({'stocks': stocks, 'bars': L, 'measurement': measurement}, f)
     
     #---------------[Properties]-----------------#
     @property
@@ -77,10 +202,91 @@ class StockData:
     def index(self):
         return self._index
     
+    @property
+    def ragged(self) -> bool:
+        '''
+        Whether some stocks are missing bars (see ``valid``).
+        '''
+        return self._valid is not None
+
+    @property
+    def valid(self) -> np.ndarray:
+        '''
+        Whether each stock has a bar at each time, as a ``(bars, stocks)`` array with stocks in the order of 
+        ``stocks``. Files with different times are aligned on the union of their times without filling in the bars 
+        a stock is missing, which are NaN.
+        '''
+        if self._valid is None:
+            return np.ones((self._L, len(self._stocks)), dtype=bool)
+        return np.unpackbits(self._valid, axis=1, count=self._L).view(bool).T
+
+    @property
+    def out_of_core(self) -> bool:
+        '''
+        Whether the data is memory mapped from a store (see ``write_store``) rather than held in memory.
+        '''
+        return isinstance(self._buffer, np.memmap)
+
     @property
     def date_range(self):
         return min(self._index), max(self._index)
 
+    @property
+    def fingerprint(self) -> str:
+        '''
+        A hash of the stocks, times and prices, which changes whenever the data does.
+        '''
+        if self._fingerprint is None:
+            h = hashlib.sha256(repr(self._stocks).encode())
+            h.update(np.ascontiguousarray(self._times[:self._L]).view('int64'))
+            h.update(np.ascontiguousarray(self._data))
+            self._fingerprint = h.hexdigest()
+        return self._fingerprint
+
+    @property
+    def arrays(self):
+        '''
+        Zero-copy structured views of ``_data`` for each stock, with fields ``open``, ``close``, 
+        ``high``, ``low`` and ``volume``.
+        '''
+        if self._arrays is None:
+            self._arrays = {stock: self._structured_view(s) for s, stock in enumerate(self._stocks)}
+        return self._arrays
+
+    @property
+    def _data(self):
+        return self._buffer[:self._L]
+
+    @property
+    def _index(self):
+        if self._index_cache is None:
+            self._index_cache = pd.Series(self._times[:self._L], name='time')
+        return self._index_cache
+
+    @property
+    def _stock_df(self):
+        if self._stock_df_cache is None:
+            self._stock_df_cache = {stock: self._frame(stock) for stock in self._frame_order}
+        return self._stock_df_cache
+
+    @property
+    def _frame_order(self):
+        # the order of _stock_df, which is the order the stocks were given in
+        return list(self._frames) or self._stocks
+
+    @property
+    def _prices(self):
+        # pre calcualte the price at every iteration for efficiency
+        if self._prices_cache is None:
+            self._prices_cache = np.array([{stock: self._data[i, 1 + s*5]
+                                for s, stock in enumerate(self._stocks)} for i in range(self._L)])
+        return self._prices_cache
+
+    @property
+    def sinames(self):
+        return [(measurement, stock , i) for i, (stock, measurement) in 
+                        enumerate(product(self._stocks, self._measurement))]
+
     @property
     def prices(self):
 
@@ -99,20 +305,228 @@ class StockData:
         for price_point in (tqdm(price_indexer(),  
                 desc = '> Precompiling data', 
                 mininterval=0.5,
-                total=len(self)) if self._verbose else range(len(self))):
+                total=len(self)) if self._verbose else price_indexer()):
 
             siss.append(price_point)
 
         return self._prices, siss
     
+    #---------------[Public Methods]-----------------#
+    def refresh(self) -> int:
+        '''
+        Appends any bars that have been added to the end of the data files since they were loaded. Only the new
+        part of each file is read.
+
+        ## Returns
+        ``int``: The number of new bars.
+        '''
+        if self._data_folder is None:
+            raise ValueError('Data was not loaded from a data folder')
+        if self.out_of_core:
+            raise ValueError('Data loaded from a store can\'t be refreshed, write the store again instead')
+
+        new = dict()
+        for stock in self._frame_order:
+            path = os.path.join(self._data_folder, f'{stock}.csv')
+            if os.path.getsize(path) < self._file_ends[stock]:
+                raise ValueError(f'{path} has been truncated or rewritten, reload the data instead')
+            
+            with open(path, 'rb') as f:
+                f.seek(self._file_ends[stock])
+                tail = f.read()
+            new[stock] = pd.read_csv(io.BytesIO(tail), header=None, names=self._columns[stock]) if tail.strip() \
+                    else pd.DataFrame(columns=self._columns[stock])
+
+        times = {stock: pd.to_datetime(df['time']).to_numpy(dtype='datetime64[ns]') for stock, df in new.items()}
+        first = times[self._stocks[0]] if new else np.empty(0, dtype='datetime64[ns]')
+        if all(np.array_equal(t, first) for t in times.values()):
+            rows = np.concatenate([new[stock][self._measurement].to_numpy(dtype='float64') for stock in sorted(new)], axis=1)
+        else:
+            # stocks with different new bars are aligned on the union of their times, like when loading
+            first, rows, _ = _align(self._stocks, {stock: (times[stock], new[stock][self._measurement].to_numpy(dtype='float64'))
+                                                   for stock in self._stocks})
+        
+        n = len(first)
+        if n > 0:
+            if self._L and first[0] <= self._times[self._L - 1]:
+                raise ValueError(f'New bars must be after the last bar loaded ({self._times[self._L - 1]})')
+            self._append(first, rows)
+
+        for stock in new:
+            self._file_ends[stock] = os.path.getsize(os.path.join(self._data_folder, f'{stock}.csv'))
+        return n
+
     #---------------[Private Methods]-----------------#
+    def _cursor(self, start: int = 0, end: int = None, matrix: bool = False):
+        '''
+        Iterates over bars ``start`` to ``end``, yielding the same ``(curr_prices, prices)`` pairs as ``prices``.
+        Each bar is built from views of ``_data`` when it is reached, so starting at any bar takes constant time.
+        If ``matrix``, ``prices[measurement]`` is instead a ``(bars, stocks)`` view with stocks in the order of ``stocks``.
+        '''
+        end = self._L if end is None else end
+        if not 0 <= start <= end <= self._L:
+            raise ValueError(f'Invalid range {start} to {end} for {self._L} bars')
+
+        data = self._data
+        if matrix:
+            n = len(self._measurement)
+            for index in range(start, end):
+                window = data[:index+1]
+                yield dict(zip(self._stocks, data[index, 1::n])), \
+                      {measurement: window[:, j::n] for j, measurement in enumerate(self._measurement)}
+            return
+
+        closes = [(stock, 1 + s*5) for s, stock in enumerate(self._stocks)]
+        sinames = self.sinames
+        for index in range(start, end):
+            A = defaultdict(dict)
+            for measurement, stock, i in sinames:
+                A[measurement][stock] = data[:index+1, i]
+            yield {stock: data[index, i] for stock, i in closes}, A
+
+    def _load_store(self, path: str, stocks: list = None) -> None:
+        with open(os.path.join(path, self._STORE)) as f:
+            meta = json.load(f)
+        if stocks is not None and sorted(stocks) != meta['stocks']:
+            raise ValueError(f'The store at {path} holds {meta["stocks"]}, got {sorted(stocks)}, write a store '
+                             'with just these stocks instead')
+        
+        self._stocks = meta['stocks']
+        self._L = meta['bars']
+        self._buffer = np.load(os.path.join(path, 'data.npy'), mmap_mode='r')
+        self._times = np.load(os.path.join(path, 'times.npy'), mmap_mode='r')
+        if os.path.exists(os.path.join(path, 'valid.npy')):
+            self._valid = np.load(os.path.join(path, 'valid.npy'))
+        self._invalidate()
+
     def _compress_data(self) -> np.ndarray:
 
-        return np.concatenate(
-            [df.loc[:, df.columns != 'time'].to_numpy() for _, df in sorted(self._stock_df.items())], axis=1).astype('float64')
+        return np.ascontiguousarray(np.concatenate(
+            [df.loc[:, df.columns != 'time'].to_numpy() for _, df in sorted(self._frames.items())], axis=1), dtype='float64')
+
+    def _set_data(self, index: pd.Series, data: np.ndarray, valid: np.ndarray = None) -> None:
+        self._L = len(data)
+        self._buffer = data
+        self._times = index.to_numpy(dtype='datetime64[ns]')
+        self._valid = valid
+        self._invalidate()
+        self._index_cache = index
+
+    def _append(self, times, rows: np.ndarray) -> None:
+        '''
+        Appends bars (laid out like ``_data``) to the end of the data in amortised O(1) time per bar.
+        '''
+        rows = np.asarray(rows, dtype='float64').reshape(-1, self._buffer.shape[1])
+        times = np.asarray(np.atleast_1d(times), dtype='datetime64[ns]')
+        n = len(rows)
+        if len(times) != n:
+            raise ValueError(f'Expected {n} timestamps, got {len(times)}')
+
+        if self._L + n > len(self._buffer):
+            capacity = max(2*(self._L + n), 64)
+            buffer = np.empty((capacity, self._buffer.shape[1]))
+            buffer[:self._L] = self._data
+            self._buffer = buffer
+            self._times = np.concatenate([self._times[:self._L], np.empty(capacity - self._L, dtype='datetime64[ns]')])
+        
+        # stocks without a close in a new bar are missing it
+        valid = np.isfinite(rows[:, 1::len(self._measurement)])
+        if self._valid is None and not valid.all():
+            self._valid = np.packbits(np.ones((len(self._stocks), self._L), dtype=bool), axis=1)
+        if self._valid is not None:
+            size = -(-(self._L + n)//8)
+            if size > self._valid.shape[1]:
+                packed = np.zeros((len(self._stocks), max(2*size, 8)), dtype='uint8')
+                packed[:, :self._valid.shape[1]] = self._valid
+                self._valid = packed
+            for k, row in enumerate(range(self._L, self._L + n)):
+                self._valid[valid[k], row >> 3] |= np.uint8(0x80 >> (row & 7))
+
+        self._buffer[self._L: self._L + n] = rows
+        self._times[self._L: self._L + n] = times
+        self._L += n
+        self._frames = {stock: None for stock in self._frames}
+        self._invalidate()
+
+    def _invalidate(self) -> None:
+        self._arrays = None
+        self._index_cache = None
+        self._stock_df_cache = None
+        self._prices_cache = None
+        self._fingerprint = None
+        self._stock_bars_cache = None
+
+    def _stock_bars(self, stock: str) -> np.ndarray:
+        '''
+        The bars a stock has data for, in order. Every stock's bars are kept end to end in one array, with the offset
+        of each stock's first bar.
+        '''
+        if self._stock_bars_cache is None:
+            valid = self.valid
+            stocks, bars = np.nonzero(valid.T)
+            offsets = np.concatenate([[0], np.cumsum(valid.sum(axis=0))])
+            self._stock_bars_cache = (bars, offsets)
+
+        bars, offsets = self._stock_bars_cache
+        s = self._stocks.index(stock)
+        return bars[offsets[s]: offsets[s + 1]]
+
+    def _rows(self, stock: str, bars: np.ndarray, numpy: bool = False):
+        '''
+        The data of a single stock at the given bars, as a structured array if ``numpy`` or a dataframe otherwise.
+        '''
+        if numpy:
+            return self.arrays[stock][bars]
+
+        s = self._stocks.index(stock)
+        n = len(self._measurement)
+        return pd.DataFrame(self._data[bars, s*n: (s + 1)*n], 
+                            index=pd.DatetimeIndex(self._times[bars], name='time'), 
+                            columns=self._measurement)
+
+    def _frame(self, stock: str, start: int = 0, end: int = None) -> pd.DataFrame:
+        '''
+        The data of a single stock as a dataframe, for rows ``start`` to ``end``.
+        '''
+        end = self._L if end is None else end
+        if start == 0 and end == self._L and self._frames.get(stock) is not None:
+            return self._frames[stock]
+
+        s = self._stocks.index(stock)
+        n = len(self._measurement)
+        return pd.DataFrame(self._data[start:end, s*n: (s + 1)*n], 
+                            index=pd.DatetimeIndex(self._times[start:end], name='time'), 
+                            columns=self._measurement)
+    
+    def _structured_view(self, s: int) -> np.ndarray:
+        n = len(self._measurement)
+        dtype = np.dtype({'names': self._measurement, 
+                          'formats': ['float64']*n, 
+                          'offsets': [self._data.itemsize*(s*n + j) for j in range(n)],
+                          'itemsize': self._data.itemsize*self._data.shape[1]})
+        return self._data.view(dtype)[:, 0]
     
     #---------------[Internal Methods]-----------------#
     def __len__(self):
         return self._L
     
 
+
+def _align(stocks: list, bars: dict) -> tuple:
+    '''
+    Places the ``(times, rows)`` of each stock on the union of their times, returning the times, the data (laid out 
+    like ``StockData._data``, NaN where a stock has no bar) and the packed validity bits of each stock.
+    '''
+    union = np.unique(np.concatenate([times for times, _ in bars.values()]))
+    n = next(iter(bars.values()))[1].shape[1]
+
+    data = np.full((len(union), n*len(stocks)), np.nan)
+    valid = np.zeros((len(stocks), len(union)), dtype=bool)
+    for s, stock in enumerate(stocks):
+        times, rows = bars[stock]
+        at = np.searchsorted(union, times)
+        if len(np.unique(at)) != len(at):
+            raise ValueError(f'{stock} has more than one bar at the same time')
+        data[at, s*n: (s + 1)*n] = rows
+        valid[s, at] = True
+    return union, data, np.packbits(valid, axis=1)
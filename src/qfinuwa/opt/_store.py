@@ -0,0 +1,304 @@
+import os
+import pickle
+import sqlite3
+import hashlib
+import inspect
+from collections import OrderedDict
+from functools import lru_cache
+import numpy as np
+from pandas import DataFrame, read_sql_query, read_parquet
+
+class ResultStore:
+
+    _TABLE = 'results'
+    # rows are buffered before being written as a parquet row group
+    _BATCH = 256
+
+    def __init__(self, path: str, spill_values: bool = False):
+        '''
+        Append-only table of per-fold summary metrics, written as a parameter sweep runs. Stored in SQLite, or in
+        Parquet (requires ``pyarrow``) if ``path`` ends with ``.parquet``. An existing SQLite store is appended to,
+        a Parquet file is rewritten.
+
+        ## Parameters
+        - ``path`` (``str``): The file to store the results in.
+        - ``spill_values`` (``bool``): If ``True``, the value over time of every fold is saved to a ``.npy`` file
+          in the folder ``<path>_values``, and its path is stored in the ``values`` column.
+        '''
+        self.path = path
+        self._parquet = path.endswith('.parquet')
+        self._values_dir = os.path.splitext(path)[0] + '_values' if spill_values else None
+        if self._values_dir:
+            os.makedirs(self._values_dir, exist_ok=True)
+
+        self._columns = []
+        self._keys = set()
+        self._buffer = []
+        self._writer = None
+        self._next_run = 0
+
+        if self._parquet:
+            try:
+                import pyarrow, pyarrow.parquet
+            except ImportError:
+                raise ImportError('Storing results as parquet requires pyarrow, install it with "pip install pyarrow"')
+            self._pyarrow = pyarrow
+        else:
+            self._connection = sqlite3.connect(path)
+            columns = self._connection.execute(f'PRAGMA table_info({self._TABLE})').fetchall()
+            if columns:
+                self._columns = [column[1] for column in columns]
+                if 'run' in self._columns:
+                    last = self._connection.execute(f'SELECT MAX(run) FROM {self._TABLE}').fetchone()[0]
+                    self._next_run = 0 if last is None else last + 1
+                if 'key' in self._columns:
+                    self._keys = {key for key, in self._connection.execute(f'SELECT DISTINCT key FROM {self._TABLE}')}
+
+    #---------------[Public Methods]-----------------#
+    def append(self, result, key: str = None) -> None:
+        '''
+        Writes the summary of every fold of a ``MultiRunResult``.
+
+        ## Parameters
+        - ``result`` (``MultiRunResult``): The result to write.
+        - ``key`` (``str``): Identifies the run, a result with a key that has already been written is skipped.
+
+        ## Returns
+        ``None``
+        '''
+        if key is not None:
+            if key in self._keys:
+                return
+            self._keys.add(key)
+
+        run = self._next_run
+        self._next_run += 1
+
+        rows = summarise(run, result)
+        if key is not None:
+            for row in rows:
+                row['key'] = key
+        if self._values_dir:
+            for row, fold in zip(rows, result):
+                row['values'] = os.path.join(self._values_dir, f'{run}_{row["fold"]}.npy')
+                np.save(row['values'], fold.value_over_time['value'].to_numpy())
+
+        self.append_rows(rows)
+
+    def append_rows(self, rows: list) -> None:
+        '''
+        Writes rows (dictionaries of column values) directly.
+        '''
+        if not rows:
+            return
+        if self._parquet:
+            self._buffer.extend(rows)
+            if len(self._buffer) >= self._BATCH:
+                self.flush()
+        else:
+            self._insert(rows)
+
+    def flush(self) -> None:
+        '''
+        Writes any buffered rows to disk.
+        '''
+        if not self._parquet or not self._buffer:
+            return
+        table = self._pyarrow.Table.from_pylist(self._buffer)
+        if self._writer is None:
+            self._writer = self._pyarrow.parquet.ParquetWriter(self.path, table.schema)
+        self._writer.write_table(table.cast(self._writer.schema))
+        self._buffer = []
+
+    def close(self) -> None:
+        '''
+        Flushes and closes the store, it can still be read with ``to_frame``.
+        '''
+        if self._parquet:
+            self.flush()
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        elif self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def to_frame(self) -> DataFrame:
+        '''
+        Reads the stored results.
+
+        ## Returns
+        ``DataFrame``: One row per fold of every run.
+        '''
+        if self._parquet:
+            self.flush()
+            if self._writer is not None:
+                raise RuntimeError('The parquet store must be closed before it is read')
+            return read_parquet(self.path)
+
+        with sqlite3.connect(self.path) as connection:
+            return read_sql_query(f'SELECT * FROM {self._TABLE}', connection)
+
+    #---------------[Private Methods]-----------------#
+    def _insert(self, rows):
+        if not self._columns:
+            self._columns = list(rows[0])
+            self._connection.execute(f'CREATE TABLE {self._TABLE} ({", ".join(map(_quote, self._columns))})')
+        for column in rows[0]:
+            # sweeps over different parameters can share a store
+            if column not in self._columns:
+                self._connection.execute(f'ALTER TABLE {self._TABLE} ADD COLUMN {_quote(column)}')
+                self._columns.append(column)
+
+        columns = ', '.join(map(_quote, rows[0]))
+        values = ', '.join('?' for _ in rows[0])
+        self._connection.executemany(f'INSERT INTO {self._TABLE} ({columns}) VALUES ({values})',
+                                     [tuple(row.values()) for row in rows])
+        self._connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+class Checkpoint:
+
+    _TABLE = 'checkpoints'
+
+    def __init__(self, path: str):
+        '''
+        Completed runs of a sweep, pickled into a SQLite table as they finish so an interrupted sweep can be
+        resumed. Runs are keyed by everything their result depends on (see ``Backtester._run_key``).
+
+        ## Parameters
+        - ``path`` (``str``): The file to store the checkpoints in.
+        '''
+        self.path = path
+        self._connection = sqlite3.connect(path)
+        self._connection.execute(f'CREATE TABLE IF NOT EXISTS {self._TABLE} (key TEXT PRIMARY KEY, result BLOB)')
+        self._connection.commit()
+
+    #---------------[Public Methods]-----------------#
+    def get(self, key: str):
+        '''
+        The stored result for ``key``, or ``None`` if it hasn't been run.
+        '''
+        row = self._connection.execute(f'SELECT result FROM {self._TABLE} WHERE key = ?', (key,)).fetchone()
+        return None if row is None else pickle.loads(row[0])
+
+    def put(self, key: str, result) -> None:
+        '''
+        Stores the result for ``key``, committing it straight away.
+        '''
+        self._connection.execute(f'INSERT OR REPLACE INTO {self._TABLE} VALUES (?, ?)', 
+                                 (key, sqlite3.Binary(pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL))))
+        self._connection.commit()
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def __len__(self):
+        return self._connection.execute(f'SELECT COUNT(*) FROM {self._TABLE}').fetchone()[0]
+
+    def __contains__(self, key: str):
+        return self._connection.execute(f'SELECT 1 FROM {self._TABLE} WHERE key = ?', (key,)).fetchone() is not None
+
+
+class ResultCache:
+
+    def __init__(self, maxsize: int, path: str = None):
+        '''
+        Least recently used cache of run results, optionally backed by a ``Checkpoint`` on disk which keeps every
+        result (and survives restarts).
+
+        ## Parameters
+        - ``maxsize`` (``int``): The number of results to keep in memory.
+        - ``path`` (``str``): A SQLite file to also store the results in.
+        '''
+        if int(maxsize) != maxsize or maxsize < 1:
+            raise ValueError(f'maxsize must be a positive integer, got {maxsize}')
+        self.maxsize = maxsize
+        self._results = OrderedDict()
+        self._disk = Checkpoint(path) if path is not None else None
+
+    #---------------[Public Methods]-----------------#
+    def get(self, key: str):
+        '''
+        The cached result for ``key``, or ``None`` if there isn't one.
+        '''
+        if key in self._results:
+            self._results.move_to_end(key)
+            return self._results[key]
+
+        result = self._disk.get(key) if self._disk is not None else None
+        if result is not None:
+            self._remember(key, result)
+        return result
+
+    def put(self, key: str, result) -> None:
+        '''
+        Caches the result for ``key``.
+        '''
+        self._remember(key, result)
+        if self._disk is not None:
+            self._disk.put(key, result)
+
+    def clear(self) -> None:
+        '''
+        Empties the in-memory cache.
+        '''
+        self._results.clear()
+
+    #---------------[Private Methods]-----------------#
+    def _remember(self, key, result):
+        self._results[key] = result
+        self._results.move_to_end(key)
+        while len(self._results) > self.maxsize:
+            self._results.popitem(last=False)
+
+    def __len__(self):
+        return len(self._results)
+
+
+@lru_cache(maxsize=None)
+def source_hash(cls) -> str:
+    '''
+    A hash of a class's source code, or of its methods' bytecode when the source isn't available.
+    '''
+    try:
+        source = inspect.getsource(cls).encode()
+    except (OSError, TypeError):
+        source = repr([(name, value.__code__.co_code, value.__code__.co_consts) for klass in cls.__mro__ 
+                       for name, value in vars(klass).items() if hasattr(value, '__code__')]).encode()
+    return hashlib.sha256(source).hexdigest()
+
+
+def summarise(run: int, result) -> list:
+    '''
+    Flattens a ``MultiRunResult`` into one dictionary of parameters and metrics per fold.
+    '''
+    params = {f'strategy.{k}': _scalar(v) for k, v in result.parameters['strategy'].items()}
+    params.update({f'{funcn}.{k}': _scalar(v) for funcn, p in result.parameters['indicator'].items() for k, v in p.items()})
+
+    return [{'run': run, 'fold': fold, 'start': int(res._start), 'end': int(res._end), **params,
+             'roi': float(res.roi),
+             'gross_pnl': float(sum(res.gross_pnl.values())),
+             'fees_paid': float(sum(res.fees_paid.values())),
+             'n_buys': int(sum(res.n_buys.values())),
+             'n_sells': int(sum(res.n_sells.values())),
+             **{name: float(value) for name, value in res.metrics.items()},
+            } for fold, res in enumerate(result)]
+
+
+def _quote(column):
+    return '"' + column.replace('"', '""') + '"'
+
+
+def _scalar(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
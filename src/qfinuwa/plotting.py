@@ -1,19 +1,21 @@
 import bokeh.plotting
 import bokeh.palettes
 import bokeh.models
-import os 
-import pandas as pd
 import numpy as np
 from .opt._result import SingleRunResult
+from .backtester import Backtester
+from .indicators import Indicators
 
 class Plotting:
 
     #---------------[Class Methods]-----------------#
     
     @classmethod
-    def plot_result(cls, result: SingleRunResult, show_portfolio: bool=True, stocks: list=[], show_transactions: bool = True, normalise_stocks: bool =True, filename: str = None) -> None:
+    def plot_result(cls, result: SingleRunResult, show_portfolio: bool=True, stocks: list=[], show_transactions: bool = True, normalise_stocks: bool =True, filename: str = None, 
+                    max_points: int = 2000) -> None:
         '''
-        Plots the results of a single run.
+        Plots the results of a single run. Long runs are downsampled to ``max_points`` points per line, keeping the 
+        minimum and maximum of every bucket so spikes are still visible, and drawn with WebGL.
 
         ## Parameters
         - ``result`` (``SingleRunResult``): The result of a single run.
@@ -22,94 +24,137 @@ class Plotting:
         - ``show_transactions`` (``bool``): If ``True`` transaction will be plotted on the respective instrumenets.
         - ``normalise_stocks`` (``bool``): If ``True``, stocks will be normalised to the portfolio value at the start of the run.
         - ``filename`` (``str``): The filename to save the plot to. If ``None``, the plot will be displayed in a browser.
+        - ``max_points`` (``int``): The maximum number of points to draw per line, ``None`` draws every bar.
 
         ## Returns
         ``None``
         '''
-        
-        p = bokeh.plotting.figure(x_axis_type='linear', title=f"Portfolio Value over Time - {result._datetimeindex.iloc[0]} --> {result._datetimeindex.iloc[-1]}", width=1000, height=400)
+        times = result._datetimeindex.to_numpy()
+
+        p = bokeh.plotting.figure(x_axis_type='datetime', title=f"Portfolio Value over Time - {result._datetimeindex.iloc[0]} --> {result._datetimeindex.iloc[-1]}", 
+                                  width=1000, height=400, output_backend='webgl')
         p.grid.grid_line_alpha = 0.3
         p.xaxis.axis_label = 'Date'
         p.yaxis.axis_label = 'Portfolio Value'
-        p.xaxis.major_label_overrides = {
-            i: date.strftime('%Y-%m-%d %H:%S') for i, date in enumerate(result._datetimeindex)
-        }
         
         # -----[plotting portfolio]-----
-        value = result.value_over_time["value"]
-        r = np.array([_ for _ in range(len(value))])
         if show_portfolio:
-            p.line(r, value, line_width=2, legend_label='portfolio', color='black')
+            # the last value is after closing every position at the final bar
+            value = result.value_over_time["value"].to_numpy()
+            value_times = np.append(times, times[-1:])[:len(value)]
+            p.line(*cls._downsample(value_times, value, max_points), line_width=2, legend_label='portfolio', color='black')
 
         # -----[plotting buys and sells]-----
-        stock_prices = {stock: result._stockdata[stock]['close'][result._start:result._end] for stock in stocks}
+        stock_prices = {stock: result._stockdata._frame(stock, result._start, result._end)['close'].to_numpy() for stock in stocks}
         for stock, prices in stock_prices.items():
-            p.line(r, prices, line_width=2, color='blue', legend_label=stock)
+            p.line(*cls._downsample(times, prices, max_points), line_width=2, color='blue', legend_label=stock)
 
-        lbuy = {stock: [i for i, s, q in result.buys if s == stock] for stock in stocks}
-        lsell = {stock: [i for i, s, q in result.sells if s == stock] for stock in stocks}
-        # sbuy = np.array([i for i, *_ in result._shorts['enter']])
-        # sclose = np.array([i for i, *_ in result._shorts['exit']])
         SIZE = 4
         if show_transactions:
-            
-            for stock, prices in stock_prices.items():
-                # print(stock, prices[0])
-                p.circle(lbuy[stock], np.array([prices.iloc[i] for i in lbuy[stock]]), color='green', size=SIZE, legend_label='buy')
-                p.circle(lsell[stock], np.array([prices.iloc[i] for i in lsell[stock]]), color='red', size=SIZE, legend_label='sell')
+            trades = result.trades
+            for side, color, label in ((trades['quantity'] > 0, 'green', 'buy'), (trades['quantity'] < 0, 'red', 'sell')):
+                for stock in stock_prices:
+                    # markers are at the price each trade was filled at
+                    ours = trades[side & (trades['stock'] == result._stocks.index(stock))]
+                    if len(ours):
+                        p.scatter(times[ours['i']], ours['price'], marker='circle', color=color, size=SIZE, legend_label=label)
 
-        bokeh.plotting.show(p)
         if filename:
             bokeh.plotting.output_file(filename)
+        bokeh.plotting.show(p)
 
     @classmethod
-    def plot_indicators(cls, indicators, data_folder: str, stocks: list = [], filename: bool=None) -> None:
+    def plot_indicators(cls, indicators, data_folder: str = None, stocks: list = [], filename: bool=None, 
+                        params: dict = None, max_points: int = 2000) -> None:
         '''
-        Plot custom indicators over time.
+        Plot custom indicators over time. Indicators are taken from the cache of an existing ``Backtester`` or 
+        ``Indicators`` object (and only computed if that parameter set hasn't been used yet), and each line is 
+        downsampled to ``max_points`` points.
 
         ## Parameters
-        - ``indicators`` (``class``): The indicator class.
-        - ``data_folder`` (``str``): The folder containing the stock data.
-        - ``stocks`` (``list``): A list of stocks to plot.
+        - ``indicators`` (``Backtester``, ``Indicators`` or ``class``): The backtester or indicators to plot, or an 
+          indicator class to compute on ``data_folder``.
+        - ``data_folder`` (``str``): The folder containing the stock data, only needed for an indicator class.
+        - ``stocks`` (``list``): A list of stocks to plot, defaults to every stock.
         - ``filename`` (``str``): The filename to save the plot to. If ``None``, the plot will be displayed in a browser.
+        - ``params`` (``dict``): The indicator parameters to plot, defaults to the current parameters.
+        - ``max_points`` (``int``): The maximum number of points to draw per line, ``None`` draws every bar.
 
         ## Returns
         ``None``
         '''
-        p = bokeh.plotting.figure(x_axis_type="linear", title="Portfolio Value over Time", width=1000, height=400)
+        if isinstance(indicators, Backtester):
+            indicators = indicators.indicators
+        elif isinstance(indicators, type) and issubclass(indicators, Indicators):
+            if data_folder is None:
+                raise ValueError('data_folder must be given to plot an indicator class')
+            indicators = indicators(data_folder)
+        elif not isinstance(indicators, Indicators):
+            raise TypeError(f'Expected a Backtester, Indicators or Indicators class, got {type(indicators)} instead.')
+
+        stocks = list(stocks) or indicators._stocks
+        if set(stocks) - set(indicators._stocks):
+            raise ValueError(f'Stock(s) not found: {set(stocks) - set(indicators._stocks)}')
+
+        p = bokeh.plotting.figure(x_axis_type="datetime", title="Indicator Values over Time", width=1000, height=400,
+                                  output_backend='webgl')
         p.grid.grid_line_alpha = 0.3
         p.xaxis.axis_label = 'Time'
         p.yaxis.axis_label = 'Indicator Value'
-        
-
-        ind = indicators(stockdata=data_folder)
-        in_folder = set([os.listdir(data_folder)[0].split('.')[0]])
-        stocks = list(in_folder & set(stocks) if stocks else in_folder)
-        # print(os.listdir(data_folder)[0].split('.')[0])
 
-        df = pd.read_csv(os.path.join(data_folder, f'{stocks[0]}.csv'))
-        p.xaxis.major_label_overrides = {
-            i: date.strftime('%Y-%m-%d %H:%S') for i, date in enumerate(pd.to_datetime(df['time']))
-        }
-        r = np.array([_ for _ in range(len(df))])
-
-        it = [(stock, *_) for _ in zip(cls._colours(10), *ind.indicator_values().items()) for stock in stocks]
-
-        # "it" is of the form [(stock, colour, name, value), ...]
-        data = {'ys': np.array([value[stock] for stock, *_, value in it]),
-                'xs': np.array([r for _ in it]),
-                'names': np.array([f'{name} ({stock})' for stock, _, name, _ in it]),
-                'cols': np.array([col for _, col, *_ in it]),
+        times = indicators.index.to_numpy()
+
+        # lines are of the form (name, value)
+        lines = []
+        for name, value in indicators.values(params).items():
+            if isinstance(value, dict):
+                lines.extend((f'{name} ({stock})', value[stock]) for stock in stocks)
+            else:
+                lines.append((name, value))
+
+        xs, ys = zip(*(cls._downsample(times, value, max_points) for _, value in lines))
+        colours = cls._colours(10)
+        data = {'xs': list(xs),
+                'ys': list(ys),
+                'names': [name for name, _ in lines],
+                'cols': [colours[i % len(colours)] for i in range(len(lines))],
         }
         source = bokeh.models.ColumnDataSource(data)
 
-        p.multi_line(xs='xs', ys='ys', legend_label='names', cols='cols', line_width=2, source=source)
+        p.multi_line(xs='xs', ys='ys', legend_field='names', line_color='cols', line_width=2, source=source)
 
-        bokeh.plotting.show(p, notebook_handle=True)
         if filename:
             bokeh.plotting.output_file(filename)
+        bokeh.plotting.show(p)
     
     #---------------[Private Class Methods]-----------------#
     @classmethod
     def _colours(cls, n: int) -> list:
-        return bokeh.palettes.Category10[n]
\ No newline at end of file
+        return bokeh.palettes.Category10[n]
+
+    @classmethod
+    def _downsample(cls, x: np.ndarray, y: np.ndarray, max_points: int) -> tuple:
+        '''
+        Splits a line into ``max_points//2`` buckets and keeps the points with the smallest and largest 
+        value in each, so the shape of the line survives at the resolution it is drawn at.
+        '''
+        x, y = np.asarray(x), np.asarray(y, dtype='float64')
+        n = len(y)
+        if max_points is None or n <= max_points:
+            return x, y
+
+        buckets = max(max_points//2, 1)
+        size = -(-n//buckets)
+        padded = np.full(buckets*size, np.nan)
+        padded[:n] = y
+        padded = padded.reshape(buckets, size)
+
+        # NaNs (missing values or padding) are never chosen unless the whole bucket is NaN
+        nans = np.isnan(padded)
+        offsets = np.arange(buckets)*size
+        lows = np.where(nans, np.inf, padded).argmin(axis=1) + offsets
+        highs = np.where(nans, -np.inf, padded).argmax(axis=1) + offsets
+
+        keep = np.unique(np.concatenate([[0, n - 1], lows, highs]))
+        keep = keep[keep < n]
+        return x[keep], y[keep]
\ No newline at end of file
@@ -0,0 +1,421 @@
+'''
+Vectorised rolling-window primitives for writing fast indicators.
+
+Every function takes a 1-D array (or anything ``np.asarray`` accepts, including the fields of the
+structured views passed to ``numpy=True`` indicators) and returns a ``float64`` array of the same
+length. Like ``pandas.Series.rolling(window)``, the first ``window - 1`` values are ``NaN`` and any
+window containing a ``NaN`` is ``NaN``.
+
+Each function also has an online counterpart (``Total``, ``Mean``, ``Std``, ``Minimum``, ``Maximum`` and
+``EMA``) for incrementally updated indicators. Its ``update`` method takes the newly arrived values and
+returns the rolling values for them, in O(1) time per value, giving the same output as the function
+applied to the whole series.
+'''
+from collections import deque
+import operator
+import numpy as np
+
+
+#---------------[Public Functions]-----------------#
+def total(x, window: int) -> np.ndarray:
+    '''
+    Rolling sum over the last ``window`` values.
+
+    ## Parameters
+    - ``x`` (``np.ndarray``): The input series.
+    - ``window`` (``int``): The window length.
+
+    ## Returns
+    ``np.ndarray``
+    '''
+    x, nans = _prepare(x, window)
+    return _windowed(np.cumsum(x), window, nans)
+
+
+def mean(x, window: int) -> np.ndarray:
+    '''
+    Rolling mean over the last ``window`` values.
+
+    ## Parameters
+    - ``x`` (``np.ndarray``): The input series.
+    - ``window`` (``int``): The window length.
+
+    ## Returns
+    ``np.ndarray``
+    '''
+    x, nans = _prepare(x, window)
+    shift = _shift(x)
+    return _windowed(np.cumsum(x - shift), window, nans)/window + shift
+
+
+def std(x, window: int, ddof: int = 1) -> np.ndarray:
+    '''
+    Rolling standard deviation over the last ``window`` values (sample standard deviation by
+    default, the same as ``pandas``).
+
+    Each window is summed relative to the mean of the blocks of ``window`` values it overlaps, so the
+    rounding error depends on the spread of nearby values rather than their size, and windows whose
+    values are all equal are exactly 0.
+
+    ## Parameters
+    - ``x`` (``np.ndarray``): The input series.
+    - ``window`` (``int``): The window length.
+    - ``ddof`` (``int``): Delta degrees of freedom.
+
+    ## Returns
+    ``np.ndarray``
+    '''
+    if window - ddof <= 0:
+        raise ValueError(f'window must be larger than ddof, got window={window} and ddof={ddof}')
+
+    x, nans = _prepare(x, window)
+    n = len(x)
+    var = np.full(n, np.nan)
+    if n < window:
+        return var
+    if nans is not None and not nans.all():
+        # missing values are filled in with the last value (or the first for leading ones) rather than 0,
+        # so they don't widen the spread of their block
+        filled = np.maximum.accumulate(np.where(nans, 0, np.arange(n)))
+        x = x[filled]
+        x[:np.argmin(nans)] = x[np.argmin(nans)]
+
+    # the series is split into blocks of window values (and an empty block past the end), with the
+    # sums of the values and their squares accumulated within each block around the block's mean
+    blocks = np.zeros((-(-n//window) + 1, window))
+    blocks.flat[:n] = x
+    counts = np.minimum(np.maximum(n - window*np.arange(len(blocks)), 0), window)
+    centres = blocks.sum(axis=1)/np.maximum(counts, 1)
+    blocks -= centres[:, None]
+    blocks.flat[n:] = 0
+    s1 = np.zeros((len(blocks), window + 1))
+    s2 = np.zeros((len(blocks), window + 1))
+    np.cumsum(blocks, axis=1, out=s1[:, 1:])
+    np.cumsum(blocks*blocks, axis=1, out=s2[:, 1:])
+
+    # every window is the end of one block from offset a and the start of the next up to a, whose
+    # sums are moved onto the first block's mean
+    start = np.arange(n - window + 1)
+    j = start//window
+    a = start - j*window
+    row = j*(window + 1)
+    head, end, tail = row + a, row + window, row + window + 1 + a
+    shift = np.diff(centres)[j]
+    s1, s2 = s1.ravel(), s2.ravel()
+    tail1 = s1[tail]
+    sum1 = s1[end] - s1[head] + tail1 + a*shift
+    sum2 = s2[end] - s2[head] + s2[tail] + (2*tail1 + a*shift)*shift
+    var[window - 1:] = sum2 - sum1*sum1/window
+
+    # windows without a change in value
+    changes = np.concatenate([[0], np.cumsum(x[1:] != x[:-1])])
+    var[window - 1:][changes[window - 1:] == changes[:n - window + 1]] = 0
+
+    if nans is not None:
+        var[_windowed(np.cumsum(nans), window, None) > 0] = np.nan
+    return np.sqrt(np.maximum(var, 0)/(window - ddof))
+
+
+def minimum(x, window: int) -> np.ndarray:
+    '''
+    Rolling minimum over the last ``window`` values.
+
+    ## Parameters
+    - ``x`` (``np.ndarray``): The input series.
+    - ``window`` (``int``): The window length.
+
+    ## Returns
+    ``np.ndarray``
+    '''
+    return _extremum(x, window, np.minimum)
+
+
+def maximum(x, window: int) -> np.ndarray:
+    '''
+    Rolling maximum over the last ``window`` values.
+
+    ## Parameters
+    - ``x`` (``np.ndarray``): The input series.
+    - ``window`` (``int``): The window length.
+
+    ## Returns
+    ``np.ndarray``
+    '''
+    return _extremum(x, window, np.maximum)
+
+
+def ema(x, span: float = None, alpha: float = None) -> np.ndarray:
+    '''
+    Exponential moving average, equivalent to ``pandas.Series.ewm(span=span, adjust=False).mean()``
+    for series without missing values.
+
+    ## Parameters
+    - ``x`` (``np.ndarray``): The input series.
+    - ``span`` (``float``): The span of the average, ``alpha = 2/(span + 1)``.
+    - ``alpha`` (``float``): The smoothing factor, used instead of ``span`` if given.
+
+    ## Returns
+    ``np.ndarray``
+    '''
+    if alpha is None:
+        if span is None:
+            raise ValueError('Either span or alpha must be specified')
+        alpha = 2/(span + 1)
+
+    if not 0 < alpha <= 1:
+        raise ValueError(f'alpha must be in (0, 1], got {alpha}')
+
+    x = np.asarray(x, dtype='float64')
+    if len(x) == 0 or alpha == 1:
+        return x.copy()
+
+    # y[t] = d*y[t-1] + alpha*x[t] solved as a parallel prefix scan: after the pass with step k
+    # every y[t] holds the weighted sum over the last 2k inputs. Passes stop once the weight
+    # left outside the window is below machine precision.
+    d = 1 - alpha
+    y = alpha*x
+    y[0] = x[0]
+
+    k = 1
+    dk = d
+    while k < len(y) and dk > _EMA_TOLERANCE:
+        y[k:] = y[k:] + dk*y[:-k]
+        k *= 2
+        dk *= dk
+
+    return y
+
+#---------------[Online Classes]-----------------#
+class _Online:
+
+    # inputs longer than this are processed with the vectorised function instead
+    _BATCH = 64
+
+    def __init__(self, window: int):
+        if int(window) != window or window < 1:
+            raise ValueError(f'window must be a positive integer, got {window}')
+        self.window = window
+        self._tail = deque(maxlen=window)
+        self._reset([])
+
+    def update(self, x) -> np.ndarray:
+        x = np.asarray(x, dtype='float64').ravel()
+        if len(x) <= max(self._BATCH, self.window):
+            return np.array([self._update(v) for v in x], dtype='float64')
+
+        history = np.concatenate([np.array(self._tail, dtype='float64'), x])
+        out = self._batch(history)[-len(x):]
+        self._tail.extend(history[-self.window:])
+        self._reset(self._tail)
+        return out
+
+    def _update(self, v):
+        leaving = self._tail[0] if len(self._tail) == self.window else None
+        self._tail.append(v)
+        return self._step(v, leaving)
+
+
+class _Moments(_Online):
+
+    def _reset(self, values):
+        values = np.array(values, dtype='float64')
+        finite = values[~np.isnan(values)]
+        # sums are kept relative to a recent value so they stay well conditioned
+        self._shift = finite[0] if len(finite) else 0.
+        self._s1 = np.sum(finite - self._shift)
+        self._s2 = np.sum((finite - self._shift)**2)
+        self._nans = len(values) - len(finite)
+        self._steps = 0
+
+    def _step(self, v, leaving):
+        for x, sign in ((leaving, -1), (v, 1)):
+            if x is None:
+                continue
+            if np.isnan(x):
+                self._nans += sign
+            else:
+                self._s1 += sign*(x - self._shift)
+                self._s2 += sign*(x - self._shift)**2
+
+        # recomputing the sums every window steps stops rounding errors accumulating (O(1) amortised)
+        self._steps += 1
+        if self._steps >= self.window:
+            self._reset(self._tail)
+
+        if len(self._tail) < self.window or self._nans:
+            return np.nan
+        return self._value()
+
+
+class Total(_Moments):
+    '''
+    Online version of ``total``.
+    '''
+    def _value(self):
+        return self._s1 + self.window*self._shift
+
+    def _batch(self, x):
+        return total(x, self.window)
+
+
+class Mean(_Moments):
+    '''
+    Online version of ``mean``.
+    '''
+    def _value(self):
+        return self._s1/self.window + self._shift
+
+    def _batch(self, x):
+        return mean(x, self.window)
+
+
+class Std(_Moments):
+    '''
+    Online version of ``std``.
+    '''
+    def __init__(self, window: int, ddof: int = 1):
+        if window - ddof <= 0:
+            raise ValueError(f'window must be larger than ddof, got window={window} and ddof={ddof}')
+        self.ddof = ddof
+        super().__init__(window)
+
+    def _value(self):
+        return np.sqrt(max((self._s2 - self._s1**2/self.window)/(self.window - self.ddof), 0))
+
+    def _batch(self, x):
+        return std(x, self.window, self.ddof)
+
+
+class _Extremum(_Online):
+
+    def _reset(self, values):
+        # monotonic deque of (position, value) pairs, the front being the current extremum
+        self._n = 0
+        self._last_nan = -self.window
+        self._deque = deque()
+        for v in values:
+            self._step(v, None)
+
+    def _step(self, v, leaving):
+        i = self._n
+        self._n += 1
+        
+        if np.isnan(v):
+            self._last_nan = i
+        else:
+            while self._deque and not self._compare(self._deque[-1][1], v):
+                self._deque.pop()
+            self._deque.append((i, v))
+
+        while self._deque and self._deque[0][0] <= i - self.window:
+            self._deque.popleft()
+
+        if self._n < self.window or self._last_nan > i - self.window:
+            return np.nan
+        return self._deque[0][1]
+
+
+class Minimum(_Extremum):
+    '''
+    Online version of ``minimum``.
+    '''
+    _compare = staticmethod(operator.lt)
+
+    def _batch(self, x):
+        return minimum(x, self.window)
+
+
+class Maximum(_Extremum):
+    '''
+    Online version of ``maximum``.
+    '''
+    _compare = staticmethod(operator.gt)
+
+    def _batch(self, x):
+        return maximum(x, self.window)
+
+
+class EMA:
+    '''
+    Online version of ``ema``.
+    '''
+    def __init__(self, span: float = None, alpha: float = None):
+        if alpha is None:
+            if span is None:
+                raise ValueError('Either span or alpha must be specified')
+            alpha = 2/(span + 1)
+        self.alpha = alpha
+        self._y = None
+
+    def update(self, x) -> np.ndarray:
+        x = np.asarray(x, dtype='float64').ravel()
+        if len(x) == 0:
+            return x.copy()
+
+        if self._y is None:
+            out = ema(x, alpha=self.alpha)
+        elif len(x) <= _Online._BATCH:
+            out = np.empty(len(x))
+            y = self._y
+            for i, v in enumerate(x):
+                y = out[i] = y + self.alpha*(v - y)
+        else:
+            # seeding the series with the last value continues the recursion from it
+            out = ema(np.concatenate([[self._y], x]), alpha=self.alpha)[1:]
+
+        self._y = out[-1]
+        return out
+
+#---------------[Private Functions]-----------------#
+_EMA_TOLERANCE = np.finfo('float64').eps
+
+def _prepare(x, window):
+    if int(window) != window or window < 1:
+        raise ValueError(f'window must be a positive integer, got {window}')
+
+    x = np.array(x, dtype='float64')
+    nans = np.isnan(x)
+    if nans.any():
+        x[nans] = 0
+    else:
+        nans = None
+    return x, nans
+
+
+def _shift(x):
+    # centering the data before accumulating keeps the cumulative sums well conditioned
+    return x[0] if len(x) else 0.
+
+
+def _windowed(cumsum, window, nans):
+    out = np.full(len(cumsum), np.nan)
+    if len(cumsum) < window:
+        return out
+
+    out[window - 1] = cumsum[window - 1]
+    out[window:] = cumsum[window:] - cumsum[:-window]
+
+    if nans is not None:
+        out[_windowed(np.cumsum(nans), window, None) > 0] = np.nan
+    return out
+
+
+def _extremum(x, window, ufunc):
+    x, nans = _prepare(x, window)
+    if nans is not None:
+        x[nans] = np.nan
+
+    n = len(x)
+    out = np.full(n, np.nan)
+    if n < window:
+        return out
+
+    # van Herk/Gil-Werman: every window is covered by the suffix of one block and the
+    # prefix of the next, giving O(n) work independent of the window length
+    pad = -n % window
+    blocks = np.concatenate([x, np.full(pad, x[-1])]).reshape(-1, window)
+    prefix = ufunc.accumulate(blocks, axis=1).ravel()
+    suffix = ufunc.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+
+    out[window - 1:] = ufunc(suffix[:n - window + 1], prefix[window - 1:n])
+    return out
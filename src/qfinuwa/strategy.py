@@ -1,6 +1,7 @@
 from .opt._portfolio import Portfolio
 from inspect import signature, Parameter
 from functools import wraps
+import numpy as np
 
 class Strategy:
 
@@ -35,6 +36,9 @@ class Strategy:
 
         return
     
+    # whether on_data is given (bars, stocks) arrays instead of dictionaries of stocks, see MatrixStrategy
+    _matrix = False
+
     #---------------[Class Methods]-----------------#
     @classmethod
     def defaults(cls):
@@ -54,3 +58,109 @@ class Strategy:
 
     def on_finish(self) -> None:
         ...
+
+
+class MatrixStrategy(Strategy):
+
+    _matrix = True
+
+    def __init__(self):
+        '''
+        # Matrix Strategy Base Class
+        A strategy for wide universes that works on whole cross sections at once instead of looping over stocks. 
+        ``on_data`` is given ``(bars, stocks)`` arrays rather than dictionaries of stocks:
+        - ``prices[measurement]``: a view of the prices up to and including the current bar.
+        - ``indicators[name]``: a ``(bars, stocks)`` array for multi indicators, and a ``(bars,)`` array for 
+          single indicators.
+
+        Columns are in the order of ``portfolio.stocks`` (``Backtester.stocks``), and ``portfolio.order_many`` 
+        places an order for every stock in one call.
+
+        ## Example
+        ```python
+        class Momentum(MatrixStrategy):
+
+            def __init__(self, lookback=60, n=10):
+                self.lookback = lookback
+                self.n = n
+
+            def on_data(self, prices, indicators, portfolio):
+                close = prices['close']
+                if len(close) <= self.lookback:
+                    return
+                momentum = close[-1]/close[-self.lookback - 1]
+                target = np.zeros(len(portfolio.stocks))
+                target[np.argsort(momentum)[-self.n:]] = 1
+                portfolio.order_many(target - portfolio.positions)
+        ```
+        '''
+        return
+
+
+class JitStrategy(Strategy):
+
+    def __init__(self):
+        '''
+        # Compiled Strategy Base Class
+        A strategy whose logic is written as a ``kernel`` on plain arrays instead of ``on_data``. It runs like any 
+        other strategy, but with ``Backtester.run(..., backend='jit')`` the kernel is compiled with Numba together 
+        with the portfolio, removing the per-bar interpreter overhead. Both backends produce the same trades and 
+        value history (see ``Backtester.compare_backends``).
+
+        The kernel is a ``staticmethod`` that is called on every bar with:
+        - ``i`` (``int``): the index of the current bar (only data up to and including ``i`` may be used).
+        - ``prices`` (``np.ndarray``): prices of shape ``(5, bars, stocks)``, in the order ``open``, ``close``, 
+          ``high``, ``low``, ``volume``.
+        - ``indicators`` (``np.ndarray``): indicators of shape ``(n_indicators, bars, stocks)`` in the order of 
+          ``Indicators.names``. Single indicators are repeated for every stock.
+        - ``delta`` (``np.ndarray``): the current position in each stock.
+        - ``orders`` (``np.ndarray``): zeros, to be filled with the quantity to order for each stock.
+        - ``params`` (``np.ndarray``): the (numeric) strategy parameters, in the order they are defined in ``__init__``.
+
+        Stocks are in the order of ``Backtester.stocks``. The kernel can only use what Numba supports.
+
+        ## Example
+        ```python
+        class BasicBollinger(JitStrategy):
+    
+            def __init__(self, quantity=1):
+                return
+
+            @staticmethod
+            def kernel(i, prices, indicators, delta, orders, params):
+                quantity = params[0]
+                for s in range(prices.shape[2]):
+                    # indicators are ['lower_bollinger', 'upper_bollinger']
+                    if prices[1, i, s] < indicators[0, i, s]:
+                        orders[s] = quantity
+                    elif prices[1, i, s] > indicators[1, i, s]:
+                        orders[s] = -quantity
+        ```
+        '''
+        return
+
+    #---------------[Class Methods]-----------------#
+    @classmethod
+    def _params_array(cls, params: dict) -> np.ndarray:
+        try:
+            return np.array([float(params[k]) for k in cls.defaults()], dtype='float64')
+        except (TypeError, ValueError):
+            raise TypeError(f'JitStrategy parameters must be numeric, got {params}')
+
+    #---------------[Public Methods]-----------------#
+    @staticmethod
+    def kernel(i: int, prices: np.ndarray, indicators: np.ndarray, delta: np.ndarray, 
+               orders: np.ndarray, params: np.ndarray) -> None:
+        ...
+
+    def on_data(self, prices: dict, indicators: dict, portfolio: Portfolio) -> None:
+        # the interpreted path calls the kernel on the full arrays given by the backtester
+        prices, indicators, params, start = self._arrays
+        orders = np.zeros(len(portfolio.stocks))
+
+        self.kernel(start + portfolio._i, prices, indicators, portfolio.positions, orders, params)
+        portfolio.order_many(orders)
+
+    #---------------[Private Methods]-----------------#
+    def _bind(self, prices: np.ndarray, indicators: np.ndarray, params: np.ndarray, start: int) -> None:
+        self._arrays = (prices, indicators, params, start)
@@ -0,0 +1,259 @@
+from .opt._portfolio import Portfolio
+from .opt._stockdata import StockData
+from .opt._result import SingleRunResult
+from .strategy import Strategy
+from .indicators import Indicators
+from typing import Union
+from collections import defaultdict
+from functools import reduce
+import asyncio
+import os
+import time
+import numpy as np
+import pandas as pd
+
+from .opt._lazy import tqdm
+
+class StreamingBacktester:
+
+    def __init__(self, strategy_class: Strategy, indicator_class: Indicators,
+            stocks: list, strategy_params: dict = None, indicator_params: dict = None,
+            history: Union[str, StockData] = None,
+            delta_limits: Union[int, dict] = 10000, fee: float = 0.0):
+        '''
+        # Streaming Backtester
+        Runs a strategy on bars that arrive one at a time (from a generator, an async source or a replay of
+        local files) rather than on a complete dataset. Each bar is appended to the data, the indicators
+        are extended to cover it and the strategy's ``on_data`` is called with the same ``prices``,
+        ``indicators`` and ``portfolio`` arguments as in ``Backtester.run``, so backtested strategies can be
+        reused as they are.
+
+        Indicators that provide an online form (see ``Indicators``) are updated in time proportional to the
+        new bar, and those that declare a lookback are recomputed over the lookback before it. Any others are 
+        recomputed over the whole history on every bar, with a warning naming them.
+
+        ## Parameters
+        - ``strategy_class`` (``Strategy``): The strategy to run.
+        - ``indicator_class`` (``Indicators``): The indicators to use in the strategy.
+        - ``stocks`` (``list``): A list of stock to run the strategy on.
+        - ``strategy_params`` (``dict``): The parameters of the strategy.
+        - ``indicator_params`` (``dict``): The parameters of the indicators.
+        - ``history`` (``str`` or ``StockData``): Data (or a data folder) preceding the stream, used to warm up the indicators.
+        - ``delta_limits`` (``int`` or ``dict``): The general delta limit, or a dictionary of delta limits per instrument.
+        - ``fee`` (``float``): The fee to pay on each transaction.
+
+        ## Example
+        ```python
+        from qfinuwa import StreamingBacktester
+
+        stream = StreamingBacktester(CustomStrategy, CustomIndicators, ['AAPL', 'MSFT'], history=r'\\history')
+        result = stream.run(StreamingBacktester.replay(r'\\today', speed=60))
+        ```
+        '''
+        if not issubclass(strategy_class, Strategy):
+            raise ValueError('Strategy must be a subclass of Strategy')
+
+        if not issubclass(indicator_class, Indicators):
+            raise ValueError('Indicators must be a subclass of Indicators')
+
+        stocks = sorted(stocks)
+        if history is None:
+            self._data = StockData._from_arrays(stocks, [], np.empty((0, 5*len(stocks))))
+        elif isinstance(history, str):
+            self._data = StockData(history, stocks=stocks)
+        elif isinstance(history, StockData):
+            self._data = history
+        else:
+            raise TypeError(f"Expected history to be of type str or StockData, got {type(history)} instead.")
+
+        if self._data.stocks != stocks:
+            raise ValueError(f'history contains {self._data.stocks}, expected {stocks}')
+
+        if isinstance(delta_limits, int):
+            delta_limits = {stock: delta_limits for stock in stocks}
+        elif set(delta_limits.keys()) ^ set(stocks):
+            raise ValueError(f'delta_limit either contains unknown stocks or doesn\'t include all stocks')
+
+        self._fee = fee
+        self._start = len(self._data)
+
+        self._indicators = indicator_class(data=self._data, n_threads=1)
+        if indicator_params:
+            self._indicators.update_params(indicator_params)
+
+        # only the parameters in use need to be kept up to date
+        active = {self._indicators._hashable(funcn, params) for funcn, params in self._indicators.params.items()}
+        self._indicators._cache = {key: values for key, values in self._indicators._cache.items() if key in active}
+
+        strategy_params = {**strategy_class.defaults(), **(strategy_params or dict())}
+        self._strategy = strategy_class(**strategy_params)
+        self._portfolio = Portfolio(stocks, delta_limits, fee, self._data, self._start)
+
+        self._sinames = self._data.sinames
+        self._row = np.empty(len(self._sinames))
+        self._finished = False
+
+    #---------------[Class Methods]-----------------#
+    @classmethod
+    def replay(cls, data_folder: str, stocks: list = None, speed: float = None):
+        '''
+        Replays the bars in a data folder (``.csv`` or ``.parquet`` files in the same format as for ``Backtester``)
+        in time order. Files with different times are replayed on the union of their times, with ``NaN`` prices for
+        the stocks that have no bar.
+
+        ## Parameters
+        - ``data_folder`` (``str``): The path to the data folder.
+        - ``stocks`` (``list``): The stocks to replay, defaults to every file in the folder.
+        - ``speed`` (``float``): How many times faster than real time to replay the bars, ``None`` replays them
+          as fast as possible.
+
+        ## Returns
+        A generator of ``(time, bar)`` pairs, where ``bar[stock][measurement]`` is a price.
+        '''
+        start = None
+        for t, bar, delay in cls._replay(data_folder, stocks, speed):
+            start = start or time.monotonic()
+            wait = delay - (time.monotonic() - start)
+            if wait > 0:
+                time.sleep(wait)
+            yield t, bar
+
+    @classmethod
+    async def areplay(cls, data_folder: str, stocks: list = None, speed: float = None):
+        '''
+        Asynchronous version of ``replay``.
+        '''
+        start = None
+        for t, bar, delay in cls._replay(data_folder, stocks, speed):
+            start = start or time.monotonic()
+            await asyncio.sleep(max(0, delay - (time.monotonic() - start)))
+            yield t, bar
+
+    #---------------[Properties]-----------------#
+    @property
+    def stocks(self):
+        return self._data.stocks
+
+    @property
+    def portfolio(self):
+        return self._portfolio
+
+    @property
+    def strategy(self):
+        return self._strategy
+
+    @property
+    def indicators(self):
+        return self._indicators
+
+    #---------------[Public Methods]-----------------#
+    def on_bar(self, time, bar: dict) -> None:
+        '''
+        Feeds a single bar to the strategy.
+
+        ## Parameters
+        - ``time``: The timestamp of the bar.
+        - ``bar`` (``dict``): The prices of every stock, ``bar[stock][measurement]``.
+
+        ## Returns
+        ``None``
+        '''
+        if self._finished:
+            raise RuntimeError('The stream has already finished')
+
+        for measurement, stock, i in self._sinames:
+            self._row[i] = bar[stock][measurement]
+        self._data._append(time, self._row)
+        self._indicators._extend()
+
+        self._strategy.run_on_data(self._current(), self._portfolio)
+
+    def run(self, source, progressbar: bool = False) -> SingleRunResult:
+        '''
+        Runs the strategy on every bar of a source then finishes the stream.
+
+        ## Parameters
+        - ``source``: An iterable of ``(time, bar)`` pairs, such as ``StreamingBacktester.replay``.
+        - ``progressbar`` (``bool``): Whether to show a progress bar.
+
+        ## Returns
+        result (``SingleRunResult``): The results of the strategy.
+        '''
+        for t, bar in (tqdm(source, desc='> Streaming') if progressbar else source):
+            self.on_bar(t, bar)
+        return self.finish()
+
+    async def arun(self, source) -> SingleRunResult:
+        '''
+        Asynchronous version of ``run``, ``source`` can be an async or regular iterable.
+        '''
+        if hasattr(source, '__aiter__'):
+            async for t, bar in source:
+                self.on_bar(t, bar)
+        else:
+            for t, bar in source:
+                self.on_bar(t, bar)
+        return self.finish()
+
+    def finish(self) -> SingleRunResult:
+        '''
+        Closes all positions and returns the results of the bars streamed so far.
+
+        ## Returns
+        result (``SingleRunResult``): The results of the strategy.
+        '''
+        if len(self._data) == self._start:
+            raise ValueError('No bars have been streamed')
+        if self._finished:
+            raise RuntimeError('The stream has already finished')
+        self._finished = True
+
+        value, trades = self._portfolio.wrap_up()
+        on_finish = self._strategy.on_finish()
+        return SingleRunResult(self.stocks, self._data, self._data.index, (self._start, len(self._data)),
+                               value, trades, self._fee, on_finish)
+
+    #---------------[Private Methods]-----------------#
+    def _current(self) -> tuple:
+        data = self._data._data
+
+        curr_prices = {stock: data[-1, 1 + s*5] for s, stock in enumerate(self.stocks)}
+        matrix = self._strategy._matrix
+
+        if matrix:
+            prices = {measurement: data[:, j::5] for j, measurement in enumerate(self._data._measurement)}
+        else:
+            prices = defaultdict(dict)
+            for measurement, stock, i in self._sinames:
+                prices[measurement][stock] = data[:, i]
+
+        indicators = dict()
+        for funcn, names in self._indicators._funcn_to_indicator_map.items():
+            for indicator in names:
+                params = self._indicators.params[funcn]
+                cached = self._indicators._get_cached(funcn, params, indicator)
+                if matrix and self._indicators._NULL_STOCK not in cached:
+                    indicators[indicator] = self._indicators._matrix(funcn, params, indicator)
+                else:
+                    indicators[indicator] = cached.get(self._indicators._NULL_STOCK, cached)
+
+        return curr_prices, prices, indicators
+
+    @classmethod
+    def _replay(cls, data_folder, stocks, speed):
+        files = {os.path.splitext(f)[0]: os.path.join(data_folder, f) for f in sorted(os.listdir(data_folder))
+                 if f.endswith('.csv') or f.endswith('.parquet')}
+        stocks = sorted(stocks or files)
+
+        measurements = ['open', 'close', 'high', 'low', 'volume']
+        frames = {stock: pd.read_parquet(files[stock]) if files[stock].endswith('.parquet') else pd.read_csv(files[stock])
+                  for stock in stocks}
+        # stocks can have different times (see StockData.ragged), their prices are NaN at the times they have no bar
+        times = {stock: pd.DatetimeIndex(pd.to_datetime(df['time'])) for stock, df in frames.items()}
+        index = pd.Series(reduce(lambda a, b: a.union(b), times.values()).sort_values())
+        values = {stock: df[measurements].set_axis(times[stock]).reindex(index).to_numpy(dtype='float64') 
+                  for stock, df in frames.items()}
+
+        for i, t in enumerate(index):
+            delay = (t - index.iloc[0]).total_seconds()/speed if speed else 0
+            yield t, {stock: dict(zip(measurements, values[stock][i])) for stock in stocks}, delay
@@ -0,0 +1,26 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+STOCKS = ['AAPL', 'GOOG', 'MSFT']
+
+def write_data(folder, n_days=5, seed=0):
+    # minute bars of a random walk for each stock, over trading hours
+    rng = np.random.default_rng(seed)
+    index = pd.date_range('2022-01-03 09:30', periods=390*2*n_days, freq='min')
+    index = index[(index.hour + index.minute/60 >= 9.5) & (index.hour < 16) & (index.dayofweek < 5)][:390*n_days]
+    for stock in STOCKS:
+        close = 100*np.exp(np.cumsum(rng.normal(0, 0.001, len(index))))
+        pd.DataFrame({'time': index, 'open': close*(1 + rng.normal(0, 0.0005, len(close))), 'high': close*1.001,
+                      'low': close*0.999, 'close': close, 'volume': rng.integers(100, 1000, len(close))}
+                     ).to_csv(os.path.join(folder, f'{stock}.csv'), index=False)
+    return folder
+
+
+@pytest.fixture(scope='session')
+def data_folder(tmp_path_factory):
+    return write_data(str(tmp_path_factory.mktemp('data')))
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+from qfinuwa import Backtester, Strategy, Indicators
+from qfinuwa.opt._store import ResultCache
+
+
+class BandIndicators(Indicators):
+
+    @Indicators.MultiIndicator
+    def bands(self, stock, lookback=20):
+        mean = stock['close'].rolling(lookback).mean()
+        return {'upper': mean*1.001, 'lower': mean*0.999}
+
+
+class Bands(Strategy):
+
+    def __init__(self, quantity=5):
+        self.quantity = quantity
+
+    def on_data(self, prices, indicators, portfolio):
+        for stock in portfolio.stocks:
+            if prices['close'][stock][-1] < indicators['lower'][stock][-1]:
+                portfolio.order(stock, quantity=self.quantity)
+            elif prices['close'][stock][-1] > indicators['upper'][stock][-1]:
+                portfolio.order(stock, quantity=-self.quantity)
+
+
+def _backtester(data_folder, **kwargs):
+    return Backtester(Bands, BandIndicators, None, data_folder, days=1, delta_limits=50, fee=0.01, progressbar=False,
+                      **kwargs)
+
+
+def _fail(*args, **kwargs):
+    raise AssertionError('the run was not cached')
+
+
+def test_lru_eviction():
+    cache = ResultCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    # reading a makes b the least recently used
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+
+    assert len(cache) == 2
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+
+    with pytest.raises(ValueError):
+        ResultCache(0)
+
+
+def test_cache_hits(data_folder, monkeypatch):
+    backtester = _backtester(data_folder, cache_size=1)
+    first = backtester.run({'quantity': 1}, cv=2, seed=1)
+    # the same periods and parameters (with the defaults filled in) are the same run
+    monkeypatch.setattr(backtester._indicators, '_iteration_arrays', _fail)
+    assert backtester.run({'quantity': 1}, {'bands': {'lookback': 20}}, cv=2, seed=1) is first
+
+    # a new run evicts it
+    monkeypatch.undo()
+    backtester.run({'quantity': 5}, cv=2, seed=1)
+    assert backtester.run({'quantity': 1}, cv=2, seed=1) is not first
+
+
+def test_disk_cache(tmp_path, data_folder, monkeypatch):
+    path = str(tmp_path/'cache.db')
+    expected = _backtester(data_folder, cache_size=1, cache_path=path).run({'quantity': 5}, cv=2, seed=1)
+
+    # a new backtester (as in a new session) reads the result from disk
+    backtester = _backtester(data_folder, cache_size=1, cache_path=path)
+    monkeypatch.setattr(backtester._indicators, '_iteration_arrays', _fail)
+    found = backtester.run({'quantity': 5}, cv=2, seed=1)
+    assert found is not expected
+    for single_found, single in zip(found, expected):
+        assert single_found.roi == single.roi
+        np.testing.assert_array_equal(single_found.value_over_time['value'], single.value_over_time['value'])
@@ -0,0 +1,92 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from qfinuwa import Backtester, Strategy, Indicators, rolling
+from qfinuwa.opt import StockData
+from conftest import write_data
+
+
+class LookbackIndicators(Indicators):
+
+    @Indicators.MultiIndicator(lookback=lambda lookback, **_: lookback)
+    def bands(self, stock, lookback=20):
+        mean = stock['close'].rolling(lookback).mean()
+        return {'upper': mean*1.001, 'lower': mean*0.999}
+
+    @Indicators.MultiIndicator(numpy=True, lookback=lambda lookback, **_: 2*lookback)
+    def smooth(self, data, lookback=10):
+        return {'smooth': rolling.mean(rolling.mean(data['close'], lookback), lookback)}
+
+
+class History(Strategy):
+
+    def __init__(self, quantity=5):
+        self.quantity = quantity
+
+    def on_data(self, prices, indicators, portfolio):
+        # reads a few bars of indicator history
+        for stock in portfolio.stocks:
+            if prices['close'][stock][-1] < min(indicators['lower'][stock][-3:]):
+                portfolio.order(stock, quantity=self.quantity)
+            elif prices['close'][stock][-1] > indicators['upper'][stock][-1] and \
+                    prices['close'][stock][-1] > indicators['smooth'][stock][-1]:
+                portfolio.order(stock, quantity=-self.quantity)
+
+
+def _check_equal(found, expected):
+    assert len(found.results) == len(expected.results)
+    for single_found, single in zip(found, expected):
+        assert single_found.date_range == single.date_range
+        assert len(single.buys) and len(single.sells)
+        np.testing.assert_array_equal(single_found.value_over_time['value'], single.value_over_time['value'])
+        np.testing.assert_array_equal(single_found.buys, single.buys)
+        np.testing.assert_array_equal(single_found.sells, single.sells)
+
+
+@pytest.mark.parametrize('chunk_size, overlap', [(50, None), (37, 5), (1000, None)])
+def test_chunked_run(data_folder, chunk_size, overlap):
+    backtester = Backtester(History, LookbackIndicators, None, data_folder, days=1, delta_limits=50, fee=0.01,
+                            progressbar=False)
+    params = {'bands': {'lookback': 15}, 'smooth': {'lookback': 8}}
+    expected = backtester.run({'quantity': 3}, params, cv=2, seed=1)
+    found = backtester.run({'quantity': 3}, params, cv=2, seed=1, chunk_size=chunk_size, overlap=overlap)
+    _check_equal(found, expected)
+
+
+def test_chunks_need_lookbacks(data_folder):
+    class Unbounded(LookbackIndicators):
+
+        @Indicators.MultiIndicator
+        def cumulative(self, stock):
+            return {'cumulative': stock['close'].cumsum()}
+
+    backtester = Backtester(History, Unbounded, None, data_folder, days=1, progressbar=False)
+    with pytest.raises(ValueError, match='cumulative'):
+        backtester.run(cv=1, seed=1, chunk_size=50)
+
+
+@pytest.mark.parametrize('ragged', [False, True])
+def test_store_round_trip(tmp_path, ragged):
+    folder = write_data(str(tmp_path))
+    if ragged:
+        # one stock lists late
+        path = os.path.join(folder, 'GOOG.csv')
+        frame = pd.read_csv(path)
+        frame.iloc[100:].to_csv(path, index=False)
+    loaded = StockData(folder)
+    StockData.write_store(folder, str(tmp_path/'store'), chunk_size=100)
+    stored = StockData(str(tmp_path/'store'))
+
+    assert stored.out_of_core and not loaded.out_of_core
+    assert stored.ragged == loaded.ragged == ragged
+    assert stored.stocks == loaded.stocks
+    assert (stored.index == loaded.index).all()
+    np.testing.assert_array_equal(stored._data, loaded._data)
+    np.testing.assert_array_equal(stored.valid, loaded.valid)
+    assert stored.fingerprint == loaded.fingerprint
+
+    # backtests read from the store are the same
+    results = [Backtester(History, LookbackIndicators, None, data, days=1, delta_limits=50, fee=0.01, 
+                          progressbar=False).run(cv=2, seed=1) for data in (loaded, stored)]
+    _check_equal(results[1], results[0])
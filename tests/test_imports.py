@@ -0,0 +1,24 @@
+import os
+import subprocess
+import sys
+
+# only needed by Plotting, API, the jit backend, progress bars or tables and the backtest server
+LAZY = ['bokeh', 'requests', 'numba', 'tqdm', 'tabulate', 'http.server']
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+
+def _loaded(code):
+    # the lazy modules in sys.modules after running code in a fresh interpreter
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [SRC, os.environ.get('PYTHONPATH')])))
+    script = f'import sys\n{code}\nprint(" ".join(m for m in {LAZY!r} if m in sys.modules))'
+    out = subprocess.run([sys.executable, '-c', script], env=env, check=True, capture_output=True, text=True)
+    return set(out.stdout.split())
+
+
+def test_import_is_lazy():
+    assert _loaded('import qfinuwa') == set()
+
+
+def test_loaded_on_use():
+    assert 'http.server' in _loaded('import qfinuwa\nqfinuwa.BacktestServer')
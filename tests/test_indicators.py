@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+import pytest
+from qfinuwa import Indicators, rolling
+from qfinuwa.opt import StockData
+from qfinuwa.indicators import _merge, _subtract
+
+
+class StagedIndicators(Indicators):
+
+    calls = []
+
+    @Indicators.Stage
+    def mean(self, series):
+        self.calls.append(1)
+        return series.mean()
+
+    @Indicators.MultiIndicator
+    def means(self, stock, k=1):
+        return {'close_mean': stock['close']*0 + self.mean(stock['close']),
+                'volume_mean': stock['close']*0 + self.mean(stock['volume'])}
+
+    @Indicators.MultiIndicator(numpy=True)
+    def numpy_means(self, stock, k=1):
+        return {'np_close_mean': stock['close']*0 + self.mean(stock['close']),
+                'np_volume_mean': stock['close']*0 + self.mean(stock['volume'])}
+
+
+@pytest.mark.parametrize('func, names', [('means', ('close_mean', 'volume_mean')), 
+                                         ('numpy_means', ('np_close_mean', 'np_volume_mean'))])
+def test_stage_called_on_different_inputs(data_folder, func, names):
+    data = StockData(data_folder)
+    indicators = StagedIndicators(data=data, n_threads=1)
+    StagedIndicators.calls.clear()
+    indicators._get_permutations({func: {'k': [1, 2, 3]}}, [(0, len(data))])
+
+    for stock in data.stocks:
+        frame = pd.read_csv(f'{data_folder}/{stock}.csv')
+        for k in (1, 2, 3):
+            close = indicators._get_cached(func, {'k': k}, names[0])[stock]
+            volume = indicators._get_cached(func, {'k': k}, names[1])[stock]
+            assert np.allclose(close, frame['close'].mean())
+            assert np.allclose(volume, frame['volume'].mean())
+
+    # each input is only computed once per stock, however many parameter sets use it
+    assert len(StagedIndicators.calls) == 2*len(data.stocks)
+
+
+@pytest.mark.parametrize('intervals, gap, merged', [
+    ([(5, 8), (0, 3)], 0, [(0, 3), (5, 8)]),
+    # adjacent, overlapping and contained
+    ([(0, 3), (3, 6)], 0, [(0, 6)]),
+    ([(0, 5), (3, 8)], 0, [(0, 8)]),
+    ([(0, 10), (2, 4)], 0, [(0, 10)]),
+    # within the gap, and empty intervals
+    ([(0, 3), (5, 8)], 2, [(0, 8)]),
+    ([(0, 3), (6, 8)], 2, [(0, 3), (6, 8)]),
+    ([(4, 4), (0, 3), (9, 2)], 0, [(0, 3)]),
+])
+def test_merge(intervals, gap, merged):
+    assert _merge(intervals, gap) == merged
+
+
+@pytest.mark.parametrize('intervals, covered, missing', [
+    ([(0, 10)], [], [(0, 10)]),
+    ([(0, 10)], [(0, 10)], []),
+    # adjacent, overlapping at either end and contained
+    ([(0, 10)], [(10, 20)], [(0, 10)]),
+    ([(5, 10)], [(0, 5)], [(5, 10)]),
+    ([(0, 10)], [(8, 20)], [(0, 8)]),
+    ([(5, 15)], [(0, 8)], [(8, 15)]),
+    ([(0, 10)], [(3, 5)], [(0, 3), (5, 10)]),
+    ([(3, 5)], [(0, 10)], []),
+    ([(0, 20), (30, 40)], [(2, 4), (6, 8), (35, 50)], [(0, 2), (4, 6), (8, 20), (30, 35)]),
+])
+def test_subtract(intervals, covered, missing):
+    assert _subtract(intervals, covered) == missing
+
+
+class LookbackIndicators(Indicators):
+
+    windows = []
+
+    @Indicators.MultiIndicator(lookback=lambda lookback, **_: lookback)
+    def bands(self, stock, lookback=20):
+        self.windows.append(self._stage_context[2])
+        mean = stock['close'].rolling(lookback).mean()
+        return {'upper': mean*1.001, 'lower': mean*0.999}
+
+    @Indicators.MultiIndicator(numpy=True, lookback='auto')
+    def smooth(self, data, first=10, second=5):
+        return {'smooth': rolling.mean(rolling.mean(data['close'], first), second)}
+
+
+def test_lookback_windows(data_folder):
+    data = StockData(data_folder)
+    full = LookbackIndicators(data=data, n_threads=1)
+    # parameters other than the defaults, which are computed over every bar up front
+    tasks = [('bands', {'lookback': 30}), ('smooth', {'first': 8, 'second': 4})]
+    full._add_indicators(tasks)
+    windowed = LookbackIndicators(data=data, n_threads=1)
+
+    # the second fold only computes the bars the first didn't, with their warm-up
+    for folds, computed in (([(500, 800)], [(440, 470, 800)]), ([(700, 1000)], [(770, 800, 1000)])):
+        LookbackIndicators.windows.clear()
+        windowed._add_indicators(tasks, folds)
+        assert LookbackIndicators.windows == computed*len(data.stocks)
+    assert windowed._coverage[windowed._hashable('bands', {'lookback': 30})] == [(470, 1000)]
+
+    # the bars of the folds and the lookback before them are the same as computing every bar
+    for (func_name, params), indicator, lookback in zip(tasks, ('upper', 'smooth'), (30, 12)):
+        for stock in data.stocks:
+            expected = full._get_cached(func_name, params, indicator)[stock]
+            found = windowed._get_cached(func_name, params, indicator)[stock]
+            np.testing.assert_allclose(found[500 - lookback: 1000], expected[500 - lookback: 1000], rtol=1e-12)
+            assert np.isnan(found[:500 - lookback]).all() and np.isnan(found[1000:]).all()
@@ -0,0 +1,50 @@
+import pytest
+from qfinuwa import Backtester, JitStrategy, Indicators
+
+pytest.importorskip('numba')
+
+
+class BandIndicators(Indicators):
+
+    @Indicators.MultiIndicator
+    def bands(self, stock, lookback=20):
+        mean = stock['close'].rolling(lookback).mean()
+        return {'upper': mean*1.001, 'lower': mean*0.999}
+
+
+class Bands(JitStrategy):
+
+    def __init__(self, quantity=5):
+        return
+
+    @staticmethod
+    def kernel(i, prices, indicators, delta, orders, params):
+        # indicators are in the order of their names, lower then upper
+        for s in range(prices.shape[2]):
+            if prices[1, i, s] < indicators[0, i, s]:
+                orders[s] = params[0]
+            elif prices[1, i, s] > indicators[1, i, s]:
+                orders[s] = -params[0]
+
+
+def test_backends_agree(data_folder):
+    backtester = Backtester(Bands, BandIndicators, None, data_folder, days=1, delta_limits=50, fee=0.01,
+                            progressbar=False)
+    result = backtester.compare_backends({'quantity': 3}, {'bands': {'lookback': 10}}, cv=2, seed=7)
+
+    assert len(list(result)) == 2
+    assert all(len(single.buys) and len(single.sells) for single in result)
+
+
+def test_backends_disagree(data_folder, monkeypatch):
+    backtester = Backtester(Bands, BandIndicators, None, data_folder, days=1, delta_limits=50, fee=0.01,
+                            progressbar=False)
+    run = backtester.run
+
+    def run_with_higher_fee(*args, backend='python', **kwargs):
+        backtester._fee = 0.01 if backend == 'python' else 0.5
+        return run(*args, backend=backend, **kwargs)
+
+    monkeypatch.setattr(backtester, 'run', run_with_higher_fee)
+    with pytest.raises(ValueError, match='Backends produced different values'):
+        backtester.compare_backends({'quantity': 3}, {'bands': {'lookback': 10}}, cv=2, seed=7)
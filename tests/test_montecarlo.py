@@ -0,0 +1,73 @@
+import numpy as np
+from qfinuwa import Backtester, Strategy, Indicators
+from qfinuwa.opt import StockData
+from qfinuwa.opt._montecarlo import bootstrap, slip
+from qfinuwa.opt._portfolio import TRADE_DTYPE
+
+
+class BandIndicators(Indicators):
+
+    @Indicators.MultiIndicator
+    def bands(self, stock, lookback=20):
+        mean = stock['close'].rolling(lookback).mean()
+        return {'upper': mean*1.001, 'lower': mean*0.999}
+
+
+class Bands(Strategy):
+
+    def __init__(self, quantity=5):
+        self.quantity = quantity
+
+    def on_data(self, prices, indicators, portfolio):
+        for stock in portfolio.stocks:
+            if prices['close'][stock][-1] < indicators['lower'][stock][-1]:
+                portfolio.order(stock, quantity=self.quantity)
+            elif prices['close'][stock][-1] > indicators['upper'][stock][-1]:
+                portfolio.order(stock, quantity=-self.quantity)
+
+
+def test_same_paths_in_parallel(data_folder):
+    backtester = Backtester(Bands, BandIndicators, None, data_folder, days=1, delta_limits=50, fee=0.01,
+                            progressbar=False)
+    results = [backtester.monte_carlo(6, block_size=50, length=400, slippage=0.001, seed=3, n_processes=n, 
+                                      batch_size=2, progressbar=False) for n in (1, 2)]
+
+    assert results[0].n_paths == 6
+    assert len(np.unique(results[0].roi)) == 6
+    for name, values in results[0]._summaries.items():
+        np.testing.assert_array_equal(values, results[1]._summaries[name])
+
+
+def test_bootstrap(data_folder):
+    data = StockData(data_folder)._data
+    path = bootstrap(data, 500, 50, np.random.default_rng(0))
+    assert path.shape == (500, data.shape[1])
+    np.testing.assert_array_equal(path[0], data[0])
+
+    # every bar is a bar of the data relative to the previous close, for every stock at once
+    bars, sampled = data.reshape(len(data), -1, 5), path.reshape(len(path), -1, 5)
+    ratios = bars[1:, :, :4]/bars[:-1, :, 1:2]
+    found = sampled[1:, :, :4]/sampled[:-1, :, 1:2]
+    for t in range(len(found)):
+        k = np.abs(ratios[:, :, 1] - found[t, :, 1]).max(axis=1).argmin()
+        np.testing.assert_allclose(found[t], ratios[k], rtol=1e-10)
+        np.testing.assert_array_equal(sampled[t + 1, :, 4], bars[k + 1, :, 4])
+
+
+def test_no_slippage():
+    rng = np.random.default_rng(0)
+    values = rng.normal(0, 1, (10, 2, 3))
+    trades = np.array([(2, 0, 5., 100.), (6, 1, -3., 50.)], dtype=TRADE_DTYPE)
+
+    assert slip(values, trades, 0, rng) is values
+    # no random numbers were drawn, so later paths are unchanged
+    fresh = np.random.default_rng(0)
+    fresh.normal(0, 1, (10, 2, 3))
+    assert rng.random() == fresh.random()
+
+    slipped = slip(values, trades, 0.01, np.random.default_rng(1))
+    np.testing.assert_array_equal(slipped[:, :, :2], values[:, :, :2])
+    extra = slipped[:, :, 2] - values[:, :, 2]
+    # charged from the bar after each trade
+    assert (extra[:3] == 0).all() and (extra[3:, 0] > 0).all()
+    assert (extra[:7, 1] == 0).all() and (extra[7:, 1] > 0).all()
@@ -0,0 +1,158 @@
+import numpy as np
+import pandas as pd
+from qfinuwa.opt import StockData
+from qfinuwa.opt._portfolio import Portfolio
+
+STOCKS = ['A', 'B']
+
+
+def _stockdata(bars):
+    # bars of (open, close, high, low) for each stock, NaN where a stock has no bar
+    data = np.array([[value for ohlc in bar for value in (ohlc[0], ohlc[1], ohlc[2], ohlc[3], 1000.)] for bar in bars])
+    times = pd.date_range('2022-01-03 09:30', periods=len(bars), freq='min')
+    stockdata = StockData._from_arrays(STOCKS, times, data)
+    valid = np.isfinite(data[:, 1::5])
+    if not valid.all():
+        stockdata._set_data(pd.Series(times, name='time'), data, np.packbits(valid.T, axis=1))
+    return stockdata
+
+
+def _portfolio(stockdata, limit=100):
+    return Portfolio(STOCKS, {stock: limit for stock in STOCKS}, 0.01, stockdata)
+
+
+def _step(portfolio, stockdata):
+    # moves the portfolio on to its next bar
+    row = stockdata._data[portfolio._i + 1]
+    portfolio.curr_prices = {stock: row[5*s + 1] for s, stock in enumerate(STOCKS)}
+
+
+def _trades(trades):
+    return [(int(i), STOCKS[s], float(quantity), float(price)) for i, s, quantity, price in trades]
+
+
+FLAT = (50, 50, 50, 50)
+NAN = (np.nan,)*4
+
+
+def test_fills_in_heap_order():
+    stockdata = _stockdata([((100, 100, 101, 99), FLAT),
+                            ((100, 97, 100.5, 96), FLAT),
+                            # gaps up through the stop, then down through the last limit
+                            ((104, 104, 105, 103.5), FLAT),
+                            ((94, 94.5, 95, 93), FLAT)])
+    portfolio = _portfolio(stockdata)
+    _step(portfolio, stockdata)
+    ids = [portfolio.limit_order('A', 1, 98), portfolio.limit_order('A', 2, 97), portfolio.limit_order('A', 4, 95),
+           portfolio.stop_order('A', -1, 99), portfolio.limit_order('A', -3, 100.2), portfolio.stop_order('A', 5, 103)]
+    assert ids == list(range(6))
+    assert portfolio.pending[3] == ('A', 'stop', -1, 99)
+
+    # the orders triggered by the low fill from the highest price down, then those triggered by the high
+    _step(portfolio, stockdata)
+    assert sorted(portfolio.pending) == [2, 5]
+    # bars that open past the price fill at the open
+    _step(portfolio, stockdata)
+    _step(portfolio, stockdata)
+    assert portfolio.pending == {}
+    assert portfolio.delta['A'] == -1 + 1 + 2 - 3 + 5 + 4
+
+    _, trades = portfolio.wrap_up()
+    assert _trades(trades) == [(1, 'A', -1, 99), (1, 'A', 1, 98), (1, 'A', 2, 97), (1, 'A', -3, 100.2),
+                               (2, 'A', 5, 104), (3, 'A', 4, 94), (3, 'A', -8, 94.5)]
+
+
+def test_triggered_orders_respect_delta_limits():
+    stockdata = _stockdata([((100, 100, 100, 100), FLAT), ((100, 99, 100, 98), FLAT)])
+    portfolio = _portfolio(stockdata, limit=5)
+    _step(portfolio, stockdata)
+    portfolio.limit_order('A', 3, 99.5)
+    portfolio.limit_order('A', 3, 99)
+
+    # the second would take the position past the limit once the first has filled, so it's dropped
+    _step(portfolio, stockdata)
+    assert portfolio.pending == {}
+    assert portfolio.delta['A'] == 3
+
+
+def test_cancel():
+    stockdata = _stockdata([((100, 100, 100, 100), FLAT), ((100, 95, 100, 90), FLAT)])
+    portfolio = _portfolio(stockdata)
+    _step(portfolio, stockdata)
+    kept = portfolio.limit_order('A', 1, 99)
+    cancelled = portfolio.limit_order('A', 2, 98)
+
+    assert portfolio.cancel(cancelled)
+    assert not portfolio.cancel(cancelled)
+    _step(portfolio, stockdata)
+    assert not portfolio.cancel(kept)
+    assert portfolio.delta['A'] == 1
+
+
+def test_pending_at_wrap_up():
+    stockdata = _stockdata([((100, 100, 100, 100), FLAT), ((100, 100, 100, 100), FLAT)])
+    portfolio = _portfolio(stockdata)
+    _step(portfolio, stockdata)
+    portfolio.order('A', 2)
+    portfolio.limit_order('A', 1, 90)
+    _step(portfolio, stockdata)
+    # the last bar meets the order, but it's only placed after it
+    portfolio.stop_order('A', 1, 100)
+
+    # orders still pending are dropped rather than filled, and the position is closed
+    value, trades = portfolio.wrap_up()
+    assert portfolio.pending == {}
+    assert _trades(trades) == [(0, 'A', 2, 100), (1, 'A', -2, 100)]
+    assert value.shape == (3, 2, 3)
+    assert value[-1, 0, 0] == 0
+
+
+def test_no_fills_on_missing_bars():
+    stockdata = _stockdata([(FLAT, (100, 100, 100, 100)),
+                            (FLAT, NAN),
+                            (FLAT, (97, 98, 99, 96))])
+    portfolio = _portfolio(stockdata)
+    _step(portfolio, stockdata)
+    order_id = portfolio.limit_order('B', 1, 99)
+
+    # the order waits out the bar the stock is missing, as do market orders on it
+    _step(portfolio, stockdata)
+    assert not portfolio.order('B', 1)
+    assert not portfolio.order_many({'B': 1})[1]
+    assert order_id in portfolio.pending
+
+    _step(portfolio, stockdata)
+    assert portfolio.pending == {}
+    _, trades = portfolio.wrap_up()
+    assert _trades(trades) == [(2, 'B', 1, 97), (2, 'B', -1, 98)]
+
+
+def test_order_many_matches_order():
+    rng = np.random.default_rng(0)
+    stocks = ['A', 'B', 'C', 'D']
+    limits = {'A': 5, 'B': 10, 'C': 3, 'D': 50}
+    prices = 100 + np.cumsum(rng.normal(0, 1, (200, len(stocks))), axis=0)
+    # stocks missing bars, and one missing the last bar
+    prices[rng.random(prices.shape) < 0.1] = np.nan
+    prices[-1, 2] = np.nan
+    quantities = rng.integers(-4, 5, prices.shape).astype('float64')
+
+    one, many = Portfolio(stocks, limits, 0.01), Portfolio(stocks, limits, 0.01)
+    rejected = np.zeros(prices.shape, dtype=bool)
+    for bar, (price, ordered) in enumerate(zip(prices, quantities)):
+        one.curr_prices = many.curr_prices = dict(zip(stocks, price))
+        filled = [one.order(stock, quantity) for stock, quantity in zip(stocks, ordered)]
+        np.testing.assert_array_equal(many.order_many(ordered), filled)
+        rejected[bar] = (ordered != 0) & ~np.array(filled)
+
+    # some orders were clipped by the delta limits and some by missing prices
+    assert (rejected & np.isfinite(prices)).any()
+    assert (rejected & np.isnan(prices)).any()
+    np.testing.assert_array_equal(one.positions, many.positions)
+    np.testing.assert_array_equal(one._capital, many._capital)
+    np.testing.assert_array_equal(one._fees_paid, many._fees_paid)
+
+    value_one, trades_one = one.wrap_up()
+    value_many, trades_many = many.wrap_up()
+    np.testing.assert_array_equal(trades_one, trades_many)
+    np.testing.assert_array_equal(value_one, value_many)
@@ -0,0 +1,99 @@
+import os
+import multiprocessing
+import numpy as np
+from qfinuwa import Backtester, Strategy, Indicators
+from qfinuwa.opt import StockData, WorkQueue
+from qfinuwa.opt._queue import work
+
+# workers are forked so they can unpickle the classes defined here
+context = multiprocessing.get_context('fork')
+
+
+class BandIndicators(Indicators):
+
+    @Indicators.MultiIndicator
+    def bands(self, stock, lookback=20):
+        mean = stock['close'].rolling(lookback).mean()
+        return {'upper': mean*1.001, 'lower': mean*0.999}
+
+
+class Unreliable(Strategy):
+
+    def __init__(self, quantity=5, fail='', crash=''):
+        # the first run given a marker file that doesn't exist yet raises, or kills its worker, and creates it
+        self.quantity = quantity
+        for marker, stop in ((fail, _raise), (crash, _exit)):
+            if marker and not os.path.exists(marker):
+                open(marker, 'w').close()
+                stop()
+
+    def on_data(self, prices, indicators, portfolio):
+        for stock in portfolio.stocks:
+            if prices['close'][stock][-1] < indicators['lower'][stock][-1]:
+                portfolio.order(stock, quantity=self.quantity)
+            elif prices['close'][stock][-1] > indicators['upper'][stock][-1]:
+                portfolio.order(stock, quantity=-self.quantity)
+
+
+def _raise():
+    raise RuntimeError('flaky')
+
+
+def _exit():
+    os._exit(1)
+
+
+def _workers(path, n, data_folder=None):
+    workers = [context.Process(target=work, args=(path, data_folder, 3.0, False)) for _ in range(n)]
+    for worker in workers:
+        worker.start()
+    return workers
+
+
+def _rois(sweep):
+    return {(result.parameters['strategy']['quantity'], result.parameters['indicator']['bands']['lookback']):
+            [single.roi for single in result] for result in sweep}
+
+
+def _check(backtester, sweep, strategy_params, indicator_params):
+    local = backtester.run_grid_search(strategy_params, indicator_params, cv=2, seed=1)
+    expected, found = _rois(local), _rois(sweep)
+    assert expected.keys() == found.keys()
+    for key in expected:
+        assert np.allclose(expected[key], found[key])
+
+
+def test_failed_task_is_retried(tmp_path, data_folder):
+    queue = WorkQueue(str(tmp_path/'queue'), retries=1, poll_interval=0.05)
+    backtester = Backtester(Unreliable, BandIndicators, None, data_folder, days=1, progressbar=False)
+    strategy_params = {'quantity': [1, 5], 'fail': [str(tmp_path/'failed')]}
+    indicator_params = {'bands': {'lookback': [10, 20]}}
+
+    workers = _workers(queue.path, 2)
+    sweep = backtester.run_grid_search(strategy_params, indicator_params, cv=2, seed=1, queue=queue)
+    for worker in workers:
+        worker.join()
+
+    assert os.path.exists(tmp_path/'failed')
+    assert os.listdir(queue.path) == []
+    _check(backtester, sweep, strategy_params, indicator_params)
+
+
+def test_expired_lease_is_retried(tmp_path, data_folder):
+    queue = WorkQueue(str(tmp_path/'queue'), lease_timeout=1.0, poll_interval=0.05)
+    # data that isn't from a folder is found by the workers through their data_folder
+    loaded = StockData(data_folder)
+    data = StockData._from_arrays(loaded.stocks, loaded.index, loaded._data)
+    backtester = Backtester(Unreliable, BandIndicators, None, data, days=1, progressbar=False)
+    strategy_params = {'quantity': [1, 5], 'crash': [str(tmp_path/'crashed')]}
+    indicator_params = {'bands': {'lookback': [10, 20]}}
+
+    workers = _workers(queue.path, 2, data_folder)
+    sweep = backtester.run_grid_search(strategy_params, indicator_params, cv=2, seed=1, queue=queue)
+    for worker in workers:
+        worker.join()
+
+    # one worker died holding a lease, and its task was run by the other once the lease expired
+    assert sorted(worker.exitcode for worker in workers) == [0, 1]
+    assert os.listdir(queue.path) == []
+    _check(backtester, sweep, strategy_params, indicator_params)
@@ -0,0 +1,76 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from qfinuwa import Backtester, JitStrategy, Indicators
+from qfinuwa.opt import StockData
+from conftest import write_data
+
+pytest.importorskip('numba')
+
+
+class BandIndicators(Indicators):
+
+    @Indicators.MultiIndicator(lookback=lambda lookback, **_: lookback)
+    def bands(self, stock, lookback=20):
+        mean = stock['close'].rolling(lookback).mean()
+        return {'upper': mean*1.001, 'lower': mean*0.999}
+
+
+class Alternate(JitStrategy):
+
+    def __init__(self, quantity=1):
+        return
+
+    @staticmethod
+    def kernel(i, prices, indicators, delta, orders, params):
+        # orders every stock on every bar, buying twice as much as it sells so positions are open at the end
+        for s in range(prices.shape[2]):
+            orders[s] = 2*params[0] if i % 2 == 0 else -params[0]
+
+
+@pytest.fixture(scope='module')
+def ragged_folder(tmp_path_factory):
+    folder = write_data(str(tmp_path_factory.mktemp('ragged')))
+    # one stock lists late and another delists early
+    for stock, kept in (('GOOG', slice(100, None)), ('MSFT', slice(None, -500))):
+        path = os.path.join(folder, f'{stock}.csv')
+        frame = pd.read_csv(path)
+        frame.iloc[kept].to_csv(path, index=False)
+    return folder
+
+
+@pytest.mark.parametrize('backend', ['python', 'jit'])
+def test_ragged_run(ragged_folder, backend):
+    data = StockData(ragged_folder)
+    assert data.ragged
+    backtester = Backtester(Alternate, BandIndicators, None, data, days='all', delta_limits=10_000, fee=0.01,
+                            progressbar=False)
+    result = backtester.run(cv=1, seed=1, backend=backend)[0]
+    start, end = result._start, result._end
+    valid = data.valid[start:end]
+    # the last trade of each stock closes its position
+    trades = result.trades
+    closing = np.array([np.flatnonzero(trades['stock'] == s)[-1] for s in range(len(data.stocks))])
+    ordered = np.delete(trades, closing)
+
+    # every order is filled, except on the bars a stock is missing
+    filled = np.zeros_like(valid)
+    filled[ordered['i'], ordered['stock']] = True
+    np.testing.assert_array_equal(filled, valid)
+
+    # positions are closed on the last bar, at each stock's last price
+    closes = data._data[:, 1::5]
+    for s, stock in enumerate(data.stocks):
+        bars = data._stock_bars(stock)
+        trade = trades[closing[s]]
+        assert trade['i'] == end - start - 1 and trade['quantity'] < 0
+        assert trade['price'] == closes[bars[bars < end][-1], s]
+    assert (result._values[-1, :, 0] == 0).all()
+
+
+def test_ragged_backends_agree(ragged_folder):
+    backtester = Backtester(Alternate, BandIndicators, None, ragged_folder, days=1, delta_limits=50, fee=0.01,
+                            progressbar=False)
+    result = backtester.compare_backends({'quantity': 2}, cv=2, seed=3)
+    assert len(list(result)) == 2
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from qfinuwa import Backtester, Strategy, Indicators
+
+
+class MeanIndicators(Indicators):
+
+    @Indicators.MultiIndicator
+    def sma(self, stock, lookback=20):
+        return {'sma': stock['close'].rolling(lookback).mean()}
+
+
+class MeanReversion(Strategy):
+
+    def __init__(self, quantity=5):
+        self.quantity = quantity
+
+    def on_data(self, prices, indicators, portfolio):
+        for stock in portfolio.stocks:
+            if prices['close'][stock][-1] < indicators['sma'][stock][-1]:
+                portfolio.order(stock, quantity=self.quantity)
+            else:
+                portfolio.order(stock, quantity=-self.quantity)
+
+
+def test_one_sharpe_ratio(data_folder):
+    backtester = Backtester(MeanReversion, MeanIndicators, None, data_folder, days=1, delta_limits=50, fee=0.01,
+                            progressbar=False)
+    sweep = backtester.run_grid_search(strategy_params={'quantity': [1, 5]}, cv=2, seed=1)
+    result = sweep.best
+
+    sharpe_ratios = [single.metrics['sharpe_ratio'] for single in result]
+    assert 'sharp_ratio' not in sweep.scores
+    assert sweep.scores['sharpe_ratio'].iloc[0] == pytest.approx(np.mean(sharpe_ratios))
+    for single in result:
+        assert 'Sharp Ratio' not in str(single)
+        assert f"sharpe_ratio:\t{single.metrics['sharpe_ratio']}" in str(single)
+    assert 'SHARP RATIO' not in str(result)
+
+
+def test_deprecated_sharp_ratio(data_folder):
+    backtester = Backtester(MeanReversion, MeanIndicators, None, data_folder, days=1, delta_limits=50, fee=0.01,
+                            progressbar=False)
+    result = backtester.run(cv=2, seed=1)
+
+    # the old ratio of percentage returns per bar, less the risk free rate
+    for single in result:
+        value = single.value_over_time['value'].to_numpy()
+        returns = value[1:]/value[:-1] - 1
+        returns = returns[np.isfinite(returns)]
+        for rate in (0, 0.01):
+            with pytest.deprecated_call():
+                found = single.sharp_ratio(rate)
+            assert np.isfinite(found)
+            assert found == pytest.approx((returns.mean() - rate)/returns.std(ddof=1))
+
+    with pytest.deprecated_call():
+        mean, std = result.sharp_ratio(0.01)
+    assert np.isfinite(mean) and np.isfinite(std)
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+from numpy.lib.stride_tricks import sliding_window_view
+from qfinuwa import rolling
+
+WINDOWS = [1, 2, 3, 16, 17, 64, 500]
+
+
+def _series(n=20_000, seed=0):
+    # a random walk at a high price, flat for a stretch (as a halted stock) and with missing values
+    rng = np.random.default_rng(seed)
+    x = 1e4 + np.cumsum(rng.normal(0, 1, n))
+    x[1000:1600] = x[1000]
+    x[[5, 700, 701, n - 100]] = np.nan
+    return x
+
+
+def _direct_std(x, window, ddof=1):
+    # the deviations from each window's mean, in extended precision
+    out = np.full(len(x), np.nan)
+    windows = sliding_window_view(x.astype(np.longdouble), window)
+    deviations = windows - windows.mean(axis=1, keepdims=True)
+    out[window - 1:] = np.sqrt((deviations**2).sum(axis=1)/(window - ddof)).astype('float64')
+    return out
+
+
+def test_builtins_not_shadowed():
+    assert not hasattr(rolling, 'sum')
+    assert not hasattr(rolling, 'min') and not hasattr(rolling, 'max')
+
+
+@pytest.mark.parametrize('window', WINDOWS)
+def test_matches_pandas(window):
+    x = _series()
+    s = pd.Series(x).rolling(window)
+    np.testing.assert_allclose(rolling.total(x, window), s.sum(), rtol=1e-10)
+    np.testing.assert_allclose(rolling.mean(x, window), s.mean(), rtol=1e-10)
+    np.testing.assert_array_equal(rolling.minimum(x, window), s.min())
+    np.testing.assert_array_equal(rolling.maximum(x, window), s.max())
+
+
+@pytest.mark.parametrize('window', WINDOWS[1:])
+def test_std_accuracy(window):
+    x = _series()
+    expected = _direct_std(x, window)
+    found = rolling.std(x, window)
+
+    assert np.array_equal(np.isnan(found), np.isnan(expected))
+    # flat windows are exactly 0
+    assert (found[1000 + window - 1: 1600] == 0).all()
+    np.testing.assert_allclose(found, expected, rtol=1e-9, atol=1e-10)
+
+
+@pytest.mark.parametrize('window', [2, 17, 100])
+def test_online_matches_batch(window):
+    x = _series(5_000)
+    for online, batch in ((rolling.Total, rolling.total), (rolling.Mean, rolling.mean), (rolling.Std, rolling.std),
+                          (rolling.Minimum, rolling.minimum), (rolling.Maximum, rolling.maximum)):
+        state = online(window)
+        # updated with a bar at a time and in batches
+        out = np.concatenate([state.update(x[:10]), *(state.update([v]) for v in x[10:300]), state.update(x[300:])])
+        np.testing.assert_allclose(out, batch(x, window), rtol=1e-9, atol=1e-9)
@@ -0,0 +1,67 @@
+import threading
+import pytest
+from qfinuwa import Backtester, Strategy, Indicators, BacktestServer, BacktestClient
+
+
+class BandIndicators(Indicators):
+
+    calls = []
+
+    @Indicators.MultiIndicator
+    def bands(self, stock, lookback=20):
+        self.calls.append(lookback)
+        mean = stock['close'].rolling(lookback).mean()
+        return {'upper': mean*1.001, 'lower': mean*0.999}
+
+
+class Bands(Strategy):
+
+    def __init__(self, quantity=5):
+        self.quantity = quantity
+
+    def on_data(self, prices, indicators, portfolio):
+        for stock in portfolio.stocks:
+            if prices['close'][stock][-1] < indicators['lower'][stock][-1]:
+                portfolio.order(stock, quantity=self.quantity)
+            elif prices['close'][stock][-1] > indicators['upper'][stock][-1]:
+                portfolio.order(stock, quantity=-self.quantity)
+
+
+@pytest.fixture
+def server(data_folder):
+    server = BacktestServer(data_folder, port=0, days=1, delta_limits=50, fee=0.01, verbose=False)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    thread.join()
+
+
+def test_backtest_through_client(server, data_folder):
+    client = BacktestClient(server.address, timeout=60)
+    job = {'indicator_params': {'bands': {'lookback': 15}}, 'cv': 2, 'seed': 1}
+
+    BandIndicators.calls.clear()
+    lines = list(client.run(Bands, BandIndicators, strategy_params={'quantity': 3}, **job))
+    assert lines[-1]['done'] and lines[-1]['folds'] == 2
+    assert 15 in BandIndicators.calls
+
+    local = Backtester(Bands, BandIndicators, None, data_folder, days=1, delta_limits=50, fee=0.01, progressbar=False)
+    expected = local.run({'quantity': 3}, {'bands': {'lookback': 15}}, cv=2, seed=1)
+    assert [line['roi'] for line in lines[:-1]] == pytest.approx([single.roi for single in expected])
+
+    # a different strategy reuses the indicators computed for the first job
+    BandIndicators.calls.clear()
+    lines = list(client.run(Bands, BandIndicators, strategy_params={'quantity': 1}, **job))
+    assert lines[-1]['folds'] == 2
+    assert BandIndicators.calls == []
+
+    status = client.status()
+    assert status['jobs'] == 2
+    assert status['indicators']['test_server:BandIndicators']['cached_results'] == 4
+
+
+def test_invalid_job(server):
+    client = BacktestClient(server.address, timeout=60)
+    with pytest.raises(ValueError, match='Unknown fields'):
+        list(client.run(Bands, BandIndicators, checkpoint='sweep.ckpt'))
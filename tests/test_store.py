@@ -0,0 +1,139 @@
+import os
+import inspect
+import importlib.util
+import numpy as np
+import pytest
+from qfinuwa import Backtester, Strategy, Indicators
+from qfinuwa.opt import StockData
+
+STRATEGY_PARAMS = {'quantity': [1, 5]}
+INDICATOR_PARAMS = {'bands': {'lookback': [10, 20]}}
+
+
+class BandIndicators(Indicators):
+
+    @Indicators.MultiIndicator
+    def bands(self, stock, lookback=20):
+        mean = stock['close'].rolling(lookback).mean()
+        return {'upper': mean*1.001, 'lower': mean*0.999}
+
+
+class Bands(Strategy):
+
+    def __init__(self, quantity=5):
+        self.quantity = quantity
+
+    def on_data(self, prices, indicators, portfolio):
+        for stock in portfolio.stocks:
+            if prices['close'][stock][-1] < indicators['lower'][stock][-1]:
+                portfolio.order(stock, quantity=self.quantity)
+            elif prices['close'][stock][-1] > indicators['upper'][stock][-1]:
+                portfolio.order(stock, quantity=-self.quantity)
+
+
+def _backtester(data_folder):
+    return Backtester(Bands, BandIndicators, None, data_folder, days=1, delta_limits=50, fee=0.01, progressbar=False)
+
+
+def _check_frame(frame, sweep):
+    # a row for each fold of each combination
+    assert len(frame) == 4*2
+    assert sorted(frame['run'].unique()) == [0, 1, 2, 3]
+    assert all(sorted(folds) == [0, 1] for _, folds in frame.groupby('run')['fold'])
+    for column in ('start', 'end', 'strategy.quantity', 'bands.lookback', 'roi', 'gross_pnl', 'fees_paid',
+                   'n_buys', 'n_sells', 'sharpe_ratio', 'max_drawdown', 'key', 'values'):
+        assert column in frame
+    assert frame['roi'].max() == pytest.approx(max(single.roi for single in sweep.best))
+
+
+def test_sqlite_store(tmp_path, data_folder):
+    path = str(tmp_path/'sweep.db')
+    backtester = _backtester(data_folder)
+    sweep = backtester.run_grid_search(STRATEGY_PARAMS, INDICATOR_PARAMS, cv=2, seed=1, store=path, spill_values=True)
+    frame = sweep.to_frame()
+    _check_frame(frame, sweep)
+
+    # the value over time of each fold is spilled next to the store
+    local = {(r.parameters['strategy']['quantity'], r.parameters['indicator']['bands']['lookback']): r 
+             for r in backtester.run_grid_search(STRATEGY_PARAMS, INDICATOR_PARAMS, cv=2, seed=1)}
+    for row in frame.to_dict('records'):
+        assert row['values'] == os.path.join(str(tmp_path/'sweep_values'), f"{row['run']}_{row['fold']}.npy")
+        expected = local[(row['strategy.quantity'], row['bands.lookback'])][row['fold']]
+        np.testing.assert_array_equal(np.load(row['values']), expected.value_over_time['value'].to_numpy())
+
+    # re-running the sweep into the same store doesn't duplicate its runs
+    again = backtester.run_grid_search(STRATEGY_PARAMS, INDICATOR_PARAMS, cv=2, seed=1, store=path)
+    assert len(again.to_frame()) == len(frame)
+
+    # only the best run is in memory, so it can't be ranked
+    with pytest.raises(RuntimeError, match='to_frame'):
+        sweep.top(2)
+
+
+def test_parquet_store(tmp_path, data_folder):
+    pytest.importorskip('pyarrow')
+    path = str(tmp_path/'sweep.parquet')
+    sweep = _backtester(data_folder).run_grid_search(STRATEGY_PARAMS, INDICATOR_PARAMS, cv=2, seed=1, store=path, 
+                                                     spill_values=True)
+    frame = sweep.to_frame()
+    _check_frame(frame, sweep)
+    assert all(os.path.exists(path) for path in frame['values'])
+
+
+def test_resume_from_checkpoint(tmp_path, data_folder, monkeypatch):
+    path = str(tmp_path/'sweep.ckpt')
+    backtester = _backtester(data_folder)
+    expected = backtester.run_grid_search(STRATEGY_PARAMS, INDICATOR_PARAMS, cv=2, seed=1)
+
+    # interrupted after two of the four combinations
+    sweep = backtester.iter_grid_search(STRATEGY_PARAMS, INDICATOR_PARAMS, cv=2, seed=1, checkpoint=path)
+    done = [next(sweep).parameters for _ in range(2)]
+    sweep.close()
+
+    run = backtester.run
+    ran = []
+    def counted(*args, **kwargs):
+        ran.append({'strategy': kwargs['strategy_params'], 'indicator': kwargs['indicator_params']})
+        return run(*args, **kwargs)
+    monkeypatch.setattr(backtester, 'run', counted)
+
+    resumed = backtester.run_grid_search(STRATEGY_PARAMS, INDICATOR_PARAMS, cv=2, seed=1, checkpoint=path)
+    # only the combinations missing from the checkpoint are run
+    assert len(ran) == 2 and not any(params in done for params in ran)
+    assert [result.parameters for result in resumed] == [result.parameters for result in expected]
+    for found, result in zip(resumed, expected):
+        for single_found, single in zip(found, result):
+            assert single_found.date_range == single.date_range
+            np.testing.assert_array_equal(single_found.value_over_time['value'], single.value_over_time['value'])
+
+
+def _module(tmp_path, name, source):
+    # a module with the given source, so classes of the same name can have different source
+    path = tmp_path/f'{name}.py'
+    path.write_text(source)
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_run_key(tmp_path, data_folder):
+    source = inspect.getsource(Bands)
+    changed = _module(tmp_path, 'changed', 'from qfinuwa import Strategy\n\n' +
+                      source.replace('self.quantity = quantity', 'self.quantity = 2*quantity'))
+    data = StockData(data_folder)
+    other = data._data.copy()
+    other[-1, 1] += 0.01
+    other = StockData._from_arrays(data.stocks, data.index, other)
+
+    def key(strategy=Bands, data=data, fee=0.01, delta_limits=50):
+        backtester = Backtester(strategy, BandIndicators, None, data, days=1, delta_limits=delta_limits, fee=fee, 
+                                progressbar=False)
+        return backtester._run_key({'quantity': 5}, {'bands': {'lookback': 20}}, [(0, 390)])
+
+    same = key()
+    assert key() == same
+    assert key(strategy=changed.Bands) != same
+    assert key(fee=0.02) != same
+    assert key(delta_limits=40) != same
+    assert key(data=other) != same
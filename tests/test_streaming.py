@@ -0,0 +1,98 @@
+import os
+import warnings
+import numpy as np
+import pandas as pd
+import pytest
+from qfinuwa import Strategy, MatrixStrategy, Indicators, StreamingBacktester
+from qfinuwa.opt import StockData
+from conftest import write_data
+
+
+class BandIndicators(Indicators):
+
+    @Indicators.MultiIndicator
+    def bands(self, stock, lookback=10):
+        mean = stock['close'].rolling(lookback).mean()
+        return {'upper': mean*1.001, 'lower': mean*0.999}
+
+
+class RecordDict(Strategy):
+
+    seen = []
+
+    def on_data(self, prices, indicators, portfolio):
+        self.seen.append(np.column_stack([indicators['upper'][stock] for stock in portfolio.stocks]))
+
+
+class RecordMatrix(MatrixStrategy):
+
+    seen = []
+
+    def on_data(self, prices, indicators, portfolio):
+        self.seen.append(indicators['upper'])
+
+
+def test_matrix_indicators_match_columns(data_folder):
+    history = StockData(data_folder)
+    stocks = history.stocks
+    bars = list(StreamingBacktester.replay(data_folder))[:200]
+
+    RecordDict.seen.clear()
+    RecordMatrix.seen.clear()
+    StreamingBacktester(RecordDict, BandIndicators, stocks).run(bars)
+    StreamingBacktester(RecordMatrix, BandIndicators, stocks).run(bars)
+
+    assert len(RecordMatrix.seen) == len(bars)
+    for columns, matrix in zip(RecordDict.seen, RecordMatrix.seen):
+        assert matrix.shape == columns.shape
+        np.testing.assert_array_equal(matrix, columns)
+
+    # each bar is a view of the same buffer until it has to grow, rather than a new copy of the history
+    assert np.shares_memory(RecordMatrix.seen[-2], RecordMatrix.seen[-1])
+
+
+def test_replay_ragged(tmp_path):
+    folder = write_data(str(tmp_path), n_days=2)
+    # one stock lists late and another has a gap
+    for stock, drop in (('GOOG', slice(0, 100)), ('MSFT', slice(300, 350))):
+        path = os.path.join(folder, f'{stock}.csv')
+        frame = pd.read_csv(path)
+        frame.drop(frame.index[drop]).to_csv(path, index=False)
+
+    data = StockData(folder)
+    bars = list(StreamingBacktester.replay(folder))
+    assert data.ragged
+    assert np.array_equal(np.array([t for t, _ in bars], dtype='datetime64[ns]'), data.index.to_numpy())
+    close = np.array([[bar[stock]['close'] for stock in data.stocks] for _, bar in bars])
+    np.testing.assert_array_equal(close, data._data[:, 1::5])
+
+
+class LookbackIndicators(Indicators):
+
+    lengths = []
+
+    @Indicators.MultiIndicator(lookback=lambda lookback, **_: lookback)
+    def bands(self, stock, lookback=10):
+        self.lengths.append(len(stock))
+        mean = stock['close'].rolling(lookback).mean()
+        return {'upper': mean*1.001, 'lower': mean*0.999}
+
+
+def test_lookback_recomputes_window(data_folder):
+    history = StockData(data_folder)
+    bars = list(StreamingBacktester.replay(data_folder))[:200]
+
+    LookbackIndicators.lengths.clear()
+    RecordMatrix.seen.clear()
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        StreamingBacktester(RecordMatrix, LookbackIndicators, history.stocks).run(bars)
+
+    # each bar only computes the lookback before it, and gives the same values as computing every bar
+    assert max(LookbackIndicators.lengths[len(history.stocks):]) == 10 + 1
+    RecordDict.seen.clear()
+    with pytest.warns(RuntimeWarning, match=r"\['bands'\]") as record:
+        StreamingBacktester(RecordDict, BandIndicators, history.stocks).run(bars)
+    assert len(record) == 1
+    for matrix, columns in zip(RecordMatrix.seen, RecordDict.seen):
+        np.testing.assert_allclose(matrix, columns, rtol=1e-12)